@@ -0,0 +1,121 @@
+"""
+Compare the ways events can be validated and filtered by category.
+
+Run from the repository root with::
+
+    python -m benchmarks.engines
+"""
+import argparse
+from copy import deepcopy
+import timeit
+
+from jupyter_telemetry._categories import (
+    CategoryExtractor,
+    CategoryValidator,
+    JSONSchemaValidator,
+    compile_filter_plan,
+    filter_categories_from_event,
+    validate_and_filter_event,
+)
+from jupyter_telemetry.tests.test_category_filtering import (
+    ARRAY_EVENT_DATA,
+    NESTED_CATEGORY_ARRAY_SCHEMA,
+    NESTED_CATEGORY_SCHEMA,
+    NESTED_CATEGORY_SCHEMA_ALLOF,
+    NESTED_CATEGORY_SCHEMA_REF,
+    NESTED_EVENT_DATA,
+)
+
+
+ALLOWED_CATEGORIES = {'unrestricted', 'user-identifier'}
+ALLOWED_PROPERTIES = set()
+
+LARGE_ARRAY_EVENT_DATA = {
+    'nothing-exciting': 'hello, world',
+    'users': [
+        {'id': 'test id {}'.format(i), 'email': 'test{}@testemail.com'.format(i)}
+        for i in range(50)
+    ]
+}
+
+CASES = [
+    ('nested', NESTED_CATEGORY_SCHEMA, NESTED_EVENT_DATA),
+    ('allOf', NESTED_CATEGORY_SCHEMA_ALLOF, NESTED_EVENT_DATA),
+    ('$ref', NESTED_CATEGORY_SCHEMA_REF, NESTED_EVENT_DATA),
+    ('array', NESTED_CATEGORY_ARRAY_SCHEMA, ARRAY_EVENT_DATA),
+    ('array-50', NESTED_CATEGORY_ARRAY_SCHEMA, LARGE_ARRAY_EVENT_DATA),
+]
+
+
+def engines(schema):
+    """Return a mapping from engine name to a `f(event)` callable."""
+    validator = JSONSchemaValidator(schema)
+    extractor = CategoryExtractor(schema)
+    plan = compile_filter_plan(schema, extractor)
+    fused = CategoryValidator(schema)
+
+    def uncached(event):
+        JSONSchemaValidator(schema).validate(event)
+        return filter_categories_from_event(
+            event, schema, ALLOWED_CATEGORIES, ALLOWED_PROPERTIES
+        )
+
+    def two_pass(event):
+        validator.validate(event)
+        return filter_categories_from_event(
+            event, schema, ALLOWED_CATEGORIES, ALLOWED_PROPERTIES,
+            extractor=extractor
+        )
+
+    def planned(event):
+        validator.validate(event)
+        return plan.apply(event, ALLOWED_CATEGORIES, ALLOWED_PROPERTIES)
+
+    def single_pass(event):
+        return validate_and_filter_event(
+            event, schema, ALLOWED_CATEGORIES, ALLOWED_PROPERTIES,
+            validator=fused
+        )
+
+    return {
+        'uncached': uncached,
+        'two-pass': two_pass,
+        'two-pass+plan': planned,
+        'fused': single_pass,
+    }
+
+
+def run(number, repeat):
+    results = []
+    for case, schema, event in CASES:
+        outputs = {}
+        for name, engine in engines(schema).items():
+            outputs[name] = engine(deepcopy(event))
+            # Filtering mutates the event, so every call gets its own copy.
+            it = iter([deepcopy(event) for _ in range(number * repeat)])
+            best = min(timeit.repeat(
+                lambda: engine(next(it)), number=number, repeat=repeat
+            ))
+            results.append((case, name, best / number * 1e6))
+        # Every engine must produce the same filtered event.
+        assert all(o == outputs['uncached'] for o in outputs.values()), case
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    results = run(args.number, args.repeat)
+    baseline = {case: t for case, name, t in results if name == 'two-pass'}
+    print('{:<10} {:<15} {:>10} {:>9}'.format('schema', 'engine', 'us/event', 'speedup'))
+    for case, name, t in results:
+        print('{:<10} {:<15} {:>10.2f} {:>8.2f}x'.format(
+            case, name, t, baseline[case] / t
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Compare writing events to a logging.FileHandler and to a FileSink.
+
+Reports the time per event of `EventLog.record_event`, which includes
+validating the event, of serializing and writing an event that has
+already been validated ("emit"), and of writing an already serialized
+event to the handler or sink alone ("sink").
+
+Run from the repository root with::
+
+    python -m benchmarks.filesink
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from jupyter_telemetry.eventlog import EventLog
+from jupyter_telemetry.sinks import FileSink
+
+
+SCHEMA = {
+    '$id': 'benchmark/event',
+    'version': 1,
+    'properties': {
+        'action': {'type': 'string', 'categories': ['unrestricted']},
+        'path': {'type': 'string', 'categories': ['unrestricted']},
+        'duration': {'type': 'number', 'categories': ['unrestricted']},
+    },
+}
+
+
+def targets(directory):
+    """Return a mapping from target name to a function that builds its EventLog traits."""
+    def file_handler():
+        return {'handlers': [logging.FileHandler(os.path.join(directory, 'handler.log'))]}
+
+    def file_sink():
+        return {'sinks': [FileSink(os.path.join(directory, 'sink.log'))]}
+
+    def file_sink_fsync():
+        return {'sinks': [FileSink(os.path.join(directory, 'sink-fsync.log'), fsync=1.0)]}
+
+    return {
+        'FileHandler': file_handler,
+        'FileSink': file_sink,
+        'FileSink(fsync=1s)': file_sink_fsync,
+    }
+
+
+def record_events(el, number):
+    for i in range(number):
+        el.record_event('benchmark/event', 1, {
+            'action': 'open', 'path': 'notebooks/{}.ipynb'.format(i),
+            'duration': 0.25,
+        })
+
+
+def emit_events(el, number):
+    capsule = el.record_event('benchmark/event', 1, {
+        'action': 'open', 'path': 'notebooks/0.ipynb', 'duration': 0.25,
+    })
+    for _ in range(number):
+        el._emit((capsule,))
+
+
+def sink_events(el, number):
+    capsule = el.record_event('benchmark/event', 1, {
+        'action': 'open', 'path': 'notebooks/0.ipynb', 'duration': 0.25,
+    })
+    sink = el._sync_sinks[0]
+    data = el._encode(capsule)
+    if sink.binary:
+        data = data.encode('utf-8')
+    for _ in range(number):
+        sink.write(data)
+
+
+def run(number, repeat):
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for step, record in [
+            ('record_event', record_events),
+            ('emit', emit_events),
+            ('sink', sink_events),
+        ]:
+            for name, make_traits in targets(directory).items():
+                timings = []
+                for _ in range(repeat):
+                    traits = make_traits()
+                    el = EventLog(allowed_schemas=['benchmark/event'], **traits)
+                    el.register_schema(SCHEMA)
+                    start = time.perf_counter()
+                    record(el, number)
+                    # Includes writing out whatever is still buffered.
+                    el.close()
+                    timings.append(time.perf_counter() - start)
+                    for handler in traits.get('handlers', ()):
+                        handler.close()
+                results.append((step, name, min(timings) / number * 1e6))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    results = run(args.number, args.repeat)
+    baseline = {step: t for step, name, t in results if name == 'FileHandler'}
+    print('{:<14} {:<20} {:>10} {:>9}'.format('step', 'target', 'us/event', 'speedup'))
+    for step, name, t in results:
+        print('{:<14} {:<20} {:>10.2f} {:>8.2f}x'.format(
+            step, name, t, baseline[step] / t
+        ))
+
+
+if __name__ == '__main__':
+    main()
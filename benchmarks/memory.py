@@ -0,0 +1,223 @@
+"""
+Check that long-running processes recording events don't grow in memory.
+
+Runs three workloads under `tracemalloc`:
+
+- ``steady``: one `EventLog` records many events, like a server that runs
+  for weeks.
+- ``churn``: many `EventLog` instances are created, record a few events,
+  and are closed and dropped, like one EventLog per spawner or request.
+- ``children``: the same, with children created by `EventLog.child`.
+
+After a warm-up, each workload compares the memory still allocated at the
+end with the memory allocated at the start. It prints the allocations
+that grew the most, by traceback. Caches that fill up during the run,
+like jsonschema's and traitlets', grow by a few kilobytes whatever the
+length of the run, so the first ``--allowance`` bytes of growth (64 KiB
+by default) are not counted. The workload fails when the rest of the
+growth, per event or per instance, is over the threshold.
+
+Run from the repository root with::
+
+    python -m benchmarks.memory
+
+which records a million events, creates ten thousand EventLogs and ten
+thousand children, and exits with status 1 if any workload grew too much.
+Tracing allocations makes recording events many times slower, so this
+takes a while; pass ``--events`` and ``--instances`` for a quicker check.
+"""
+import argparse
+import gc
+import logging
+import os
+import sys
+import tracemalloc
+
+from jupyter_telemetry.eventlog import EventLog
+
+
+SCHEMA = {
+    '$id': 'benchmark/memory',
+    'version': 1,
+    'properties': {
+        'action': {'type': 'string', 'categories': ['unrestricted']},
+        'path': {'type': 'string', 'categories': ['user-content']},
+        'user': {'type': 'string', 'categories': ['user-identifier']},
+        'duration': {'type': 'number', 'categories': ['unrestricted']},
+    },
+}
+
+
+def _allowed_schemas():
+    # A list, as it comes from configuration files, so that code that
+    # changes it in place would grow it with each event.
+    return {'benchmark/memory': {'allowed_categories': ['user-content']}}
+
+
+def _event(i):
+    return {
+        'action': 'open',
+        'path': 'notebooks/{}.ipynb'.format(i % 1000),
+        'user': 'user-{}'.format(i % 100),
+        'duration': 0.25,
+    }
+
+
+def steady(number, handler):
+    """Record `number` events with one EventLog."""
+    el = EventLog(allowed_schemas=_allowed_schemas(), handlers=[handler])
+    el.register_schema(SCHEMA)
+
+    def run(start, stop):
+        for i in range(start, stop):
+            el.record_event('benchmark/memory', 1, _event(i))
+            if i % 100 == 0:
+                el.record_events('benchmark/memory', 1, [_event(i + j) for j in range(10)])
+                el.get_allowed_categories('benchmark/memory')
+                el.get_allowed_properties('benchmark/memory')
+
+    return run, el.close
+
+
+def churn(number, handler):
+    """Create, use and drop `number` EventLogs sharing one handler."""
+    def run(start, stop):
+        for i in range(start, stop):
+            el = EventLog(allowed_schemas=_allowed_schemas(), handlers=[handler])
+            el.register_schema(SCHEMA)
+            el.record_event('benchmark/memory', 1, _event(i))
+            el.record_events('benchmark/memory', 1, [_event(i), _event(i + 1)])
+            el.close()
+
+    return run, None
+
+
+def children(number, handler):
+    """Create, use and drop `number` children of one EventLog."""
+    el = EventLog(allowed_schemas=_allowed_schemas(), handlers=[handler])
+    el.register_schema(SCHEMA)
+
+    def run(start, stop):
+        for i in range(start, stop):
+            child = el.child()
+            child.record_event('benchmark/memory', 1, _event(i))
+            child.record_events('benchmark/memory', 1, [_event(i), _event(i + 1)])
+            child.close()
+
+    return run, el.close
+
+
+WORKLOADS = {
+    'steady': (steady, 'event'),
+    'churn': (churn, 'instance'),
+    'children': (children, 'instance'),
+}
+
+
+def _filter(snapshot):
+    return snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<unknown>'),
+    ])
+
+
+def measure(workload, number, warmup, frames):
+    """
+    Run `workload` `number` times after `warmup` times, and return the
+    statistics of the memory that grew in between, by traceback, and the
+    number of loggers created.
+    """
+    handler = logging.StreamHandler(open(os.devnull, 'w'))
+    make, _ = WORKLOADS[workload]
+    run, close = make(number, handler)
+    tracemalloc.start(frames)
+    try:
+        run(0, warmup)
+        gc.collect()
+        loggers = len(logging.Logger.manager.loggerDict)
+        before = tracemalloc.take_snapshot()
+        run(warmup, warmup + number)
+        gc.collect()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+        if close is not None:
+            close()
+        handler.close()
+        handler.stream.close()
+    loggers = len(logging.Logger.manager.loggerDict) - loggers
+    # Filter once both snapshots are taken, so the filtering itself isn't
+    # counted.
+    return _filter(after).compare_to(_filter(before), 'traceback'), loggers
+
+
+def report(workload, stats, loggers, number, threshold, allowance, top):
+    """
+    Print the growth of `workload`, and return whether its growth over
+    `allowance` is under `threshold` per event or instance.
+    """
+    unit = WORKLOADS[workload][1]
+    growth = sum(stat.size_diff for stat in stats)
+    per_unit = growth / number
+    ok = max(0, growth - allowance) / number <= threshold
+    print('{}: {} {}s, grew by {} bytes, {:.2f} bytes per {} (threshold {}), {} new loggers: {}'.format(
+        workload, number, unit, growth, per_unit, unit, threshold, loggers,
+        'ok' if ok else 'FAILED'
+    ))
+    grown = [stat for stat in stats if stat.size_diff > 0]
+    grown.sort(key=lambda stat: stat.size_diff, reverse=True)
+    for stat in grown[:top]:
+        print('  +{} bytes in {:+d} blocks, allocated at:'.format(
+            stat.size_diff, stat.count_diff
+        ))
+        for line in stat.traceback.format(most_recent_first=True):
+            print('    ' + line)
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workload', dest='workloads', action='append',
+                        choices=sorted(WORKLOADS),
+                        help='Only run these workloads. Can be repeated.')
+    parser.add_argument('--events', type=int, default=1000000,
+                        help='Events to record in the steady workload.')
+    parser.add_argument('--instances', type=int, default=10000,
+                        help='EventLogs to create in the churn and children workloads.')
+    parser.add_argument('--max-bytes-per-event', type=float, default=0.1,
+                        help='Fail when the steady workload grows more than this per event.')
+    parser.add_argument('--max-bytes-per-instance', type=float, default=16,
+                        help='Fail when the churn and children workloads grow more '
+                             'than this per EventLog.')
+    parser.add_argument('--allowance', type=int, default=64 << 10,
+                        help='Growth in bytes that is not counted against the thresholds, '
+                             'for caches that fill up during the run.')
+    parser.add_argument('--frames', type=int, default=5,
+                        help='Frames to keep in the tracebacks of allocations. '
+                             'More frames make the workloads slower.')
+    parser.add_argument('--top', type=int, default=10,
+                        help='How many of the allocations that grew the most to show.')
+    args = parser.parse_args(argv)
+
+    settings = {
+        'steady': (args.events, args.max_bytes_per_event),
+        'churn': (args.instances, args.max_bytes_per_instance),
+        'children': (args.instances, args.max_bytes_per_instance),
+    }
+    ok = True
+    for workload in args.workloads or WORKLOADS:
+        number, threshold = settings[workload]
+        # Warm up caches, like the timestamp formatter and the schema
+        # cache, before measuring.
+        warmup = 1000
+        stats, loggers = measure(workload, number, warmup, args.frames)
+        ok = report(
+            workload, stats, loggers, number, threshold, args.allowance, args.top
+        ) and ok
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,459 @@
+"""
+Benchmark the event pipeline end to end, and save the results as JSON.
+
+Measures:
+
+- ``record_event``: throughput and latency percentiles for several
+  shapes of schemas and events, with each validation engine.
+- ``register_schema``: the cost of registering many schemas.
+- ``sink``: throughput of writing serialized events to each file sink.
+- ``memory``: memory allocated per recorded event.
+
+Run from the repository root with::
+
+    python -m benchmarks.suite --output results.json
+
+and compare two runs, for instance of two releases, with::
+
+    python -m benchmarks.suite --compare before.json after.json
+
+which exits with status 1 when a metric got worse by more than
+``--threshold``.
+"""
+import argparse
+from copy import deepcopy
+import datetime
+import gc
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from jupyter_telemetry._version import __version__
+from jupyter_telemetry.eventlog import EventLog
+from jupyter_telemetry.sinks import (
+    CompressedFileSink,
+    FileSink,
+    HandlerSink,
+    RingBufferSink,
+    SharedFileSink,
+    Sink,
+)
+
+
+# Bump when the layout of the results changes.
+RESULTS_VERSION = 1
+
+ENGINES = ('two-pass', 'fused')
+
+# Metrics where higher is better; lower is better for all others.
+HIGHER_IS_BETTER = {'events_per_second', 'schemas_per_second', 'mb_per_second'}
+
+
+class NullSink(Sink):
+    """Discard events, so only the pipeline itself is measured."""
+
+    def write(self, data):
+        pass
+
+    def write_batch(self, batch):
+        pass
+
+
+def _schema(schema_id, properties):
+    return {'$id': schema_id, 'version': 1, 'properties': properties}
+
+
+def flat_case():
+    """Twenty string properties."""
+    properties = {
+        'field{}'.format(i): {'type': 'string', 'categories': ['unrestricted']}
+        for i in range(20)
+    }
+    event = {'field{}'.format(i): 'value {}'.format(i) for i in range(20)}
+    return _schema('benchmark/flat', properties), event, ['unrestricted']
+
+
+def nested_case(depth=8):
+    """Objects nested `depth` levels deep, each with a few properties."""
+    properties = {}
+    event = {}
+    inner_properties, inner_event = properties, event
+    for level in range(depth):
+        inner_properties['name'] = {'type': 'string', 'categories': ['unrestricted']}
+        inner_properties['user'] = {'type': 'string', 'categories': ['user-identifier']}
+        inner_event['name'] = 'level {}'.format(level)
+        inner_event['user'] = 'user {}'.format(level)
+        if level < depth - 1:
+            child = {'type': 'object', 'categories': ['unrestricted'], 'properties': {}}
+            inner_properties['child'] = child
+            inner_event['child'] = {}
+            inner_properties, inner_event = child['properties'], inner_event['child']
+    return _schema('benchmark/nested', properties), event, ['unrestricted']
+
+
+def array_case(length=100):
+    """An array of `length` objects."""
+    properties = {
+        'title': {'type': 'string', 'categories': ['unrestricted']},
+        'cells': {
+            'type': 'array',
+            'categories': ['unrestricted'],
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'id': {'type': 'string', 'categories': ['unrestricted']},
+                    'source': {'type': 'string', 'categories': ['user-content']},
+                    'count': {'type': 'integer', 'categories': ['unrestricted']},
+                },
+            },
+        },
+    }
+    event = {
+        'title': 'notebook',
+        'cells': [
+            {'id': 'cell-{}'.format(i), 'source': 'print({})'.format(i), 'count': i}
+            for i in range(length)
+        ],
+    }
+    return _schema('benchmark/array', properties), event, ['unrestricted']
+
+
+def categories_case(count=100):
+    """`count` properties, each in its own category, half of them allowed."""
+    properties = {
+        'field{}'.format(i): {'type': 'string', 'categories': ['category-{}'.format(i)]}
+        for i in range(count)
+    }
+    event = {'field{}'.format(i): 'value {}'.format(i) for i in range(count)}
+    allowed = ['category-{}'.format(i) for i in range(0, count, 2)]
+    return _schema('benchmark/categories', properties), event, allowed
+
+
+# Each shape, and the fraction of the events to record with it, so that
+# the slower shapes don't take too long.
+SHAPES = [
+    ('flat', flat_case, 1),
+    ('nested', nested_case, 1),
+    ('array', array_case, 0.1),
+    ('many-categories', categories_case, 0.5),
+]
+
+
+def _eventlog(schema, allowed_categories, **traits):
+    el = EventLog(
+        allowed_schemas={
+            schema['$id']: {'allowed_categories': allowed_categories},
+        },
+        sinks=[NullSink()],
+        **traits
+    )
+    el.register_schema(schema)
+    return el
+
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _copies(event, number, batch=100):
+    """Yield lists of copies of `event`, `number` in all."""
+    # Filtering modifies events, so every call gets its own copy.
+    for done in range(0, number, batch):
+        yield [deepcopy(event) for _ in range(min(batch, number - done))]
+
+
+def bench_record_event(total):
+    results = []
+    clock = time.perf_counter
+    for shape, make_case, fraction in SHAPES:
+        schema, event, allowed = make_case()
+        number = max(1, int(total * fraction))
+        for engine in ENGINES:
+            el = _eventlog(schema, allowed, engine=engine)
+            record = el.record_event
+            schema_id = schema['$id']
+            for events in _copies(event, min(number, 100)):
+                for e in events:
+                    record(schema_id, 1, e)
+            # Throughput, without the overhead of timing each call.
+            elapsed = 0
+            for events in _copies(event, number):
+                start = clock()
+                for e in events:
+                    record(schema_id, 1, e)
+                elapsed += clock() - start
+            # Latency of each call.
+            latencies = []
+            for events in _copies(event, number):
+                for e in events:
+                    start = clock()
+                    record(schema_id, 1, e)
+                    latencies.append(clock() - start)
+            el.close()
+            latencies.sort()
+            results.append({
+                'name': 'record_event/{}/{}'.format(shape, engine),
+                'group': 'record_event',
+                'params': {'shape': shape, 'engine': engine, 'number': number},
+                'metrics': {
+                    'events_per_second': number / elapsed,
+                    'p50_us': _percentile(latencies, 0.5) * 1e6,
+                    'p90_us': _percentile(latencies, 0.9) * 1e6,
+                    'p99_us': _percentile(latencies, 0.99) * 1e6,
+                    'max_us': latencies[-1] * 1e6,
+                },
+            })
+    return results
+
+
+def bench_register_schema(counts):
+    results = []
+    for count in counts:
+        schemas = []
+        for i in range(count):
+            schema = flat_case()[0]
+            schema['$id'] = 'benchmark/schema-{}'.format(i)
+            schemas.append(schema)
+        el = EventLog(allowed_schemas=[schema['$id'] for schema in schemas])
+        start = time.perf_counter()
+        for schema in schemas:
+            el.register_schema(schema)
+        elapsed = time.perf_counter() - start
+        el.close()
+        results.append({
+            'name': 'register_schema/{}'.format(count),
+            'group': 'register_schema',
+            'params': {'count': count},
+            'metrics': {
+                'schemas_per_second': count / elapsed,
+                'us_per_schema': elapsed / count * 1e6,
+            },
+        })
+    return results
+
+
+def sinks(directory):
+    """Return a mapping from sink name to a function that creates it."""
+    def path(name):
+        return os.path.join(directory, name)
+
+    def file_handler():
+        return HandlerSink(logging.FileHandler(path('handler.log')))
+
+    return {
+        'FileHandler': file_handler,
+        'FileSink': lambda: FileSink(path('file.log')),
+        'CompressedFileSink(gzip)': lambda: CompressedFileSink(path('file.log.gz')),
+        'SharedFileSink': lambda: SharedFileSink(path('shared.log')),
+        'RingBufferSink': lambda: RingBufferSink(path('ring.buf')),
+    }
+
+
+def bench_sinks(number):
+    results = []
+    schema, event, allowed = flat_case()
+    el = _eventlog(schema, allowed)
+    data = el._encode(el.record_event(schema['$id'], 1, event))
+    el.close()
+    with tempfile.TemporaryDirectory() as directory:
+        for name, make_sink in sinks(directory).items():
+            sink = make_sink()
+            payload = data.encode('utf-8') if sink.binary else data
+            write = sink.write
+            start = time.perf_counter()
+            for _ in range(number):
+                write(payload)
+            # Includes writing out whatever is still buffered.
+            sink.close()
+            if isinstance(sink, HandlerSink):
+                # HandlerSink leaves its handler open, for whoever owns it.
+                sink.handler.close()
+            elapsed = time.perf_counter() - start
+            results.append({
+                'name': 'sink/{}'.format(name),
+                'group': 'sink',
+                'params': {'sink': name, 'number': number, 'event_bytes': len(payload)},
+                'metrics': {
+                    'events_per_second': number / elapsed,
+                    'mb_per_second': number * len(payload) / elapsed / 1e6,
+                },
+            })
+    return results
+
+
+def bench_memory(total):
+    results = []
+    for shape, make_case, fraction in SHAPES:
+        schema, event, allowed = make_case()
+        number = max(1, int(total * fraction))
+        el = _eventlog(schema, allowed)
+        schema_id = schema['$id']
+        el.record_event(schema_id, 1, deepcopy(event))
+        # The most memory held at once while recording one event, not
+        # counting the event itself.
+        copy = deepcopy(event)
+        gc.collect()
+        tracemalloc.start()
+        try:
+            el.record_event(schema_id, 1, copy)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        # Memory still held after recording many events. Copies of the
+        # event are freed once recorded, so they don't count.
+        tracemalloc.start()
+        try:
+            gc.collect()
+            before = tracemalloc.get_traced_memory()[0]
+            for events in _copies(event, number):
+                for e in events:
+                    el.record_event(schema_id, 1, e)
+            del events, e
+            gc.collect()
+            retained = tracemalloc.get_traced_memory()[0] - before
+        finally:
+            tracemalloc.stop()
+        el.close()
+        results.append({
+            'name': 'memory/{}'.format(shape),
+            'group': 'memory',
+            'params': {'shape': shape, 'number': number},
+            'metrics': {
+                'peak_bytes_per_event': peak,
+                'retained_bytes_per_event': retained / number,
+            },
+        })
+    return results
+
+
+GROUPS = ['record_event', 'register_schema', 'sink', 'memory']
+
+
+def _package_version(name):
+    try:
+        from importlib.metadata import PackageNotFoundError, version
+    except ImportError:  # Python < 3.8
+        import pkg_resources
+        try:
+            return pkg_resources.get_distribution(name).version
+        except pkg_resources.DistributionNotFound:
+            return None
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return None
+
+
+def metadata(args):
+    """Describe the environment the benchmarks ran in."""
+    return {
+        'jupyter_telemetry': __version__,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'jsonschema': _package_version('jsonschema'),
+        'orjson': _package_version('orjson'),
+        'date': datetime.datetime.utcnow().isoformat() + 'Z',
+        'quick': args.quick,
+    }
+
+
+def run(args):
+    scale = 10 if args.quick else 1
+    results = []
+    groups = args.groups or GROUPS
+    if 'record_event' in groups:
+        results.extend(bench_record_event(5000 // scale))
+    if 'register_schema' in groups:
+        results.extend(bench_register_schema([100 // scale, 1000 // scale]))
+    if 'sink' in groups:
+        results.extend(bench_sinks(100000 // scale))
+    if 'memory' in groups:
+        results.extend(bench_memory(2000 // scale))
+    return {'version': RESULTS_VERSION, 'metadata': metadata(args), 'results': results}
+
+
+def print_results(report):
+    for result in report['results']:
+        metrics = '  '.join(
+            '{}={:.6g}'.format(name, value) for name, value in result['metrics'].items()
+        )
+        print('{:<36} {}'.format(result['name'], metrics))
+
+
+def compare(before, after, threshold):
+    """
+    Compare the results of two runs.
+
+    Returns a list of ``(name, metric, before, after, change)`` tuples,
+    where `change` is how much worse (positive) or better (negative) the
+    metric got, as a fraction of its value in `before`, and the list of
+    regressions, those worse by more than `threshold`.
+    """
+    previous = {result['name']: result['metrics'] for result in before['results']}
+    changes = []
+    regressions = []
+    for result in after['results']:
+        for metric, value in result['metrics'].items():
+            old = previous.get(result['name'], {}).get(metric)
+            if not old:
+                continue
+            change = (value - old) / old
+            if metric in HIGHER_IS_BETTER:
+                change = -change
+            row = (result['name'], metric, old, value, change)
+            changes.append(row)
+            if change > threshold:
+                regressions.append(row)
+    return changes, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--output', help='Write the results to this JSON file.')
+    parser.add_argument('--quick', action='store_true',
+                        help='Record fewer events, for a rough result.')
+    parser.add_argument('--group', dest='groups', action='append', choices=GROUPS,
+                        help='Only run these benchmarks. Can be repeated.')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+                        help='Compare two result files instead of running the benchmarks.')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Fail when a metric got worse by more than this fraction.')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        reports = []
+        for path in args.compare:
+            with open(path) as f:
+                reports.append(json.load(f))
+        changes, regressions = compare(reports[0], reports[1], args.threshold)
+        print('{:<36} {:<26} {:>12} {:>12} {:>8}'.format(
+            'benchmark', 'metric', 'before', 'after', 'worse'
+        ))
+        for name, metric, old, new, change in changes:
+            print('{:<36} {:<26} {:>12.6g} {:>12.6g} {:>+7.1%}{}'.format(
+                name, metric, old, new, change,
+                ' !' if change > args.threshold else ''
+            ))
+        if regressions:
+            print('{} metrics got worse by more than {:.0%}'.format(
+                len(regressions), args.threshold
+            ))
+            sys.exit(1)
+        return
+
+    report = run(args)
+    print_results(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+
+
+if __name__ == '__main__':
+    main()
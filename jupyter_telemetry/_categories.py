@@ -1,4 +1,6 @@
+import threading
 from collections import deque
+from urllib.parse import unquote
 
 from jsonschema import Draft7Validator, validators
 from jsonschema.exceptions import ValidationError
@@ -83,7 +85,7 @@ def extract_categories_from_errors(errors):
             yield from extract_categories_from_errors(e.context)
 
 
-def extract_categories_from_event(event, schema):
+def extract_categories_from_event(event, schema, extractor=None):
     """
     Generate a `dict` of `_ExtractCategories` whose keys are pointers to the properties
 
@@ -95,6 +97,10 @@ def extract_categories_from_event(event, schema):
     schema : dict
         A JSON schema
 
+    extractor : CategoryExtractor, optional
+        A `CategoryExtractor` already built for `schema`. A new one is
+        built when this is not given.
+
     Returns
     -------
     dict
@@ -104,15 +110,17 @@ def extract_categories_from_event(event, schema):
         (in the form of a tuple) and the value is a `_ExtractCategories`
         containing the categories associated with that property.
     """
+    if extractor is None:
+        extractor = CategoryExtractor(schema)
     return {
         tuple(c.absolute_path + deque([c.property])): c
-        for c in extract_categories_from_errors(
-            CategoryExtractor(schema).iter_errors(event)
-        )
+        for c in extract_categories_from_errors(extractor.iter_errors(event))
     }
 
 
-def filter_categories_from_event(event, schema, allowed_categories, allowed_properties):
+def filter_categories_from_event(
+    event, schema, allowed_categories, allowed_properties, extractor=None
+):
     """
     Filter properties from an event based on their categories.
 
@@ -136,14 +144,27 @@ def filter_categories_from_event(event, schema, allowed_categories, allowed_prop
         These properties are included in the output event even if not all of
         their properties are allowed.
 
+    extractor : CategoryExtractor, optional
+        A `CategoryExtractor` already built for `schema`.
+
     Returns
     -------
     dict
         The output event after category filtering
 
     """
-    categories = extract_categories_from_event(event, schema)
+    categories = extract_categories_from_event(event, schema, extractor)
+    return filter_event_by_categories(event, categories, allowed_categories, allowed_properties)
+
+
+def filter_event_by_categories(event, categories, allowed_categories, allowed_properties):
+    """
+    Filter properties from an event, given the categories returned by
+    `extract_categories_from_event`.
 
+    Takes the other arguments, and returns the same result, as
+    `filter_categories_from_event`.
+    """
     # Top-level properties without declared categories are set to null
     for property in event.keys():
         path = (property,)
@@ -182,3 +203,472 @@ def deep_get(instance, path):
     while result is not None and path:
         result = result[path.popleft()]
     return result
+
+
+# jsonschema (Draft 7) keywords that descend into an instance but are not
+# modelled by a `FilterPlan`. Categories found under them can only be
+# extracted by the dynamic `CategoryExtractor` walk.
+DYNAMIC_CATEGORIES_SCHEMA_KEYWORDS = {
+    'additionalProperties', 'patternProperties', 'dependencies',
+    'contains', 'propertyNames'
+}
+
+
+class _DynamicSchema(Exception):
+    """Raised while compiling a `FilterPlan` for schemas it can't model."""
+
+
+class _PlanNode(object):
+    """
+    The category entries that apply at one location in an event, and the
+    plans for the locations below it.
+    """
+    __slots__ = ('categories', 'children', 'items')
+
+    def __init__(self):
+        # property name -> frozenset of categories
+        self.categories = {}
+        # property name -> _PlanNode
+        self.children = {}
+        # (start, stop, _PlanNode) ranges of array indices, in schema order.
+        # `stop` is None for open-ended ranges.
+        self.items = []
+
+    def merge(self, other):
+        """Merge `other` into this node, `other` taking precedence."""
+        self.categories.update(other.categories)
+        for name, child in other.children.items():
+            self.children.setdefault(name, _PlanNode()).merge(child)
+        self.items.extend(other.items)
+
+    def element(self, index, _cache):
+        """Return the plan for the array element at `index`, or None."""
+        if len(self.items) == 1:
+            start, stop, node = self.items[0]
+            if index >= start and (stop is None or index < stop):
+                return node
+            return None
+        applicable = tuple(
+            i for i, (start, stop, _) in enumerate(self.items)
+            if index >= start and (stop is None or index < stop)
+        )
+        if not applicable:
+            return None
+        key = (id(self), applicable)
+        try:
+            return _cache[key]
+        except KeyError:
+            node = _cache[key] = _PlanNode()
+            for i in applicable:
+                node.merge(self.items[i][2])
+            return node
+
+
+class _PlanCompiler(object):
+
+    def __init__(self, schema):
+        self.schema = schema
+        self._check_scopes(schema)
+
+    def _check_scopes(self, schema):
+        # Nested `$schema` changes the validator class, and nested `$id`
+        # changes the base URI that `$ref`s are resolved against.
+        has_ref = False
+        has_nested_id = False
+        stack = [(schema, True)]
+        while stack:
+            value, is_root = stack.pop()
+            if isinstance(value, dict):
+                if not is_root and '$schema' in value:
+                    raise _DynamicSchema()
+                has_ref = has_ref or '$ref' in value
+                has_nested_id = has_nested_id or (not is_root and '$id' in value)
+                stack.extend((v, False) for v in value.values())
+            elif isinstance(value, list):
+                stack.extend((v, False) for v in value)
+        if has_ref and has_nested_id:
+            raise _DynamicSchema()
+
+    def _resolve(self, ref):
+        if not ref.startswith('#'):
+            raise _DynamicSchema()
+        target = self.schema
+        fragment = unquote(ref[1:])
+        if not fragment:
+            return target
+        if not fragment.startswith('/'):
+            raise _DynamicSchema()
+        for part in fragment[1:].split('/'):
+            part = part.replace('~1', '/').replace('~0', '~')
+            try:
+                if isinstance(target, list):
+                    target = target[int(part)]
+                else:
+                    target = target[part]
+            except (KeyError, IndexError, ValueError, TypeError):
+                raise _DynamicSchema()
+        return target
+
+    def compile(self):
+        root = _PlanNode()
+        self.collect(self.schema, root, ())
+        return root
+
+    def collect(self, schema, node, refs):
+        """
+        Add the category entries `schema` yields at `node`, in the order
+        the `CategoryExtractor` walk would visit them.
+        """
+        if schema is True or schema is False:
+            return
+        if not isinstance(schema, dict):
+            raise _DynamicSchema()
+
+        # Draft 7 ignores the siblings of `$ref`.
+        if '$ref' in schema:
+            ref = schema['$ref']
+            if ref in refs:
+                # Recursive schemas have no finite plan.
+                raise _DynamicSchema()
+            self.collect(self._resolve(ref), node, refs + (ref,))
+            return
+
+        for keyword, value in schema.items():
+            if keyword == 'properties':
+                self._collect_properties(value, node, refs)
+            elif keyword == 'allOf':
+                for subschema in value:
+                    self.collect(subschema, node, refs)
+            elif keyword == 'items':
+                self._collect_items(schema, value, node, refs)
+            elif keyword in DYNAMIC_CATEGORIES_SCHEMA_KEYWORDS:
+                if _mentions(value, ('properties', '$ref')):
+                    raise _DynamicSchema()
+            # Everything under IGNORE_CATEGORIES_SCHEMA_KEYWORDS is discarded
+            # by `extract_categories_from_errors`, and the remaining keywords
+            # do not descend into the instance.
+
+    def _collect_properties(self, properties, node, refs):
+        for name, subschema in properties.items():
+            if not isinstance(subschema, dict):
+                raise _DynamicSchema()
+            if 'categories' in subschema:
+                try:
+                    node.categories[name] = frozenset(subschema['categories'])
+                except TypeError:
+                    raise _DynamicSchema()
+        for name, subschema in properties.items():
+            # Property names are part of the schema path, so categories
+            # below a property named like an ignored keyword are discarded.
+            if name in IGNORE_CATEGORIES_SCHEMA_KEYWORDS:
+                continue
+            child = node.children.get(name)
+            if child is None:
+                child = node.children[name] = _PlanNode()
+            self.collect(subschema, child, refs)
+
+    def _collect_items(self, schema, items, node, refs):
+        if isinstance(items, list):
+            for index, subschema in enumerate(items):
+                child = _PlanNode()
+                self.collect(subschema, child, refs)
+                node.items.append((index, index + 1, child))
+            additional = schema.get('additionalItems')
+            if isinstance(additional, dict):
+                child = _PlanNode()
+                self.collect(additional, child, refs)
+                node.items.append((len(items), None, child))
+        elif isinstance(items, dict):
+            child = _PlanNode()
+            self.collect(items, child, refs)
+            node.items.append((0, None, child))
+
+
+def _mentions(value, keys):
+    """Check whether any `dict` nested in `value` has one of `keys`."""
+    if isinstance(value, dict):
+        if any(k in value for k in keys):
+            return True
+        return any(_mentions(v, keys) for v in value.values())
+    if isinstance(value, list):
+        return any(_mentions(v, keys) for v in value)
+    return False
+
+
+class FilterPlan(object):
+    """
+    A category filter compiled from a schema's `properties`/`items` tree.
+
+    `apply` produces the same output as `filter_categories_from_event` in a
+    single pass over the event, without running `CategoryExtractor` or
+    allocating an `ExtractCategories` per property.
+
+    Categories under `if`/`then`/`else`, `anyOf`, `oneOf` and `not` are
+    discarded by the dynamic walk, so the plan leaves them out. Schemas the
+    plan can't model statically (recursive or remote `$ref`s, nested
+    `$schema`/`$id`, or `properties` under `additionalProperties`,
+    `patternProperties`, `dependencies`, `contains` or `propertyNames`)
+    are marked `dynamic` and `apply` falls back to
+    `filter_categories_from_event`.
+
+    Parameters
+    ----------
+    schema : dict
+        A JSON schema that makes use of the `categories` keyword.
+
+    extractor : CategoryExtractor, optional
+        A `CategoryExtractor` built for `schema`, used by the fallback.
+    """
+
+    def __init__(self, schema, extractor=None):
+        self.schema = schema
+        self.extractor = extractor
+        try:
+            self._root = _PlanCompiler(schema).compile()
+        except _DynamicSchema:
+            self._root = None
+        self._element_cache = {}
+
+    @property
+    def dynamic(self):
+        """Whether `apply` falls back to the dynamic category walk."""
+        return self._root is None
+
+    def apply(self, event, allowed_categories, allowed_properties):
+        """
+        Filter properties from an event based on their categories.
+
+        Takes the same arguments, and returns the same result, as
+        `filter_categories_from_event`.
+        """
+        root = self._root
+        if root is None:
+            return filter_categories_from_event(
+                event, self.schema, allowed_categories, allowed_properties,
+                extractor=self.extractor
+            )
+
+        # Top-level properties without declared categories are set to null
+        categories = root.categories
+        for property in event.keys():
+            if property not in categories:
+                event[property] = None
+
+        self._apply(root, event, None, allowed_categories, allowed_properties)
+        return event
+
+    def _apply(self, node, instance, top, allowed_categories, allowed_properties):
+        for property, categories in node.categories.items():
+            if not (categories.issubset(allowed_categories) or
+                    (property if top is None else top) in allowed_properties):
+                instance[property] = None
+
+        if isinstance(instance, dict):
+            for property, child in node.children.items():
+                value = instance.get(property)
+                if value is not None:
+                    self._apply(
+                        child, value, property if top is None else top,
+                        allowed_categories, allowed_properties
+                    )
+        elif node.items and isinstance(instance, list):
+            for index, element in enumerate(instance):
+                if element is None:
+                    continue
+                child = node.element(index, self._element_cache)
+                if child is not None:
+                    self._apply(
+                        child, element, top,
+                        allowed_categories, allowed_properties
+                    )
+
+
+def compile_filter_plan(schema, extractor=None):
+    """
+    Compile a `FilterPlan` for `schema`.
+
+    Parameters
+    ----------
+    schema : dict
+        A JSON schema that makes use of the `categories` keyword.
+
+    extractor : CategoryExtractor, optional
+        A `CategoryExtractor` built for `schema`, used when the plan has
+        to fall back to the dynamic walk.
+
+    Returns
+    -------
+    FilterPlan
+    """
+    return FilterPlan(schema, extractor)
+
+
+_walk_state = threading.local()
+
+
+class _FusedWalk(object):
+    """The category entries collected while validating one event."""
+    __slots__ = ('event', 'entries', 'parents', 'parent', 'top', 'suppressed')
+
+    def __init__(self, event):
+        self.event = event
+        # (id(container), property) -> (container, property, categories, top, parent)
+        self.entries = {}
+        # (id(container), property) -> key of the enclosing property
+        self.parents = {}
+        self.parent = None
+        self.top = None
+        self.suppressed = 0
+
+
+def _fused_properties(validator, properties, instance, schema):
+    walk = getattr(_walk_state, 'walk', None)
+    if walk is None or walk.suppressed:
+        yield from _validate_properties(validator, properties, instance, schema)
+        return
+
+    parent = walk.parent
+    top = walk.top
+    for property, subschema in properties.items():
+        if "categories" in subschema:
+            walk.entries[(id(instance), property)] = (
+                instance, property, subschema["categories"], top, parent
+            )
+
+    if not validator.is_type(instance, "object"):
+        return
+
+    at_root = instance is walk.event
+    for property, subschema in properties.items():
+        if property not in instance:
+            continue
+        key = (id(instance), property)
+        walk.parents[key] = parent
+        walk.parent = key
+        if at_root:
+            walk.top = property
+        if property in IGNORE_CATEGORIES_SCHEMA_KEYWORDS:
+            walk.suppressed += 1
+        # Descend eagerly, so the walk state is restored before any error
+        # is handed back to a caller that may abandon this generator.
+        try:
+            errors = list(validator.descend(
+                instance[property], subschema, path=property, schema_path=property,
+            ))
+        finally:
+            walk.parent = parent
+            walk.top = top
+            if property in IGNORE_CATEGORIES_SCHEMA_KEYWORDS:
+                walk.suppressed -= 1
+        yield from errors
+
+
+def _suppress_categories(keyword):
+    """
+    Wrap a keyword validator so no categories are collected below it,
+    mirroring `IGNORE_CATEGORIES_SCHEMA_KEYWORDS`.
+    """
+    def suppressed(validator, value, instance, schema):
+        walk = getattr(_walk_state, 'walk', None)
+        if walk is None:
+            return keyword(validator, value, instance, schema)
+        walk.suppressed += 1
+        try:
+            return list(keyword(validator, value, instance, schema) or ())
+        finally:
+            walk.suppressed -= 1
+    return suppressed
+
+
+_validate_properties = JSONSchemaValidator.VALIDATORS["properties"]
+
+# A validator that collects category entries on the side while it
+# validates, instead of yielding them as errors like `CategoryExtractor`,
+# so that keywords like `anyOf` keep their usual validation semantics.
+CategoryValidator = validators.extend(
+    JSONSchemaValidator,
+    dict(
+        {"properties": _fused_properties},
+        **{
+            keyword: _suppress_categories(JSONSchemaValidator.VALIDATORS[keyword])
+            for keyword in IGNORE_CATEGORIES_SCHEMA_KEYWORDS
+            if keyword in JSONSchemaValidator.VALIDATORS
+        }
+    ),
+)
+
+
+def validate_and_filter_event(
+    event, schema, allowed_categories, allowed_properties, validator=None
+):
+    """
+    Validate an event and filter its properties based on their categories,
+    in a single walk over the event.
+
+    This raises the same `jsonschema.ValidationError` as validating the
+    event with `JSONSchemaValidator`, and returns the same result as
+    `filter_categories_from_event`, for schemas whose `FilterPlan` is not
+    `dynamic`.
+
+    Parameters
+    ----------
+    event : dict
+        The input telemetry event
+
+    schema : dict
+        A JSON schema that makes use of the the `categories` keyword.
+
+    allowed_categories : set
+        Specify which categories are allowed
+
+    allowed_properties : set
+        Whitelist certain top level properties.
+
+    validator : CategoryValidator, optional
+        A `CategoryValidator` already built for `schema`.
+
+    Returns
+    -------
+    dict
+        The output event after category filtering
+    """
+    if validator is None:
+        validator = CategoryValidator(schema)
+
+    walk = _FusedWalk(event)
+    outer = getattr(_walk_state, 'walk', None)
+    _walk_state.walk = walk
+    try:
+        for error in validator.iter_errors(event):
+            raise error
+    finally:
+        _walk_state.walk = outer
+
+    entries = walk.entries
+    nulled = set()
+
+    # Top-level properties without declared categories are set to null
+    for property in event.keys():
+        if (id(event), property) not in entries:
+            event[property] = None
+            nulled.add((id(event), property))
+
+    if not isinstance(allowed_categories, (set, frozenset)):
+        allowed_categories = set(allowed_categories)
+
+    parents = walk.parents
+    for key, (container, property, categories, top, parent) in entries.items():
+        if container is None:
+            continue
+        if (allowed_categories.issuperset(categories) or
+                (property if top is None else top) in allowed_properties):
+            continue
+        # Skip properties whose parent has already been removed.
+        while parent is not None and parent not in nulled:
+            parent = parents[parent]
+        if parent is not None:
+            continue
+        container[property] = None
+        nulled.add(key)
+
+    return event
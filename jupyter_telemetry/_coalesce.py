@@ -0,0 +1,117 @@
+"""
+Coalesce identical events recorded within a time window.
+"""
+from collections import OrderedDict
+import hashlib
+import json
+import threading
+import time
+
+
+class Coalescer(object):
+    """
+    Hold capsules for `window` seconds and count the identical capsules
+    recorded in the meantime.
+
+    Capsules are identical when everything but their timestamp is. The
+    first capsule of each group is held until `window` seconds after it
+    was added, then returned by `add` or `expired` with these fields:
+
+    ``__count__``
+        The number of identical capsules in the group.
+    ``__first_timestamp__``, ``__last_timestamp__``
+        The timestamps of the first and last capsules in the group.
+
+    At most `max_entries` groups are held. When the table is full, the
+    least recently used group is returned early.
+
+    Parameters
+    ----------
+    window : float
+        How long to hold each group, in seconds.
+    max_entries : int
+        The number of groups that can be held.
+    clock : callable, optional
+        Returns the current time in seconds.
+    """
+
+    def __init__(self, window, max_entries=10000, clock=time.monotonic):
+        self.window = window
+        self.max_entries = max_entries
+        self._clock = clock
+        # Maps a hash of each held capsule to
+        # [capsule, count, last timestamp, deadline], least recently used first.
+        self._groups = OrderedDict()
+        self._next_sweep = clock() + window
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._groups)
+
+    @staticmethod
+    def _key(capsule):
+        body = json.dumps(
+            {key: value for key, value in capsule.items() if key != '__timestamp__'},
+            sort_keys=True, default=str
+        )
+        return hashlib.blake2b(body.encode('utf-8'), digest_size=16).digest()
+
+    @staticmethod
+    def _finish(group):
+        capsule, count, last_timestamp, _ = group
+        capsule['__count__'] = count
+        capsule['__first_timestamp__'] = capsule['__timestamp__']
+        capsule['__last_timestamp__'] = last_timestamp
+        return capsule
+
+    def add(self, capsule):
+        """
+        Add a capsule to its group.
+
+        Returns
+        -------
+        list of dict
+            Groups that are finished: the capsule's own group, if its
+            window had ended, and any group evicted to make room.
+        """
+        key = self._key(capsule)
+        now = self._clock()
+        finished = []
+        with self._lock:
+            groups = self._groups
+            group = groups.get(key)
+            if group is not None and now >= group[3]:
+                finished.append(self._finish(groups.pop(key)))
+                group = None
+            if group is None:
+                groups[key] = [capsule, 1, capsule['__timestamp__'], now + self.window]
+                while len(groups) > self.max_entries:
+                    finished.append(self._finish(groups.popitem(last=False)[1]))
+            else:
+                group[1] += 1
+                group[2] = capsule['__timestamp__']
+                groups.move_to_end(key)
+        return finished
+
+    def due(self):
+        """Return True if some groups may have finished."""
+        return bool(self._groups) and self._clock() >= self._next_sweep
+
+    def expired(self, force=False):
+        """
+        Return the finished groups, or all the groups if `force` is True.
+        """
+        now = self._clock()
+        with self._lock:
+            groups = self._groups
+            keys = [
+                key for key, group in groups.items() if force or now >= group[3]
+            ]
+            finished = [self._finish(groups.pop(key)) for key in keys]
+            # Scan the table again when the next group finishes, but no
+            # more than ten times per window.
+            self._next_sweep = max(
+                min((group[3] for group in groups.values()), default=now),
+                now + self.window / 10
+            )
+        return finished
@@ -0,0 +1,93 @@
+"""
+Per-schema objects that are built once, when a schema is registered,
+and reused for every event recorded against that schema.
+"""
+import time
+
+from ._categories import (
+    CategoryExtractor, CategoryValidator, JSONSchemaValidator,
+    compile_filter_plan
+)
+
+
+class CompiledSchema(object):
+    """
+    The validators and category filter plan built for a single registered
+    schema.
+
+    Building a `jsonschema` validator sets up a reference resolver and the
+    keyword dispatch table, which is a significant share of the cost of
+    validating a small event, so it is done once per schema.
+    """
+    __slots__ = ('schema', 'validator', 'extractor', 'plan', 'fused')
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.validator = JSONSchemaValidator(schema)
+        self.extractor = CategoryExtractor(schema)
+        self.plan = compile_filter_plan(schema, self.extractor)
+        self.fused = CategoryValidator(schema)
+
+
+class SchemaCache(object):
+    """
+    A cache of `CompiledSchema` objects keyed by ``($id, version)``.
+
+    The cache is filled by `EventLog.register_schema`. A lookup misses
+    (and recompiles) when the key is unknown, or when the schema stored in
+    `EventLog.schemas` has been replaced since it was compiled.
+
+    Attributes
+    ----------
+    hits : int
+        Number of lookups answered from the cache.
+    misses : int
+        Number of lookups that had to compile the schema.
+    builds : int
+        Number of schemas compiled, including at registration time.
+    build_time : float
+        Total time, in seconds, spent compiling schemas.
+    """
+
+    def __init__(self):
+        self._compiled = {}
+        self.hits = 0
+        self.misses = 0
+        self.builds = 0
+        self.build_time = 0.0
+
+    def __len__(self):
+        return len(self._compiled)
+
+    def __contains__(self, key):
+        return key in self._compiled
+
+    def compile(self, key, schema):
+        """Compile `schema`, store it under `key` and return it."""
+        start = time.perf_counter()
+        compiled = CompiledSchema(schema)
+        self.build_time += time.perf_counter() - start
+        self.builds += 1
+        self._compiled[key] = compiled
+        return compiled
+
+    def get(self, key, schema):
+        """
+        Return the compiled form of `schema`, compiling it on a miss.
+        """
+        compiled = self._compiled.get(key)
+        if compiled is not None and compiled.schema is schema:
+            self.hits += 1
+            return compiled
+        self.misses += 1
+        return self.compile(key, schema)
+
+    def stats(self):
+        """Return the cache counters as a `dict`."""
+        return {
+            'size': len(self._compiled),
+            'hits': self.hits,
+            'misses': self.misses,
+            'builds': self.builds,
+            'build_time': self.build_time,
+        }
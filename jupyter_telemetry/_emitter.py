@@ -0,0 +1,297 @@
+"""
+Hand events off to a dedicated writer thread, or to a writer task on an
+asyncio event loop.
+"""
+import asyncio
+from collections import deque
+import logging
+import threading
+
+from ._shutdown import live_emitters
+
+
+OVERFLOW_POLICIES = ('block', 'drop_newest', 'drop_oldest')
+
+# Emitters that are still running, drained when the interpreter exits.
+_live_emitters = live_emitters
+
+
+class BackgroundEmitter(object):
+    """
+    A bounded queue drained by a dedicated writer thread.
+
+    Parameters
+    ----------
+    emit : callable
+        Called on the writer thread with each list of queued items.
+    maxsize : int
+        The number of items that can be waiting in the queue.
+    overflow : str
+        What `submit` does when the queue is full: "block" waits up to
+        `timeout` seconds for room and then drops the item, "drop_newest"
+        drops the submitted item and "drop_oldest" drops the oldest
+        queued item to make room.
+    timeout : float
+        How long "block" waits for room in the queue.
+    name : str, optional
+        The name of the writer thread.
+    on_drop : callable, optional
+        Called with each item dropped because the queue was full, whether
+        it was the submitted item or, with "drop_oldest", a queued one.
+
+    Attributes
+    ----------
+    emitted : int
+        Number of items handed to `emit`.
+    dropped : int
+        Number of items dropped because the queue was full.
+    errors : int
+        Number of items in batches for which `emit` raised.
+    """
+
+    def __init__(self, emit, maxsize=10000, overflow='block', timeout=1.0, name=None,
+                 on_drop=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(
+                'Unknown overflow policy {!r}, expected one of {}'.format(
+                    overflow, ', '.join(OVERFLOW_POLICIES)
+                )
+            )
+        self._emit = emit
+        self._on_drop = on_drop
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.timeout = timeout
+        self.emitted = 0
+        self.dropped = 0
+        self.errors = 0
+        self._queue = deque()
+        # Items queued or being emitted.
+        self._pending = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(
+            target=self._run, name=name or 'jupyter_telemetry-writer', daemon=True
+        )
+        self._thread.start()
+        _live_emitters.add(self)
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def qsize(self):
+        """Return the number of items waiting in the queue."""
+        return len(self._queue)
+
+    def submit(self, item):
+        """
+        Queue `item` to be emitted on the writer thread.
+
+        Returns
+        -------
+        bool
+            False if the item was dropped. True if it was queued, even if
+            the oldest queued item was dropped to make room for it.
+        """
+        dropped = None
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('Cannot submit to a closed emitter.')
+            queue = self._queue
+            if len(queue) >= self.maxsize:
+                if self.overflow == 'drop_oldest':
+                    dropped = queue.popleft()
+                    self._pending -= 1
+                    self.dropped += 1
+                else:
+                    has_room = self.overflow == 'block' and self._cond.wait_for(
+                        lambda: len(queue) < self.maxsize or self._closed,
+                        self.timeout
+                    )
+                    if not has_room or self._closed:
+                        self.dropped += 1
+                        dropped = item
+            if dropped is not item:
+                queue.append(item)
+                self._pending += 1
+                self._cond.notify_all()
+        # Outside the lock, so the callback can't hold up the writer thread.
+        if dropped is not None and self._on_drop is not None:
+            self._on_drop(dropped)
+        return dropped is not item
+
+    def _run(self):
+        cond = self._cond
+        queue = self._queue
+        while True:
+            with cond:
+                while not queue and not self._closed:
+                    cond.wait()
+                if not queue:
+                    return
+                batch = list(queue)
+                queue.clear()
+                # Wake up any producers blocked on a full queue.
+                cond.notify_all()
+            try:
+                self._emit(batch)
+            except Exception:
+                self.errors += len(batch)
+                logging.getLogger(__name__).exception('Error emitting events')
+            else:
+                self.emitted += len(batch)
+            with cond:
+                self._pending -= len(batch)
+                cond.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        Wait until every queued item has been emitted.
+
+        Returns
+        -------
+        bool
+            False if `timeout` expired first.
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending <= 0, timeout)
+
+    def close(self, timeout=None):
+        """Emit the queued items and stop the writer thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        _live_emitters.discard(self)
+
+    def stats(self):
+        """Return the emitter counters as a `dict`."""
+        return {
+            'queued': len(self._queue),
+            'emitted': self.emitted,
+            'dropped': self.dropped,
+            'errors': self.errors,
+        }
+
+
+def get_running_loop():
+    """Return the event loop running in this thread, or None."""
+    try:
+        return asyncio.get_running_loop()
+    except AttributeError:  # Python 3.6
+        return asyncio._get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class AsyncEmitter(object):
+    """
+    A bounded `asyncio.Queue` drained by a writer task.
+
+    Must be created while `loop` is running.
+
+    Parameters
+    ----------
+    write : coroutine function
+        Awaited by the writer task with each list of queued items.
+    loop : asyncio.AbstractEventLoop
+        The event loop the writer task runs on.
+    maxsize : int
+        The number of items that can be waiting in the queue. `put` waits
+        for room when the queue is full.
+
+    Attributes
+    ----------
+    emitted : int
+        Number of items passed to `write`.
+    dropped : int
+        Number of items `put_nowait` dropped because the queue was full.
+    errors : int
+        Number of items in batches for which `write` raised.
+    """
+
+    def __init__(self, write, loop, maxsize=10000):
+        self._write = write
+        self.loop = loop
+        self.emitted = 0
+        self.dropped = 0
+        self.errors = 0
+        self._queue = asyncio.Queue(maxsize)
+        self._closed = False
+        self._task = loop.create_task(self._run())
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def qsize(self):
+        """Return the number of items waiting in the queue."""
+        return self._queue.qsize()
+
+    async def put(self, item):
+        """Queue `item`, waiting for room if the queue is full."""
+        if self._closed:
+            raise RuntimeError('Cannot put to a closed emitter.')
+        await self._queue.put(item)
+
+    def put_nowait(self, item):
+        """
+        Queue `item` if there is room for it.
+
+        Returns
+        -------
+        bool
+            False if the item was dropped.
+        """
+        if self._closed:
+            raise RuntimeError('Cannot put to a closed emitter.')
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        return True
+
+    async def _run(self):
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+            try:
+                await self._write(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.errors += len(batch)
+                logging.getLogger(__name__).exception('Error emitting events')
+            else:
+                self.emitted += len(batch)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def flush(self):
+        """Wait until every queued item has been written."""
+        await self._queue.join()
+
+    async def close(self):
+        """Write the queued items and stop the writer task."""
+        self._closed = True
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    def stats(self):
+        """Return the emitter counters as a `dict`."""
+        return {
+            'queued': self._queue.qsize(),
+            'emitted': self.emitted,
+            'dropped': self.dropped,
+            'errors': self.errors,
+        }
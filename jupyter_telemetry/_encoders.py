@@ -0,0 +1,98 @@
+"""
+Serialize event capsules to JSON.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+ENCODER_NAMES = ('auto', 'json', 'orjson')
+
+
+def _default(obj):
+    """Serialize dates and times as ISO 8601 strings, anything else with str."""
+    isoformat = getattr(obj, 'isoformat', None)
+    if isoformat is not None:
+        return isoformat()
+    return str(obj)
+
+
+def json_encoder(capsule):
+    """Serialize a capsule with the standard library `json` module."""
+    return json.dumps(capsule, default=_default)
+
+
+def orjson_encoder(capsule):
+    """
+    Serialize a capsule with `orjson`, or with `json_encoder` if orjson
+    can't, e.g. for integers over 64 bits.
+    """
+    try:
+        data = orjson.dumps(capsule, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    except TypeError:
+        return json_encoder(capsule)
+    return data.decode('utf-8')
+
+
+def get_encoder(encoder):
+    """
+    Return the encoder function for `encoder`.
+
+    Parameters
+    ----------
+    encoder : str or callable
+        One of `ENCODER_NAMES`, or a callable that takes a capsule `dict`
+        and returns a `str`, which is returned unchanged.
+    """
+    if callable(encoder):
+        return encoder
+    if encoder == 'auto':
+        encoder = 'json' if orjson is None else 'orjson'
+    if encoder == 'json':
+        return json_encoder
+    if encoder == 'orjson':
+        if orjson is None:
+            raise ValueError('The orjson encoder requires the orjson package.')
+        return orjson_encoder
+    raise ValueError(
+        'Unknown encoder {!r}, expected one of {}'.format(
+            encoder, ', '.join(ENCODER_NAMES)
+        )
+    )
+
+
+def encode_batch(capsules, encode, binary, cache):
+    """
+    Serialize a batch of capsules, once per format.
+
+    Parameters
+    ----------
+    capsules : list of dict
+        The capsules to serialize.
+    encode : callable
+        The encoder function.
+    binary : bool
+        Whether to return UTF-8 encoded `bytes` rather than `str`.
+    cache : dict
+        Batches already serialized from the same capsules, keyed by
+        ``(encode, binary)``. The result is added to it.
+
+    Returns
+    -------
+    list of str or bytes
+    """
+    key = (encode, binary)
+    batch = cache.get(key)
+    if batch is None:
+        if binary:
+            batch = [
+                data.encode('utf-8')
+                for data in encode_batch(capsules, encode, False, cache)
+            ]
+        else:
+            batch = [encode(capsule) for capsule in capsules]
+        cache[key] = batch
+    return batch
@@ -0,0 +1,149 @@
+"""
+Count recorded events and time the phases of recording them.
+"""
+from bisect import bisect_left
+import threading
+import time
+
+
+# The outcomes events are counted under.
+OUTCOMES = ('accepted', 'rejected', 'invalid', 'sampled_out', 'dropped')
+
+# The phases of recording an event that are timed.
+PHASES = ('validate', 'filter', 'serialize', 'emit')
+
+# The phase each profiling phase passed to `Metrics.run` is timed as.
+PROFILE_PHASES = {
+    'validation': 'validate',
+    'filtering': 'filter',
+}
+
+# Upper bounds of the latency histogram buckets, in seconds.
+BUCKETS = (
+    1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+    1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0,
+)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_bound(bound):
+    return repr(float(bound))
+
+
+class Histogram(object):
+    """A latency histogram with fixed buckets."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        # One count per bucket, and one for values over the last bound.
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """Return ``(upper bound, count)`` pairs, like Prometheus buckets."""
+        total = 0
+        pairs = []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+
+class Metrics(object):
+    """
+    Per-schema event counters and per-phase latency histograms for an
+    `EventLog`.
+
+    Parameters
+    ----------
+    prefix : str
+        Prefix of the exported metric names.
+    """
+
+    def __init__(self, prefix='jupyter_telemetry'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        # Maps (schema, outcome) to a count.
+        self._events = {}
+        self._phases = {phase: Histogram() for phase in PHASES}
+
+    def count(self, outcome, schema_name, n=1):
+        key = (schema_name, outcome)
+        with self._lock:
+            self._events[key] = self._events.get(key, 0) + n
+
+    def observe(self, phase, seconds):
+        with self._lock:
+            self._phases[phase].observe(seconds)
+
+    def run(self, phase, func, *args, **kwargs):
+        """
+        Call ``func(*args, **kwargs)``, timing it under the metrics phase
+        for the profiling `phase`, like `Profile.run`.
+        """
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.observe(PROFILE_PHASES[phase], time.perf_counter() - start)
+        return result
+
+    def snapshot(self):
+        """
+        Return the metrics as a dict.
+
+        ``snapshot()['events'][schema][outcome]`` is the number of events
+        of `schema` with that outcome, and ``snapshot()['phases'][phase]``
+        has the ``count`` and ``sum`` of the latencies of `phase`, in
+        seconds, and cumulative ``buckets`` as ``(upper bound, count)``
+        pairs.
+        """
+        with self._lock:
+            events = {}
+            for (schema_name, outcome), count in self._events.items():
+                events.setdefault(schema_name, dict.fromkeys(OUTCOMES, 0))[outcome] = count
+            phases = {
+                phase: {
+                    'count': histogram.count,
+                    'sum': histogram.sum,
+                    'buckets': histogram.cumulative(),
+                }
+                for phase, histogram in self._phases.items()
+            }
+        return {'events': events, 'phases': phases}
+
+    def prometheus_text(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        events = '{}_events_total'.format(self.prefix)
+        phases = '{}_phase_seconds'.format(self.prefix)
+        lines = [
+            '# HELP {} Events by schema and outcome.'.format(events),
+            '# TYPE {} counter'.format(events),
+        ]
+        for schema_name, outcomes in sorted(snapshot['events'].items()):
+            for outcome, count in sorted(outcomes.items()):
+                lines.append('{}{{schema="{}",outcome="{}"}} {}'.format(
+                    events, _escape(schema_name), outcome, count
+                ))
+        lines.extend([
+            '# HELP {} Time spent in each phase of recording events.'.format(phases),
+            '# TYPE {} histogram'.format(phases),
+        ])
+        for phase in PHASES:
+            histogram = snapshot['phases'][phase]
+            for bound, count in histogram['buckets']:
+                le = '+Inf' if bound == float('inf') else _format_bound(bound)
+                lines.append('{}_bucket{{phase="{}",le="{}"}} {}'.format(
+                    phases, phase, le, count
+                ))
+            lines.append('{}_sum{{phase="{}"}} {!r}'.format(phases, phase, histogram['sum']))
+            lines.append('{}_count{{phase="{}"}} {}'.format(phases, phase, histogram['count']))
+        return '\n'.join(lines) + '\n'
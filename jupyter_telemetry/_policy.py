@@ -0,0 +1,61 @@
+"""
+Immutable per-schema policies built from the `allowed_schemas` trait.
+"""
+import copy
+from collections import namedtuple
+
+from ._ratelimit import TokenBucket
+from ._sampling import Sampler
+
+
+class SchemaPolicy(namedtuple('SchemaPolicy', [
+    'allowed_categories', 'allowed_properties', 'sampler', 'limiter', 'options'
+])):
+    """
+    The filtering policy for one allowed schema.
+
+    Attributes
+    ----------
+    allowed_categories : frozenset
+        Categories whose properties are recorded. Always includes
+        "unrestricted".
+    allowed_properties : frozenset
+        Top-level properties that are recorded regardless of their
+        categories.
+    sampler : Sampler or None
+        Decides which events are recorded, if the schema has "sampling"
+        options.
+    limiter : TokenBucket or None
+        Limits the rate of events recorded, if the schema has "rate_limit"
+        options.
+    options : dict
+        A copy of the options the policy was built from, used to notice
+        when they are changed in place.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_options(cls, options):
+        """Build a policy from one schema's entry in `allowed_schemas`."""
+        sampling = options.get('sampling')
+        rate_limit = options.get('rate_limit')
+        return cls(
+            allowed_categories=frozenset(
+                options.get('allowed_categories', ())
+            ).union(['unrestricted']),
+            allowed_properties=frozenset(options.get('allowed_properties', ())),
+            sampler=None if sampling is None else Sampler.from_options(sampling),
+            limiter=None if rate_limit is None else TokenBucket.from_options(rate_limit),
+            options=copy.deepcopy(options),
+        )
+
+
+def build_policies(allowed_schemas):
+    """
+    Build a `dict` mapping each schema name in `allowed_schemas` to its
+    `SchemaPolicy`.
+    """
+    return {
+        schema_name: SchemaPolicy.from_options(options)
+        for schema_name, options in (allowed_schemas or {}).items()
+    }
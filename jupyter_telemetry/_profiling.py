@@ -0,0 +1,180 @@
+"""
+Call hooks around the phases of recording an event.
+"""
+import cProfile
+import pstats
+import threading
+import time
+import tracemalloc
+
+try:
+    _perf_counter_ns = time.perf_counter_ns
+except AttributeError:  # Python 3.6
+    def _perf_counter_ns():
+        return int(time.perf_counter() * 1e9)
+
+
+PROFILE_PHASES = (
+    'lookup', 'validation', 'category_extraction', 'filtering', 'capsule_build', 'emit'
+)
+
+
+class ProfileHook(object):
+    """
+    Base class for profiling hooks.
+
+    Any callable can be a hook: it is called after each phase. Hooks that
+    also need to run before each phase, for instance to start a profiler,
+    subclass this class and implement `start`.
+    """
+
+    def start(self, phase, schema_id):
+        """Called before a phase starts."""
+
+    def __call__(self, phase, schema_id, event_size, elapsed_ns):
+        """
+        Called after a phase, even if it raised.
+
+        Parameters
+        ----------
+        phase : str
+            One of `PROFILE_PHASES`.
+        schema_id : str
+            The schema of the event. None for an emitted batch that mixes
+            several schemas.
+        event_size : int
+            The size of the event, serialized as JSON, in bytes. For
+            "emit", the size of the batch written to the sink. None for
+            "lookup" in `EventLog.record_events`, which looks a schema up
+            once per batch.
+        elapsed_ns : int
+            The duration of the phase, in nanoseconds.
+        """
+
+
+class CProfileHook(ProfileHook):
+    """
+    Profile the phases with `cProfile`.
+
+    Register it for the phases and schemas to investigate, for instance::
+
+        hook = CProfileHook()
+        eventlog.add_profile_hook(hook, phases=['validation'], schemas=['my/schema'])
+        ...
+        hook.stats().sort_stats('cumulative').print_stats(20)
+    """
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self, phase, schema_id):
+        self.profile.enable()
+
+    def __call__(self, phase, schema_id, event_size, elapsed_ns):
+        self.profile.disable()
+
+    def stats(self):
+        """Return the collected profile as `pstats.Stats`."""
+        return pstats.Stats(self.profile)
+
+
+class TracemallocHook(ProfileHook):
+    """
+    Measure the memory allocated during each phase with `tracemalloc`,
+    which is started if it isn't tracing yet.
+
+    Attributes
+    ----------
+    allocated : dict
+        Maps each phase to the net number of bytes allocated during it.
+    peak : dict
+        Maps each phase to the largest number of bytes allocated at once
+        during one call.
+    """
+
+    def __init__(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.allocated = {}
+        self.peak = {}
+        self._local = threading.local()
+
+    def start(self, phase, schema_id):
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        self._local.before = tracemalloc.get_traced_memory()[0]
+
+    def __call__(self, phase, schema_id, event_size, elapsed_ns):
+        current, peak = tracemalloc.get_traced_memory()
+        before = self._local.before
+        self.allocated[phase] = self.allocated.get(phase, 0) + current - before
+        self.peak[phase] = max(self.peak.get(phase, 0), peak - before)
+
+
+class Profile(object):
+    """The hooks that apply to one event, with its schema and size."""
+    __slots__ = ('hooks', 'schema_id', 'event_size')
+
+    def __init__(self, hooks, schema_id, event_size):
+        self.hooks = hooks
+        self.schema_id = schema_id
+        self.event_size = event_size
+
+    def run(self, phase, func, *args, **kwargs):
+        """Call ``func(*args, **kwargs)`` as `phase`."""
+        hooks = [hook for hook, phases in self.hooks if phases is None or phase in phases]
+        if not hooks:
+            return func(*args, **kwargs)
+        for hook in hooks:
+            start = getattr(hook, 'start', None)
+            if start is not None:
+                start(phase, self.schema_id)
+        started = _perf_counter_ns()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = _perf_counter_ns() - started
+            for hook in hooks:
+                hook(phase, self.schema_id, self.event_size, elapsed)
+
+
+class ProfileHooks(object):
+    """The profiling hooks registered with an `EventLog`."""
+
+    def __init__(self):
+        # (hook, phases, schemas), where phases and schemas are None to
+        # match all of them.
+        self._hooks = []
+        self._by_schema = {}
+
+    def __len__(self):
+        return len(self._hooks)
+
+    def add(self, hook, phases=None, schemas=None):
+        if phases is not None:
+            phases = frozenset(phases)
+            unknown = phases.difference(PROFILE_PHASES)
+            if unknown:
+                raise ValueError('Unknown profiling phase(s): {}'.format(
+                    ', '.join(sorted(unknown))
+                ))
+        if schemas is not None:
+            schemas = frozenset(schemas)
+        # Replace the list, so concurrent readers see the old or new hooks.
+        self._hooks = self._hooks + [(hook, phases, schemas)]
+        self._by_schema = {}
+
+    def remove(self, hook):
+        self._hooks = [entry for entry in self._hooks if entry[0] is not hook]
+        self._by_schema = {}
+
+    def for_schema(self, schema_id):
+        """Return ``(hook, phases)`` for the hooks that apply to a schema."""
+        by_schema = self._by_schema
+        hooks = by_schema.get(schema_id)
+        if hooks is None:
+            hooks = by_schema[schema_id] = [
+                (hook, phases) for hook, phases, schemas in self._hooks
+                if schemas is None or schema_id in schemas
+            ]
+        return hooks
@@ -0,0 +1,109 @@
+"""
+Limit the rate at which events are recorded, and count the events that
+are dropped.
+"""
+import threading
+import time
+
+
+RATE_LIMIT_KEYS = {'rate', 'burst'}
+
+# The schema of the summary events that report dropped events.
+DROPPED_EVENTS_SCHEMA_ID = 'jupyter_telemetry/dropped_events'
+DROPPED_EVENTS_SCHEMA_VERSION = 1
+
+
+def check_rate_limit_options(options):
+    """
+    Raise a ValueError if `options` aren't valid "rate_limit" options for
+    a schema in `EventLog.allowed_schemas`.
+    """
+    if not isinstance(options, dict):
+        raise ValueError('Rate limit options must be a dictionary.')
+    unknown_keys = set(options).difference(RATE_LIMIT_KEYS)
+    if unknown_keys:
+        raise ValueError(
+            'Unknown rate limit option(s): {}'.format(','.join(sorted(unknown_keys)))
+        )
+    rate = options.get('rate')
+    if not isinstance(rate, (int, float)) or rate <= 0:
+        raise ValueError('The rate limit must be a positive number of events per second.')
+    burst = options.get('burst')
+    if burst is not None and (not isinstance(burst, int) or burst < 1):
+        raise ValueError('The rate limit burst must be a positive integer.')
+
+
+class TokenBucket(object):
+    """
+    A token bucket that refills at `rate` tokens per second, up to `burst`
+    tokens.
+
+    Parameters
+    ----------
+    rate : float
+        The sustained number of events per second.
+    burst : int, optional
+        The number of events that can be recorded at once after a quiet
+        period. Defaults to `rate`, and is at least 1.
+    clock : callable, optional
+        Returns the current time in seconds.
+    """
+
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        self.rate = float(rate)
+        self.burst = float(max(1, rate if burst is None else burst))
+        self._clock = clock
+        self._tokens = self.burst
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_options(cls, options):
+        """Build a bucket from a schema's "rate_limit" options."""
+        check_rate_limit_options(options)
+        return cls(**options)
+
+    def take(self):
+        """Take a token, returning False if there are none left."""
+        with self._lock:
+            now = self._clock()
+            tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if tokens < 1:
+                self._tokens = tokens
+                return False
+            self._tokens = tokens - 1
+            return True
+
+
+class DropCounter(object):
+    """
+    Count the events dropped for each schema, to be reported every
+    `interval` seconds.
+    """
+
+    def __init__(self, interval=60.0, clock=time.monotonic):
+        self.interval = interval
+        self._clock = clock
+        self._counts = {}
+        self._start = clock()
+        self._lock = threading.Lock()
+
+    def add(self, schema_name):
+        with self._lock:
+            self._counts[schema_name] = self._counts.get(schema_name, 0) + 1
+
+    def due(self):
+        """Return True if there are drops to report and `interval` has passed."""
+        return bool(self._counts) and self._clock() - self._start >= self.interval
+
+    def take(self):
+        """
+        Return the drop counts and the number of seconds they were counted
+        over, and start counting again.
+        """
+        with self._lock:
+            now = self._clock()
+            counts, self._counts = self._counts, {}
+            elapsed, self._start = now - self._start, now
+        return counts, elapsed
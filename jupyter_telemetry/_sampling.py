@@ -0,0 +1,149 @@
+"""
+Decide which events of a schema are recorded, before they are validated.
+"""
+import random
+import threading
+import time
+import zlib
+
+
+SAMPLING_KEYS = {'rate', 'key', 'reservoir', 'interval'}
+
+
+def check_sampling_options(options):
+    """
+    Raise a ValueError if `options` aren't valid "sampling" options for a
+    schema in `EventLog.allowed_schemas`.
+    """
+    if not isinstance(options, dict):
+        raise ValueError('Sampling options must be a dictionary.')
+    unknown_keys = set(options).difference(SAMPLING_KEYS)
+    if unknown_keys:
+        raise ValueError(
+            'Unknown sampling option(s): {}'.format(','.join(sorted(unknown_keys)))
+        )
+    rate = options.get('rate', 1.0)
+    if not isinstance(rate, (int, float)) or not 0 <= rate <= 1:
+        raise ValueError('The sampling rate must be a number between 0 and 1.')
+    key = options.get('key')
+    if key is not None and not isinstance(key, str):
+        raise ValueError('The sampling key must be a property name.')
+    reservoir = options.get('reservoir')
+    if reservoir is not None and (not isinstance(reservoir, int) or reservoir < 1):
+        raise ValueError('The sampling reservoir must be a positive integer.')
+    interval = options.get('interval', 60.0)
+    if not isinstance(interval, (int, float)) or interval <= 0:
+        raise ValueError('The sampling interval must be a positive number of seconds.')
+
+
+class Sampler(object):
+    """
+    Sample the events recorded for one schema.
+
+    Events are first kept with probability `rate`. If `key` is given,
+    the decision is made by hashing the value of that top-level property
+    instead of at random, so events with the same value are either all
+    kept or all dropped.
+
+    If `reservoir` is given, at most that many of the events kept in each
+    `interval` are recorded, chosen uniformly at random (reservoir
+    sampling). They are held until the interval ends, when `drain`
+    returns them.
+
+    Parameters
+    ----------
+    rate : float
+        The fraction of events to keep.
+    key : str, optional
+        The property to hash to decide whether to keep an event.
+    reservoir : int, optional
+        The number of events recorded per interval.
+    interval : float
+        The length of a reservoir interval in seconds.
+    clock : callable, optional
+        Returns the current time in seconds.
+    """
+
+    def __init__(self, rate=1.0, key=None, reservoir=None, interval=60.0,
+                 clock=time.monotonic):
+        self.rate = rate
+        self.key = key
+        self.reservoir = reservoir
+        self.interval = interval
+        self._clock = clock
+        # Events kept by the hash or random draw compare below this.
+        self._threshold = int(rate * 2 ** 32)
+        self._random = random.Random()
+        self._lock = threading.Lock()
+        self._reset(clock())
+
+    @classmethod
+    def from_options(cls, options):
+        """Build a sampler from a schema's "sampling" options."""
+        check_sampling_options(options)
+        return cls(**options)
+
+    def _reset(self, now):
+        self._start = now
+        self._generation = getattr(self, '_generation', 0) + 1
+        self._seen = 0
+        self._slots = [None] * (self.reservoir or 0)
+
+    def sample(self, event):
+        """
+        Decide whether to record `event`.
+
+        Returns
+        -------
+        tuple or None
+            None if the event is dropped. Otherwise ``(rate, ticket)``,
+            where `rate` is the event's sample rate and `ticket` is None
+            if the event should be recorded now, or a ticket to pass to
+            `hold` with the event's capsule.
+        """
+        if self.rate < 1:
+            if self.key is None:
+                draw = self._random.getrandbits(32)
+            else:
+                value = event.get(self.key) if isinstance(event, dict) else None
+                draw = zlib.crc32(str(value).encode('utf-8'))
+            if draw >= self._threshold:
+                return
+        if self.reservoir is None:
+            return self.rate, None
+        with self._lock:
+            seen = self._seen
+            self._seen = seen + 1
+            if seen >= self.reservoir:
+                seen = self._random.randrange(seen + 1)
+                if seen >= self.reservoir:
+                    return
+            return self.rate, (self._generation, seen)
+
+    def hold(self, ticket, capsule):
+        """Hold a capsule in the reservoir slot reserved by `sample`."""
+        generation, slot = ticket
+        with self._lock:
+            if generation == self._generation:
+                self._slots[slot] = capsule
+
+    def due(self):
+        """Return True if the reservoir interval has ended."""
+        return self.reservoir is not None and self._clock() - self._start >= self.interval
+
+    def drain(self):
+        """
+        Return the capsules held in the reservoir with their sample rate
+        set, and start a new interval.
+        """
+        if self.reservoir is None:
+            return []
+        with self._lock:
+            seen = self._seen
+            capsules = [capsule for capsule in self._slots if capsule is not None]
+            self._reset(self._clock())
+        if capsules:
+            rate = self.rate * min(1.0, float(self.reservoir) / seen)
+            for capsule in capsules:
+                capsule['__sample_rate__'] = rate
+        return capsules
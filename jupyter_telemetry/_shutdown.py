@@ -0,0 +1,44 @@
+"""
+Write out queued events when the interpreter exits.
+
+Writer threads and sinks that are still open register here. A single
+`atexit` hook first drains the writer threads, whose queued events are
+written to the sinks, and only then closes the sinks, newest first, so
+that sinks wrapping other sinks are closed before them.
+"""
+import atexit
+import itertools
+import weakref
+
+
+_numbers = itertools.count()
+
+
+class LiveSet(object):
+    """Objects to close at exit, remembered in the order they were added."""
+
+    def __init__(self):
+        self._numbers = weakref.WeakKeyDictionary()
+
+    def add(self, obj):
+        self._numbers[obj] = next(_numbers)
+
+    def discard(self, obj):
+        self._numbers.pop(obj, None)
+
+    def newest_first(self):
+        items = list(self._numbers.items())
+        items.sort(key=lambda item: item[1], reverse=True)
+        return [obj for obj, _ in items]
+
+
+live_emitters = LiveSet()
+live_sinks = LiveSet()
+
+
+@atexit.register
+def _close_live():
+    for emitter in live_emitters.newest_first():
+        emitter.close()
+    for sink in live_sinks.newest_first():
+        sink.close()
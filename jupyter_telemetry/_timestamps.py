@@ -0,0 +1,74 @@
+"""
+Format event timestamps without building a `datetime` for each event.
+"""
+import time
+
+try:
+    _time_ns = time.time_ns
+    _monotonic_ns = time.monotonic_ns
+except AttributeError:  # Python 3.6
+    def _time_ns():
+        return int(time.time() * 1e9)
+
+    def _monotonic_ns():
+        return int(time.monotonic() * 1e9)
+
+
+TIMESTAMP_MODES = ('us', 'ns', 'monotonic')
+
+
+class TimestampProvider(object):
+    """
+    Format the current UTC time as an ISO 8601 event timestamp.
+
+    The date and time down to the second are formatted once per second
+    and cached, so each call only formats the fraction of a second.
+
+    Parameters
+    ----------
+    mode : str
+        "us" formats timestamps like ``datetime.utcnow().isoformat() + 'Z'``,
+        with microseconds that are left out when they are zero. "ns"
+        formats them with nanoseconds. "monotonic" also uses nanoseconds,
+        but measures the time elapsed since the provider was created with
+        a monotonic clock, so timestamps never go backwards within the
+        process, even when the system clock is adjusted.
+    clock : callable, optional
+        Returns the current time as nanoseconds since the epoch. Defaults
+        to the clock for `mode`.
+    """
+
+    def __init__(self, mode='us', clock=None):
+        if mode not in TIMESTAMP_MODES:
+            raise ValueError(
+                'Unknown timestamp mode {!r}, expected one of {}'.format(
+                    mode, ', '.join(TIMESTAMP_MODES)
+                )
+            )
+        self.mode = mode
+        self._micro = mode == 'us'
+        if clock is None:
+            if mode == 'monotonic':
+                offset = _time_ns() - _monotonic_ns()
+
+                def clock():
+                    return _monotonic_ns() + offset
+            else:
+                clock = _time_ns
+        self._clock = clock
+        # The last second formatted and its prefix, replaced together so
+        # concurrent callers always see a matching pair.
+        self._cached = (None, None)
+
+    def __call__(self):
+        second, fraction = divmod(self._clock(), 1000000000)
+        cached_second, prefix = self._cached
+        if second != cached_second:
+            prefix = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(second))
+            self._cached = (second, prefix)
+        if self._micro:
+            fraction //= 1000
+            if not fraction:
+                return prefix + 'Z'
+            return '%s.%06dZ' % (prefix, fraction)
+        return '%s.%09dZ' % (prefix, fraction)
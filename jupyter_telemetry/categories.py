@@ -1 +1,8 @@
-from ._categories import JSONSchemaValidator, filter_categories_from_event  # noqa
+from ._categories import (  # noqa
+    JSONSchemaValidator,
+    FilterPlan,
+    compile_filter_plan,
+    filter_categories_from_event,
+    filter_event_by_categories,
+    validate_and_filter_event,
+)
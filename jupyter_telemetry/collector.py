@@ -0,0 +1,191 @@
+"""
+A collector process that receives events from `SocketSink`s and writes
+them to disk.
+
+Run it with::
+
+    jupyter-telemetry-collector --socket=/run/jupyter/telemetry.sock --output=events.log.gz --compression=gzip
+"""
+import asyncio
+import os
+import signal
+import socket
+import stat
+
+from traitlets import Enum, Float, Integer, Unicode
+from traitlets.config import Application
+
+from ._version import __version__
+from .sinks import CompressedFileSink, FileSink
+from .sinks._compressed import COMPRESSIONS
+from .sinks._socket import FRAME_HEADER
+
+
+def _remove_stale_socket(path):
+    """
+    Remove the socket at `path` if it was left behind by a collector that
+    didn't exit cleanly.
+
+    Raises RuntimeError if `path` isn't a socket, or if another process is
+    still listening on it.
+    """
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise RuntimeError('{} exists and is not a socket'.format(path))
+    probe = socket.socket(socket.AF_UNIX)
+    probe.settimeout(1)
+    try:
+        probe.connect(path)
+    except ConnectionRefusedError:
+        # Nothing is listening on it any more.
+        os.unlink(path)
+        return
+    finally:
+        probe.close()
+    raise RuntimeError('Another process is listening on {}'.format(path))
+
+
+class CollectorApp(Application):
+    """Receive events over a Unix domain socket and write them to a file."""
+
+    name = 'jupyter-telemetry-collector'
+    version = __version__
+    description = __doc__
+
+    socket_path = Unicode(
+        'jupyter-telemetry.sock',
+        help='The Unix domain socket to listen on.'
+    ).tag(config=True)
+
+    output = Unicode(
+        'events.log',
+        help='The file to write events to.'
+    ).tag(config=True)
+
+    compression = Enum(
+        ('none',) + COMPRESSIONS,
+        default_value='none',
+        help='Compress the output file with this codec.'
+    ).tag(config=True)
+
+    buffer_size = Integer(
+        1 << 20,
+        help='Write events to the file once this many bytes are buffered.'
+    ).tag(config=True)
+
+    flush_interval = Float(
+        1.0,
+        help='Write buffered events to the file at least this often, in seconds.'
+    ).tag(config=True)
+
+    max_bytes = Integer(
+        0,
+        help='Rotate the file before it grows over this many bytes. 0 disables rotation.'
+    ).tag(config=True)
+
+    rotate_interval = Float(
+        0,
+        help='Rotate the file after this many seconds. 0 disables rotation.'
+    ).tag(config=True)
+
+    backup_count = Integer(
+        5,
+        help='The number of rotated files to keep.'
+    ).tag(config=True)
+
+    aliases = {
+        'socket': 'CollectorApp.socket_path',
+        'output': 'CollectorApp.output',
+        'compression': 'CollectorApp.compression',
+        'max-bytes': 'CollectorApp.max_bytes',
+        'backup-count': 'CollectorApp.backup_count',
+        'log-level': 'Application.log_level',
+    }
+
+    received = 0
+
+    def make_sink(self):
+        kwargs = dict(
+            buffer_size=self.buffer_size,
+            flush_interval=self.flush_interval,
+            max_bytes=self.max_bytes,
+            rotate_interval=self.rotate_interval,
+            backup_count=self.backup_count,
+        )
+        if self.compression == 'none':
+            return FileSink(self.output, **kwargs)
+        return CompressedFileSink(self.output, compression=self.compression, **kwargs)
+
+    async def _handle(self, reader, writer):
+        done = self._loop.create_future()
+        self._connections[writer] = done
+        try:
+            while True:
+                header = await reader.readexactly(FRAME_HEADER.size)
+                payload = await reader.readexactly(FRAME_HEADER.unpack(header)[0])
+                events = payload.split(b'\n')[:-1]
+                # The sink can block when its buffer is full, so a slow
+                # disk only holds up this client, which stops reading
+                # from its socket, and not the other clients.
+                await self._loop.run_in_executor(None, self.sink.write_batch, events)
+                self.received += len(events)
+        except asyncio.IncompleteReadError:
+            # The client disconnected, maybe in the middle of a frame,
+            # which it sends again when it reconnects.
+            pass
+        finally:
+            writer.close()
+            del self._connections[writer]
+            done.set_result(None)
+
+    async def serve(self):
+        """Receive events until `stop` is called."""
+        if not hasattr(socket, 'AF_UNIX'):
+            raise RuntimeError('Unix domain sockets are not available on this platform')
+        self._loop = asyncio.get_event_loop()
+        if getattr(self, '_stopped', None) is None:
+            self._stopped = asyncio.Event()
+        _remove_stale_socket(self.socket_path)
+        self.sink = self.make_sink()
+        self._connections = {}
+        server = await asyncio.start_unix_server(self._handle, self.socket_path)
+        self.log.info('Writing events from %s to %s', self.socket_path, self.output)
+        try:
+            await self._stopped.wait()
+        finally:
+            server.close()
+            await server.wait_closed()
+            # Events already received from connected clients are written.
+            connections = list(self._connections.items())
+            for writer, _ in connections:
+                writer.close()
+            await asyncio.gather(*(done for _, done in connections))
+            self.sink.close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            self.log.info('Wrote %d events to %s', self.received, self.output)
+
+    def stop(self):
+        """Stop `serve`, from any thread."""
+        self._loop.call_soon_threadsafe(self._stopped.set)
+
+    def start(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._stopped = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self._stopped.set)
+        try:
+            loop.run_until_complete(self.serve())
+        finally:
+            loop.close()
+
+
+main = CollectorApp.launch_instance
+
+
+if __name__ == '__main__':
+    main()
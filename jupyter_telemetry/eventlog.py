@@ -1,11 +1,11 @@
 """
 Emit structured, discrete events when various actions happen.
 """
-import json
+import inspect
+import itertools
 import logging
-from datetime import datetime
+import time
 
-from pythonjsonlogger import jsonlogger
 try:
     from ruamel.yaml import YAML
 except ImportError as e:
@@ -23,24 +23,113 @@ except ImportError as e:
         # conda install the 'real' ruamel.yaml to fix
         raise ImportError("Missing dependency ruamel.yaml. Try: `conda install ruamel.yaml`")
 
+from traitlets import Bool, Callable, Enum, Float, Integer, TraitError, Union, observe
 from traitlets.config import Configurable, Config
+from jsonschema.exceptions import ValidationError
 
-from .traits import Handlers, SchemaOptions
+from .traits import Handlers, SchemaOptions, Sinks
 from . import TELEMETRY_METADATA_VERSION
 
-from .categories import JSONSchemaValidator, filter_categories_from_event
+from .categories import JSONSchemaValidator, filter_event_by_categories, validate_and_filter_event
+from ._categories import extract_categories_from_event
+from ._coalesce import Coalescer
+from ._compiled import SchemaCache
+from ._encoders import ENCODER_NAMES, encode_batch, get_encoder
+from ._metrics import Metrics
+from ._profiling import Profile, ProfileHooks, _perf_counter_ns
+from ._emitter import (
+    AsyncEmitter, BackgroundEmitter, OVERFLOW_POLICIES, get_running_loop
+)
+from ._policy import SchemaPolicy, build_policies
+from ._ratelimit import (
+    DROPPED_EVENTS_SCHEMA_ID, DROPPED_EVENTS_SCHEMA_VERSION, DropCounter, TokenBucket
+)
+from ._timestamps import TIMESTAMP_MODES, TimestampProvider
+from .sinks import AsyncSink, HandlerSink
 
 yaml = YAML(typ='safe')
 
+# Numbers the EventLogs created by this process. Unlike id(), a number is
+# never reused, even after its EventLog is garbage collected.
+_eventlog_numbers = itertools.count()
 
-def _skip_message(record, **kwargs):
+
+def _takes_timeout(flush):
+    """Return whether a sink's `flush` method takes a `timeout` argument."""
+    try:
+        return 'timeout' in inspect.signature(flush).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def _sink_formats(sinks):
+    """
+    Return ``(sink, encode, binary)`` for each sink, where `encode` is
+    None for sinks that use the EventLog's encoder.
+    """
+    formats = []
+    for sink in sinks:
+        encoder = sink.encoder
+        formats.append((
+            sink,
+            None if encoder is None else get_encoder(encoder),
+            sink.binary,
+        ))
+    return formats
+
+
+def _release_logger(logger):
+    """Detach the handlers of `logger`, and remove it from `logging`."""
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    manager = logger.manager
+    # logging keeps its loggers in loggerDict, and the loggers whose
+    # parents don't exist yet in placeholders for the parents.
+    with logging._lock:
+        if manager.loggerDict.get(logger.name) is logger:
+            del manager.loggerDict[logger.name]
+        name = logger.name
+        while '.' in name:
+            name = name.rpartition('.')[0]
+            placeholder = manager.loggerDict.get(name)
+            if isinstance(placeholder, logging.PlaceHolder):
+                placeholder.loggerMap.pop(logger, None)
+
+
+def _emit_queued(batch):
+    """
+    Emit ``(eventlog, capsule)`` pairs queued for the writer thread, in
+    order, each with the `EventLog` that recorded it.
+
+    A writer thread is shared by an EventLog and its children, which can
+    have their own encoders, metrics and profiling hooks.
     """
-    Remove 'message' from log record.
-    It is always emitted with 'null', and we do not want it,
-    since we are always emitting events only
+    start = 0
+    for end in range(1, len(batch) + 1):
+        if end == len(batch) or batch[end][0] is not batch[start][0]:
+            batch[start][0]._emit([capsule for _, capsule in batch[start:end]])
+            start = end
+
+
+def _count_dropped(item):
     """
-    del record['message']
-    return json.dumps(record, **kwargs)
+    Count an ``(eventlog, capsule)`` pair dropped from a full writer thread
+    queue, in the metrics of the `EventLog` that recorded it.
+    """
+    eventlog, capsule = item
+    if eventlog.metrics is not None:
+        eventlog.metrics.count('dropped', capsule['__schema__'])
+
+
+def _run_phase(phase, func, *args, **kwargs):
+    """Run a phase of recording an event, without timing it."""
+    return func(*args, **kwargs)
+
+
+def _format_timestamp_override(timestamp_override):
+    if timestamp_override is None:
+        return None
+    return timestamp_override.isoformat() + 'Z'
 
 
 class EventLog(Configurable):
@@ -56,6 +145,36 @@ class EventLog(Configurable):
         """
     ).tag(config=True)
 
+    sinks = Sinks(
+        [],
+        allow_none=True,
+        help="""A list of jupyter_telemetry.sinks.Sink or AsyncSink instances to send events to.
+
+        Sinks are passed each event serialized with the encoder. Async sinks
+        are written to from the asyncio event loop that events are recorded
+        on, by arecord_event, or by record_event when it is called while an
+        event loop is running.
+        """
+    ).tag(config=True)
+
+    encoder = Union(
+        [Enum(list(ENCODER_NAMES)), Callable()],
+        default_value='auto',
+        help="""How events are serialized to JSON.
+
+        "json" uses the standard library json module and "orjson" uses the
+        orjson package, falling back to json for events orjson can't
+        serialize, like integers over 64 bits. "auto" (the default) uses
+        orjson if it is installed, and json otherwise. Can also be a
+        callable that takes an event capsule dict and returns a str.
+
+        The two don't write exactly the same JSON: json separates items
+        with ", " and escapes non-ASCII characters, orjson doesn't. With
+        "auto", the output changes when orjson is installed or removed;
+        pick "json" or "orjson" if it must not.
+        """
+    ).tag(config=True)
+
     allowed_schemas = SchemaOptions(
         {},
         allow_none=True,
@@ -64,6 +183,134 @@ class EventLog(Configurable):
 
         Each schema you want to record must be manually specified.
         The default, an empty list, means no events are recorded.
+        Schemas added, removed or changed in place take effect on the next
+        event.
+        """
+    ).tag(config=True)
+
+    engine = Enum(
+        ['two-pass', 'fused'],
+        default_value='two-pass',
+        help="""How events are validated and filtered.
+
+        "two-pass" validates each event, then filters its properties with
+        a category filter plan compiled when the schema is registered.
+        "fused" validates the event and collects its categories in a single
+        walk. Schemas whose categories can't be planned statically always
+        use "two-pass".
+        """
+    ).tag(config=True)
+
+    background_emission = Bool(
+        False,
+        help="""Emit events from a dedicated writer thread.
+
+        When enabled, record_event hands each event to a bounded queue
+        and returns; JSON formatting and handler I/O happen on the writer
+        thread. Call flush() or close() to wait for queued events to be
+        written.
+        """
+    ).tag(config=True)
+
+    queue_size = Integer(
+        10000,
+        help="""The number of events that can wait to be written in background emission mode,
+        or by the asyncio writer task before arecord_event waits for room."""
+    ).tag(config=True)
+
+    overflow_policy = Enum(
+        list(OVERFLOW_POLICIES),
+        default_value='block',
+        help="""What to do with an event when the background emission queue is full.
+
+        "block" waits up to overflow_timeout seconds for room and then drops
+        the event, "drop_newest" drops the new event and "drop_oldest" drops
+        the oldest queued event.
+        """
+    ).tag(config=True)
+
+    overflow_timeout = Float(
+        1.0,
+        help="How long, in seconds, the \"block\" overflow policy waits for room in the queue."
+    ).tag(config=True)
+
+    timestamp_mode = Enum(
+        list(TIMESTAMP_MODES),
+        default_value='us',
+        help="""How event timestamps are generated.
+
+        "us" (the default) records the current UTC time with microseconds.
+        "ns" records it with nanoseconds. "monotonic" also uses nanoseconds,
+        but measures time with a monotonic clock from the wall-clock time
+        when the EventLog was created, so the timestamps of events recorded
+        by one process never go backwards, even if the system clock is
+        adjusted. The timestamp_override argument of record_event takes
+        precedence.
+        """
+    ).tag(config=True)
+
+    rate_limit = Float(
+        0,
+        help="""The number of events per second that can be recorded, across all schemas.
+
+        Events over the limit are dropped before they are validated, and
+        counted in periodic dropped-events summaries. Per-schema limits can
+        be set with the "rate_limit" option in allowed_schemas. 0 (the
+        default) means no limit.
+        """
+    ).tag(config=True)
+
+    rate_limit_burst = Integer(
+        0,
+        help="""The number of events that can be recorded at once, over rate_limit,
+        after a quiet period. Defaults to rate_limit."""
+    ).tag(config=True)
+
+    drop_summary_interval = Float(
+        60.0,
+        help="""How often, in seconds, to record a summary of the events dropped by rate limits.
+
+        The summary is an event with the "jupyter_telemetry/dropped_events"
+        schema, that maps each schema name to the number of its events
+        dropped since the previous summary. It is recorded with the next
+        event after the interval ends, or by flush() and close().
+        """
+    ).tag(config=True)
+
+    coalesce_window = Float(
+        0,
+        help="""Coalesce identical events recorded within this many seconds.
+
+        When set, each event is held for at least coalesce_window
+        seconds, and identical events (after filtering, ignoring their
+        timestamps) recorded in the meantime are counted rather than
+        recorded. The held event is recorded, with "__count__",
+        "__first_timestamp__" and "__last_timestamp__" fields, with the
+        next event after its window ends, or by flush() and close(). There
+        is no timer, so call flush() periodically if events must not be
+        held for long after a quiet period. 0 (the default) disables
+        coalescing.
+        """
+    ).tag(config=True)
+
+    coalesce_max_entries = Integer(
+        10000,
+        help="""The number of distinct events that can be held for coalescing.
+
+        When more distinct events are held, the least recently seen event
+        is recorded early."""
+    ).tag(config=True)
+
+    instrumentation = Bool(
+        False,
+        help="""Count events and time the phases of recording them.
+
+        When enabled, the metrics attribute counts events by schema and
+        outcome (accepted, rejected by allowed_schemas, invalid, sampled
+        out, dropped), and keeps latency histograms of the validate,
+        filter, serialize and emit phases. metrics.snapshot() returns them
+        as a dict, and metrics.prometheus_text() in the Prometheus text
+        format. When disabled (the default), metrics is None.
         """
     ).tag(config=True)
 
@@ -71,25 +318,211 @@ class EventLog(Configurable):
         # We need to initialize the configurable before
         # adding the logging handlers.
         super().__init__(*args, **kwargs)
-        # Use a unique name for the logger so that multiple instances of EventLog do not write
-        # to each other's handlers.
-        log_name = __name__ + '.' + str(id(self))
-        self.log = logging.getLogger(log_name)
-        # We don't want events to show up in the default logs
-        self.log.propagate = False
-        # We will use log.info to emit
-        self.log.setLevel(logging.INFO)
+        self._number = next(_eventlog_numbers)
+        # Created by the log property when it is first used.
+        self._log = None
+        # The EventLog whose sinks and writer thread this one shares.
+        self._parent = None
+        # The state a child shares with its parent: "policies", "limiter",
+        # "drops" and "metrics", until its own traits replace it.
+        self._shared = set()
+        self._encode = get_encoder(self.encoder)
+        self.metrics = None
+        self._instrumentation_changed()
+        # Set when profiling hooks are registered.
+        self._profile_hooks = None
+        self._now = TimestampProvider(self.timestamp_mode)
+        self._limiter = None
+        self._rate_limit_changed()
+        self._drops = DropCounter(self.drop_summary_interval)
+        self._coalescer = None
+        self._coalesce_changed()
+        self._handlers_or_sinks_changed()
         self.schemas = {}
-        # Add each handler to the logger and format the handlers.
-        if self.handlers:
-            formatter = jsonlogger.JsonFormatter(json_serializer=_skip_message)
-            for handler in self.handlers:
-                handler.setFormatter(formatter)
-                self.log.addHandler(handler)
+        # Validators compiled for each registered schema, keyed like `schemas`.
+        self.schema_cache = SchemaCache()
+        self._policies = build_policies(self.allowed_schemas)
+        # Writer thread used in background emission mode.
+        self.emitter = None
+        # Writer task used by arecord_event and async sinks.
+        self._async_emitter = None
+        # Whether we warned about events dropped for the async sinks.
+        self._warned_no_loop = False
+        if self.background_emission:
+            self.emitter = BackgroundEmitter(
+                _emit_queued,
+                maxsize=self.queue_size,
+                overflow=self.overflow_policy,
+                timeout=self.overflow_timeout,
+                name='EventLog-{}'.format(self._number),
+                on_drop=_count_dropped,
+            )
+
+    @property
+    def log(self):
+        """
+        A logger unique to this EventLog.
+
+        Events are written to the handlers directly, not through this
+        logger, which is only created when it is first used, and removed
+        from `logging` by `close`.
+        """
+        if self._log is None:
+            # Use a unique name for the logger so that multiple instances of
+            # EventLog do not write to each other's handlers.
+            log = logging.getLogger('{}.{}'.format(__name__, self._number))
+            # We don't want events to show up in the default logs
+            log.propagate = False
+            log.setLevel(logging.INFO)
+            self._log = log
+        return self._log
+
+    def child(self, **kwargs):
+        """
+        Return a lightweight EventLog that shares this one's sinks.
+
+        The child writes to the same handlers and sinks, through the same
+        writer thread in background emission mode, and shares the
+        registered schemas and their compiled validators, so creating one
+        costs little. Its other traits are copied from this EventLog, and
+        can be changed with keyword arguments, e.g. to allow different
+        schemas. The child's encoder, metrics and profiling hooks apply to
+        its events, even when the shared writer thread writes them.
+        Closing the child records its held events and flushes the
+        shared sinks, but leaves them open.
+
+        Unless they are changed with keyword arguments, the child also
+        shares the parent's limits and counters: the schema policies
+        built from `allowed_schemas`, with their rate limits and
+        reservoirs, the global rate limit, the dropped events summary
+        and the metrics. So limits apply across all the children of an
+        EventLog, not to each child. These are shared as they are when
+        the child is created; later changes to the parent's traits don't
+        apply to existing children.
+
+        Children suit short-lived EventLogs, like one per request or per
+        spawner.
+        """
+        shared = {'handlers', 'sinks', 'background_emission'}.intersection(kwargs)
+        if shared:
+            raise TypeError('A child EventLog cannot set {}'.format(', '.join(sorted(shared))))
+        traits = {
+            name: getattr(self, name)
+            for name in self.trait_names(config=True)
+            if name not in kwargs
+        }
+        traits.update(kwargs)
+        traits['background_emission'] = False
+        child = type(self)(**traits)
+        child._parent = self
+        child.schemas = self.schemas
+        child.schema_cache = self.schema_cache
+        child.emitter = self.emitter
+        if 'allowed_schemas' not in kwargs:
+            child._policies = self._policies
+            child._shared.add('policies')
+        if not {'rate_limit', 'rate_limit_burst'}.intersection(kwargs):
+            child._limiter = self._limiter
+            child._shared.add('limiter')
+        if 'drop_summary_interval' not in kwargs:
+            child._drops = self._drops
+            child._shared.add('drops')
+        if 'instrumentation' not in kwargs:
+            child.metrics = self.metrics
+            child._shared.add('metrics')
+        return child
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    @observe('encoder')
+    def _encoder_changed(self, change):
+        try:
+            self._encode = get_encoder(change['new'])
+        except ValueError as e:
+            raise TraitError(str(e))
+
+    @observe('instrumentation')
+    def _instrumentation_changed(self, change=None):
+        self.metrics = Metrics() if self.instrumentation else None
+        getattr(self, '_shared', set()).discard('metrics')
+
+    @observe('timestamp_mode')
+    def _timestamp_mode_changed(self, change):
+        self._now = TimestampProvider(change['new'])
+
+    @observe('rate_limit', 'rate_limit_burst')
+    def _rate_limit_changed(self, change=None):
+        getattr(self, '_shared', set()).discard('limiter')
+        self._limiter = None
+        if self.rate_limit > 0:
+            self._limiter = TokenBucket(self.rate_limit, self.rate_limit_burst or None)
+
+    @observe('coalesce_window', 'coalesce_max_entries')
+    def _coalesce_changed(self, change=None):
+        old_coalescer = getattr(self, '_coalescer', None)
+        self._coalescer = None
+        if self.coalesce_window > 0:
+            self._coalescer = Coalescer(self.coalesce_window, self.coalesce_max_entries)
+        if old_coalescer is not None:
+            self._dispatch(old_coalescer.expired(force=True))
+
+    @observe('drop_summary_interval')
+    def _drop_summary_interval_changed(self, change):
+        drops = getattr(self, '_drops', None)
+        if 'drops' in getattr(self, '_shared', ()):
+            # Don't change the parent's summary interval.
+            self._shared.discard('drops')
+            self._drops = DropCounter(change['new'])
+        elif drops is not None:
+            drops.interval = change['new']
+
+    @observe('handlers', 'sinks')
+    def _handlers_or_sinks_changed(self, change=None):
+        # Handlers are written to through HandlerSink adapters, alongside
+        # the synchronous sinks.
+        sync_sinks = [HandlerSink(handler) for handler in self.handlers or ()]
+        async_sinks = []
+        for sink in self.sinks or ():
+            if isinstance(sink, AsyncSink):
+                async_sinks.append(sink)
+            else:
+                sync_sinks.append(sink)
+        self._sync_sinks = sync_sinks
+        self._async_sinks = async_sinks
+        self._sync_formats = _sink_formats(sync_sinks)
+        # Sinks whose flush can be given the time left to flush.
+        self._timed_flushes = {
+            id(sink) for sink in sync_sinks if _takes_timeout(sink.flush)
+        }
+        self._async_formats = _sink_formats(async_sinks)
+
+    @observe('allowed_schemas')
+    def _allowed_schemas_changed(self, change):
+        # Swap in the new policies with a single assignment, so concurrent
+        # calls to record_event see either the old or the new policies.
+        old_policies = getattr(self, '_policies', None)
+        if 'policies' in getattr(self, '_shared', ()):
+            # The parent records the events held by its samplers.
+            self._shared.discard('policies')
+            old_policies = None
+        self._policies = build_policies(change['new'])
+        if old_policies:
+            # Record the events held by the old samplers.
+            self._drain_samplers(old_policies)
 
     def _load_config(self, cfg, section_names=None, traits=None):
         """Load EventLog traits from a Config object, patching the
-        handlers trait in the Config object to avoid deepcopy errors.
+        handlers and sinks traits in the Config object to avoid deepcopy errors.
         """
         my_cfg = self._find_my_config(cfg)
         handlers = my_cfg.pop("handlers", [])
@@ -100,6 +533,14 @@ class EventLog(Configurable):
 
         my_cfg["handlers"] = get_handlers
 
+        if "sinks" in my_cfg:
+            sinks = my_cfg.pop("sinks")
+
+            def get_sinks():
+                return sinks
+
+            my_cfg["sinks"] = get_sinks
+
         # Build a new eventlog config object.
         eventlog_cfg = Config({"EventLog": my_cfg})
         super(EventLog, self)._load_config(eventlog_cfg, section_names=None, traits=None)
@@ -170,28 +611,49 @@ class EventLog(Configurable):
                     'have a category field.'.format(p)
                 )
 
-        self.schemas[(schema['$id'], schema['version'])] = schema
+        key = (schema['$id'], schema['version'])
+        self.schema_cache.compile(key, schema)
+        self.schemas[key] = schema
+
+    def get_schema_policy(self, schema_name):
+        """
+        Return the `SchemaPolicy` for a given schema from the EventLog's
+        config, or None if the schema is not allowed.
+        """
+        # allowed_schemas is checked on every call, so that schemas removed
+        # or changed in place, rather than by reassigning the trait, take
+        # effect immediately.
+        allowed_schemas = self.allowed_schemas
+        if not allowed_schemas or schema_name not in allowed_schemas:
+            return None
+        options = allowed_schemas[schema_name]
+        policies = self._policies
+        policy = policies.get(schema_name)
+        if policy is None or policy.options != options:
+            old_policy, policy = policy, SchemaPolicy.from_options(options)
+            # Update the dict in place so children sharing it see the change.
+            policies[schema_name] = policy
+            if old_policy is not None and old_policy.sampler is not None:
+                # Record the events held by the old sampler.
+                self._dispatch(old_policy.sampler.drain())
+        return policy
+
+    def _get_schema_policy(self, schema_name):
+        policy = self.get_schema_policy(schema_name)
+        if policy is None:
+            raise KeyError(schema_name)
+        return policy
 
     def get_allowed_properties(self, schema_name):
         """Get the allowed properties for an allowed schema."""
-        config = self.allowed_schemas[schema_name]
-        try:
-            return set(config["allowed_properties"])
-        except KeyError:
-            return set()
+        return set(self._get_schema_policy(schema_name).allowed_properties)
 
     def get_allowed_categories(self, schema_name):
         """
         Return a set of allowed categories for a given schema
         from the EventLog's config.
         """
-        config = self.allowed_schemas[schema_name]
-        try:
-            allowed_categories = config["allowed_categories"]
-            allowed_categories.append("unrestricted")
-            return set(allowed_categories)
-        except KeyError:
-            return {"unrestricted"}
+        return set(self._get_schema_policy(schema_name).allowed_categories)
 
     def record_event(self, schema_name, version, event, timestamp_override=None):
         """
@@ -211,11 +673,192 @@ class EventLog(Configurable):
         Returns
         -------
         dict
-            The recorded event data
+            The recorded event data, or None if the event is not recorded,
+            or is held for reservoir sampling or coalescing.
+        """
+        capsule = self._build_event(schema_name, version, event, timestamp_override)
+        if capsule is not None:
+            self._dispatch((capsule,))
+        return capsule
+
+    def record_events(self, schema_name, version, events, timestamp_override=None):
         """
-        if not (self.handlers and schema_name in self.allowed_schemas):
+        Record a batch of events with the same schema.
+
+        This is equivalent to calling `record_event` for each event, except
+        that the schema and its policy are looked up once, all the events
+        share one timestamp, and each handler is passed the whole batch
+        while holding its lock once. Plain `logging.StreamHandler` and
+        `logging.FileHandler` handlers write the batch in a single call.
+
+        Every event is validated before any of them is written, held for
+        reservoir sampling or coalesced, so if one event is invalid, none of
+        the batch is recorded. Events are sampled and rate limited one by
+        one, like in `record_event`, and the events before the invalid one
+        still count towards the sample rates and rate limits.
+
+        Parameters
+        ----------
+        schema_name: str
+            Name of the schema
+        version: str
+            The schema version
+        events: iterable of dict
+            The events to record. May be a generator.
+        timestamp_override: datetime, optional
+            Optionally override the events' timestamp. By default it is set to the current timestamp.
+
+        Returns
+        -------
+        list of dict
+            The recorded event data, empty if the events are not recorded.
+        """
+        n = 1
+        if self.metrics is not None:
+            # Rejected batches are counted event by event.
+            if not hasattr(events, '__len__'):
+                events = list(events)
+            n = len(events)
+        profile_hooks = None
+        if self._profile_hooks is not None:
+            profile_hooks = self._profile_hooks.for_schema(schema_name) or None
+        if profile_hooks is None:
+            prepared = self._prepare(schema_name, version, n)
+        else:
+            prepared = Profile(profile_hooks, schema_name, None).run(
+                'lookup', self._prepare, schema_name, version, n
+            )
+        if prepared is None:
+            return []
+
+        timestamp = _format_timestamp_override(timestamp_override) or self._now()
+        built = []
+        for event in events:
+            profile = None
+            if profile_hooks is not None:
+                profile = Profile(profile_hooks, schema_name, self._event_size(event))
+            self._build_capsule(
+                schema_name, version, prepared, event, timestamp, profile, built
+            )
+        # Hold, coalesce and count the events only once they are all valid.
+        capsules = []
+        for capsule, ticket in built:
+            capsule = self._accept(schema_name, prepared, capsule, ticket)
+            if capsule is not None:
+                capsules.append(capsule)
+        if capsules:
+            self._dispatch(capsules)
+        return capsules
+
+    async def arecord_event(self, schema_name, version, event, timestamp_override=None):
+        """
+        Record given event with schema has occurred, from a coroutine.
+
+        The event is validated and filtered exactly like `record_event`,
+        then queued for a writer task that runs the handlers in a thread
+        pool and awaits the async sinks. When `queue_size` events are
+        already waiting, this waits for room, so slow handlers and sinks
+        slow down the caller instead of blocking the event loop.
+
+        Parameters
+        ----------
+        schema_name: str
+            Name of the schema
+        version: str
+            The schema version
+        event: dict
+            The event to record
+        timestamp_override: datetime, optional
+            Optionally override the event timestamp. By default it is set to the current timestamp.
+
+        Returns
+        -------
+        dict
+            The recorded event data, or None if the event is not recorded,
+            or is held for reservoir sampling or coalescing.
+        """
+        capsule = self._build_event(schema_name, version, event, timestamp_override)
+        if capsule is not None:
+            await self._get_async_emitter().put((capsule, True))
+        return capsule
+
+    def add_profile_hook(self, hook, phases=None, schemas=None):
+        """
+        Call `hook` around phases of recording events.
+
+        Parameters
+        ----------
+        hook : callable
+            Called after each phase as ``hook(phase, schema_id, event_size,
+            elapsed_ns)``. If it has a ``start(phase, schema_id)`` method,
+            that is called before each phase. See
+            `jupyter_telemetry.profiling.ProfileHook`.
+        phases : list of str, optional
+            The phases to call the hook around, from "lookup",
+            "validation", "category_extraction", "filtering",
+            "capsule_build" and "emit". Defaults to all of them.
+        schemas : list of str, optional
+            Only call the hook for events with these schemas. Defaults to
+            all schemas.
+        """
+        hooks = self._profile_hooks or ProfileHooks()
+        hooks.add(hook, phases, schemas)
+        self._profile_hooks = hooks
+
+    def remove_profile_hook(self, hook):
+        """Stop calling a hook added with `add_profile_hook`."""
+        hooks = self._profile_hooks
+        if hooks is not None:
+            hooks.remove(hook)
+            if not len(hooks):
+                self._profile_hooks = None
+
+    def _event_size(self, event):
+        return len(self._encode(event).encode('utf-8'))
+
+    def _start_profile(self, schema_name, event):
+        """Return a `Profile` for an event, or None if no hooks apply to it."""
+        hooks = self._profile_hooks.for_schema(schema_name)
+        if not hooks:
+            return None
+        return Profile(hooks, schema_name, self._event_size(event))
+
+    def _build_event(self, schema_name, version, event, timestamp_override=None):
+        """
+        Look up the schema of a single event and build its capsule, for
+        `record_event` and `arecord_event`.
+
+        Returns None if the event is not recorded, or is held for
+        reservoir sampling or coalescing.
+        """
+        profile = None
+        if self._profile_hooks is not None:
+            profile = self._start_profile(schema_name, event)
+        if profile is None:
+            prepared = self._prepare(schema_name, version)
+        else:
+            prepared = profile.run('lookup', self._prepare, schema_name, version)
+        if prepared is None:
+            return
+        return self._build_capsule(
+            schema_name, version, prepared, event,
+            _format_timestamp_override(timestamp_override), profile
+        )
+
+    def _prepare(self, schema_name, version, n=1):
+        """
+        Look up the schema, its compiled form and its policy, or return
+        None if events for the schema should not be recorded.
+
+        `n` is the number of events recorded, counted as rejected if the
+        schema isn't allowed.
+        """
+        policy = self.get_schema_policy(schema_name)
+        if not ((self.handlers or self.sinks) and policy is not None):
             # if handler isn't set up or schema is not explicitly whitelisted,
             # don't do anything
+            if policy is None and self.metrics is not None:
+                self.metrics.count('rejected', schema_name, n)
             return
 
         if (schema_name, version) not in self.schemas:
@@ -224,31 +867,407 @@ class EventLog(Configurable):
             ))
 
         schema = self.schemas[(schema_name, version)]
+        compiled = self.schema_cache.get((schema_name, version), schema)
+        return schema, compiled, policy
 
-        # Validate the event data.
-        JSONSchemaValidator(schema).validate(event)
+    def _filter_event(self, prepared, event, profile=None):
+        """
+        Validate an event and filter its properties.
 
-        # Generate the empty event capsule.
-        if timestamp_override is None:
-            timestamp = datetime.utcnow()
+        Each phase is run with `profile`, the `Profile` of the event, if
+        given, or timed in the metrics if instrumentation is enabled.
+        """
+        schema, compiled, policy = prepared
+        if profile is not None:
+            run = profile.run
+        elif self.metrics is not None:
+            run = self.metrics.run
         else:
-            timestamp = timestamp_override
+            run = _run_phase
+
+        # Filter properties in the incoming event based on the
+        # allowed categories and properties from the eventlog config.
+        allowed_categories = policy.allowed_categories
+        allowed_properties = policy.allowed_properties
+        plan = compiled.plan
+        try:
+            if self.engine == 'fused' and not plan.dynamic:
+                # Validate, extract categories and filter the event data
+                # in a single walk.
+                return run(
+                    'validation', validate_and_filter_event,
+                    event, schema, allowed_categories, allowed_properties,
+                    validator=compiled.fused
+                )
+            # Validate the event data.
+            run('validation', compiled.validator.validate, event)
+        except ValidationError:
+            if self.metrics is not None:
+                self.metrics.count('invalid', schema['$id'])
+            raise
+        if profile is None or not plan.dynamic:
+            # Static filter plans don't extract categories per event, and
+            # only the profiling hooks time extraction on its own.
+            return run(
+                'filtering', plan.apply, event, allowed_categories, allowed_properties
+            )
+        categories = run(
+            'category_extraction', extract_categories_from_event,
+            event, schema, plan.extractor
+        )
+        return run(
+            'filtering', filter_event_by_categories,
+            event, categories, allowed_categories, allowed_properties
+        )
+
+    def _build_capsule(self, schema_name, version, prepared, event, timestamp=None,
+                       profile=None, built=None):
+        """
+        Sample, validate and filter an event and return its capsule.
+
+        Returns None if the event is dropped by sampling or rate limits,
+        or held for reservoir sampling or coalescing. `timestamp` defaults
+        to the current time. `profile` is the `Profile` of the event, if
+        profiling hooks apply to it.
+
+        If `built` is a list, the capsule and its reservoir ticket are
+        appended to it and None is returned, so that a batch can be
+        validated before `_accept` holds, coalesces or counts any of it.
+        """
+        policy = prepared[2]
+        sampler = policy.sampler
+        sample_rate = ticket = None
+        # Sample and rate limit before validating, so dropped events cost
+        # very little.
+        if sampler is not None:
+            if sampler.due():
+                self._dispatch(sampler.drain())
+            sample = sampler.sample(event)
+            if sample is None:
+                if self.metrics is not None:
+                    self.metrics.count('sampled_out', schema_name)
+                return
+            sample_rate, ticket = sample
+        if self._drops.due():
+            self._record_drop_summary()
+        limiter = self._limiter
+        if (
+            (policy.limiter is not None and not policy.limiter.take())
+            or (limiter is not None and not limiter.take())
+        ):
+            self._drops.add(schema_name)
+            if self.metrics is not None:
+                self.metrics.count('dropped', schema_name)
+            return
+
+        filtered_event = self._filter_event(prepared, event, profile)
+        if timestamp is None:
+            timestamp = self._now()
+        if profile is None:
+            capsule = self._new_capsule(
+                schema_name, version, timestamp, filtered_event, sample_rate
+            )
+        else:
+            capsule = profile.run(
+                'capsule_build', self._new_capsule,
+                schema_name, version, timestamp, filtered_event, sample_rate
+            )
+        if built is not None:
+            built.append((capsule, ticket))
+            return
+        return self._accept(schema_name, prepared, capsule, ticket)
+
+    def _accept(self, schema_name, prepared, capsule, ticket=None):
+        """
+        Count a built capsule as accepted and return it, or hold it in its
+        reservoir `ticket` or the coalescer and return None.
+        """
+        if self.metrics is not None:
+            self.metrics.count('accepted', schema_name)
+        if ticket is not None:
+            prepared[2].sampler.hold(ticket, capsule)
+            return
+        coalescer = self._coalescer
+        if coalescer is not None:
+            if coalescer.due():
+                self._dispatch(coalescer.expired())
+            self._dispatch(coalescer.add(capsule))
+            return
+        return capsule
+
+    def _new_capsule(self, schema_name, version, timestamp, filtered_event, sample_rate=None):
+        # Generate the empty event capsule.
         capsule = {
-            '__timestamp__': timestamp.isoformat() + 'Z',
+            '__timestamp__': timestamp,
             '__schema__': schema_name,
             '__schema_version__': version,
             '__metadata_version__': TELEMETRY_METADATA_VERSION,
         }
+        if sample_rate is not None:
+            capsule['__sample_rate__'] = sample_rate
+        capsule.update(filtered_event)
+        return capsule
 
-        # Filter properties in the incoming event based on the
-        # allowed categories and properties from the eventlog config.
-        allowed_categories = self.get_allowed_categories(schema_name)
-        allowed_properties = self.get_allowed_properties(schema_name)
+    def _dispatch(self, capsules):
+        """Write capsules to the sinks, without waiting for the async sinks."""
+        if not capsules:
+            return
+        if self._sync_sinks:
+            self._submit(capsules)
+        if self._async_sinks:
+            emitter = self._get_async_emitter()
+            if emitter is not None:
+                for capsule in capsules:
+                    if not emitter.put_nowait((capsule, False)) and self.metrics is not None:
+                        self.metrics.count('dropped', capsule['__schema__'])
+            else:
+                self._drop_async(capsules)
 
-        filtered_event = filter_categories_from_event(
-            event, schema, allowed_categories, allowed_properties
-        )
-        capsule.update(filtered_event)
+    def _drop_async(self, capsules):
+        """Count capsules that can't reach the async sinks, without an event loop."""
+        if self.metrics is not None:
+            for capsule in capsules:
+                self.metrics.count('dropped', capsule['__schema__'])
+        if not self._warned_no_loop:
+            self._warned_no_loop = True
+            logging.getLogger(__name__).warning(
+                'Events recorded without a running event loop are not written '
+                'to async sinks. Record them with arecord_event, or from the '
+                'event loop.'
+            )
 
-        self.log.info(capsule)
-        return capsule
+    def _record_drop_summary(self):
+        """Record a summary of the events dropped by rate limits, if any."""
+        counts, elapsed = self._drops.take()
+        if not counts:
+            return
+        self._dispatch((self._new_capsule(
+            DROPPED_EVENTS_SCHEMA_ID,
+            DROPPED_EVENTS_SCHEMA_VERSION,
+            self._now(),
+            {
+                'dropped': counts,
+                'total': sum(counts.values()),
+                'interval': elapsed,
+            },
+        ),))
+
+    def _record_held_events(self):
+        """
+        Record the events held for reservoir sampling or coalescing, and
+        the dropped events summary. A child leaves the samplers and drop
+        summary it shares to its parent.
+        """
+        if 'policies' not in self._shared:
+            self._drain_samplers()
+        coalescer = self._coalescer
+        if coalescer is not None:
+            self._dispatch(coalescer.expired(force=True))
+        if 'drops' not in self._shared:
+            self._record_drop_summary()
+
+    def _drain_samplers(self, policies=None):
+        """Record the events held for reservoir sampling."""
+        if policies is None:
+            policies = self._policies
+        for policy in list(policies.values()):
+            if policy.sampler is not None:
+                self._dispatch(policy.sampler.drain())
+
+    def _submit(self, capsules, cache=None):
+        """Write capsules to the handlers, or queue them for the writer thread."""
+        emitter = self.emitter
+        if emitter is not None and not emitter.closed:
+            for capsule in capsules:
+                # Dropped capsules are counted by _count_dropped.
+                emitter.submit((self, capsule))
+        else:
+            self._emit(capsules, cache)
+
+    def _get_async_emitter(self):
+        """
+        Return the writer task's emitter for the running event loop, or
+        None if no event loop is running.
+        """
+        loop = get_running_loop()
+        if loop is None:
+            return None
+        emitter = self._async_emitter
+        if emitter is None or emitter.loop is not loop or emitter.closed:
+            emitter = AsyncEmitter(self._awrite, loop, maxsize=self.queue_size)
+            self._async_emitter = emitter
+        return emitter
+
+    async def _awrite(self, batch):
+        """Write a batch of queued capsules from the writer task."""
+        capsules = [capsule for capsule, _ in batch]
+        # Serialized batches, shared with the handlers when they are
+        # written to in the same call.
+        cache = {}
+        if self._sync_sinks:
+            if all(to_handlers for _, to_handlers in batch):
+                await get_running_loop().run_in_executor(
+                    None, self._submit, capsules, cache
+                )
+            else:
+                to_sync = [capsule for capsule, to_handlers in batch if to_handlers]
+                if to_sync:
+                    await get_running_loop().run_in_executor(
+                        None, self._submit, to_sync
+                    )
+        for sink, encode, binary in self._async_formats:
+            for data in encode_batch(capsules, encode or self._encode, binary, cache):
+                await sink.write(data)
+
+    def _emit(self, capsules, cache=None):
+        """
+        Serialize capsules and write them to the synchronous sinks.
+
+        Each capsule is serialized once for all the sinks that use the
+        same encoder.
+        """
+        if cache is None:
+            cache = {}
+        default = self._encode
+        metrics = self.metrics
+        profile_hooks = None
+        if self._profile_hooks is not None:
+            schema_ids = {capsule['__schema__'] for capsule in capsules}
+            schema_id = schema_ids.pop() if len(schema_ids) == 1 else None
+            profile_hooks = self._profile_hooks.for_schema(schema_id) or None
+        for sink, encode, binary in self._sync_formats:
+            try:
+                if profile_hooks is not None:
+                    self._write_profiled(
+                        sink, capsules, encode or default, binary, cache,
+                        profile_hooks, schema_id
+                    )
+                    continue
+                if metrics is not None:
+                    self._write_timed(sink, capsules, encode or default, binary, cache, metrics)
+                    continue
+                sink.write_batch(
+                    encode_batch(capsules, encode or default, binary, cache)
+                )
+            except Exception:
+                logging.getLogger(__name__).exception(
+                    'Error writing events to %r', sink
+                )
+
+    def _write_timed(self, sink, capsules, encode, binary, cache, metrics):
+        """Serialize and write capsules to a sink, timing both phases."""
+        start = time.perf_counter()
+        cached = len(cache)
+        batch = encode_batch(capsules, encode, binary, cache)
+        serialized = time.perf_counter()
+        # Batches already serialized for another sink aren't timed again.
+        if len(cache) != cached:
+            metrics.observe('serialize', serialized - start)
+        sink.write_batch(batch)
+        metrics.observe('emit', time.perf_counter() - serialized)
+
+    def _write_profiled(self, sink, capsules, encode, binary, cache, hooks, schema_id):
+        """Serialize and write capsules to a sink as the "emit" phase."""
+        hooks = [hook for hook, phases in hooks if phases is None or 'emit' in phases]
+        for hook in hooks:
+            start = getattr(hook, 'start', None)
+            if start is not None:
+                start('emit', schema_id)
+        started = _perf_counter_ns()
+        batch = None
+        try:
+            batch = encode_batch(capsules, encode, binary, cache)
+            sink.write_batch(batch)
+        finally:
+            elapsed = _perf_counter_ns() - started
+            size = None
+            if batch is not None:
+                size = sum(len(data) for data in batch)
+            for hook in hooks:
+                hook('emit', schema_id, size, elapsed)
+
+    def flush(self, timeout=None):
+        """
+        Wait for queued events to be written, then flush the handlers.
+
+        Parameters
+        ----------
+        timeout: float, optional
+            How long to wait for the background emission queue to drain,
+            and then for the sinks whose `flush` takes a timeout.
+
+        Returns
+        -------
+        bool
+            False if the queue or those sinks did not drain within
+            `timeout`.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self._record_held_events()
+        drained = True
+        if self.emitter is not None:
+            drained = self.emitter.flush(timeout)
+        for sink in self._sync_sinks:
+            if id(sink) in self._timed_flushes:
+                remaining = None
+                if deadline is not None:
+                    remaining = max(0.0, deadline - time.monotonic())
+                drained = sink.flush(remaining) is not False and drained
+            else:
+                sink.flush()
+        return drained
+
+    def close(self, timeout=None):
+        """
+        Write any queued events, stop the background writer thread,
+        close the sinks and flush the handlers, then remove the logger
+        from `logging`.
+
+        The sinks and writer thread of a `child` EventLog are shared, so
+        they are only flushed.
+
+        Parameters
+        ----------
+        timeout: float, optional
+            How long to wait for the writer thread to finish.
+        """
+        self._record_held_events()
+        if self._parent is not None:
+            self.flush(timeout)
+        else:
+            if self.emitter is not None:
+                self.emitter.close(timeout)
+            for sink in self._sync_sinks:
+                sink.close()
+        if self._log is not None:
+            _release_logger(self._log)
+            self._log = None
+
+    async def aflush(self):
+        """
+        Wait for events queued by `arecord_event` to be written, then
+        flush the async sinks, the sinks and the handlers.
+        """
+        self._record_held_events()
+        emitter = self._async_emitter
+        if emitter is not None and not emitter.closed:
+            await emitter.flush()
+        for sink in self._async_sinks:
+            await sink.flush()
+        await get_running_loop().run_in_executor(None, self.flush)
+
+    async def aclose(self):
+        """
+        Write any queued events, stop the writer task, close the async
+        sinks, and then `close` the EventLog.
+        """
+        self._record_held_events()
+        emitter = self._async_emitter
+        if emitter is not None and not emitter.closed:
+            await emitter.close()
+        for sink in self._async_sinks:
+            if self._parent is None:
+                await sink.close()
+            else:
+                await sink.flush()
+        await get_running_loop().run_in_executor(None, self.close)
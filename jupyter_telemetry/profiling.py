@@ -0,0 +1,6 @@
+from ._profiling import (  # noqa
+    PROFILE_PHASES,
+    CProfileHook,
+    ProfileHook,
+    TracemallocHook,
+)
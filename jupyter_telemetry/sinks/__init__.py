@@ -0,0 +1,17 @@
+"""
+Destinations that recorded events are written to.
+
+`EventLog` serializes each event capsule to JSON once and passes the
+same string to all of its sinks, except those that ask for a different
+`encoder`, or for `bytes`. `logging` handlers given in the `handlers`
+trait are wrapped in a `HandlerSink`.
+"""
+from ._base import AsyncSink, HandlerSink, Sink, StreamSink  # noqa
+from ._buffered import BufferedSink  # noqa
+from ._file import FileSink  # noqa
+from ._compressed import CompressedFileSink, read_compressed_events  # noqa
+from ._ring import RingBufferSink, read_ring_buffer  # noqa
+from ._shared import SharedFileSink  # noqa
+from ._socket import SocketSink  # noqa
+from ._http import HTTPSink  # noqa
+from ._spool import SpoolSink  # noqa
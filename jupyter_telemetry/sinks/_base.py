@@ -0,0 +1,210 @@
+"""
+The sink base classes, and sinks that write to streams and `logging`
+handlers.
+"""
+import logging
+import threading
+
+
+class Sink(object):
+    """
+    Base class for sinks that are written to synchronously.
+
+    Subclasses implement `write`, and may implement `write_batch`,
+    `flush` and `close`. Sinks are called from whichever thread records
+    the event (or from the writer thread in background emission mode),
+    so they must be safe to call from several threads.
+
+    Attributes
+    ----------
+    encoder : str or callable, optional
+        Serialize events for this sink with a different encoder than the
+        `EventLog`'s, given like `EventLog.encoder`.
+    binary : bool
+        Pass events to this sink as UTF-8 encoded `bytes` rather than
+        `str`.
+    """
+    encoder = None
+    binary = False
+
+    def write(self, data):
+        """
+        Write one recorded event.
+
+        Parameters
+        ----------
+        data : str or bytes
+            The event capsule, serialized as JSON.
+        """
+        raise NotImplementedError()
+
+    def write_batch(self, batch):
+        """
+        Write several recorded events.
+
+        Parameters
+        ----------
+        batch : list of str or bytes
+            The event capsules, serialized as JSON.
+        """
+        for data in batch:
+            self.write(data)
+
+    def flush(self):
+        """Flush any buffered events."""
+
+    def close(self):
+        """Flush and release any resources held by the sink."""
+        self.flush()
+
+
+class StreamSink(Sink):
+    """
+    Write each event as a line of text to a file-like object.
+
+    Parameters
+    ----------
+    stream : file-like object
+        A text stream.
+    terminator : str
+        Written after each event.
+    """
+
+    def __init__(self, stream, terminator='\n'):
+        self.stream = stream
+        self.terminator = terminator
+        self.lock = threading.Lock()
+
+    def write(self, data):
+        with self.lock:
+            self.stream.write(data + self.terminator)
+
+    def write_batch(self, batch):
+        terminator = self.terminator
+        chunk = ''.join([data + terminator for data in batch])
+        with self.lock:
+            self.stream.write(chunk)
+
+    def flush(self):
+        with self.lock:
+            self.stream.flush()
+
+
+class _EncodedFormatter(logging.Formatter):
+    """Format a record whose message is an already serialized event."""
+
+    def format(self, record):
+        return record.msg
+
+
+# Handlers whose emit method is just a formatted write to their stream.
+_STREAM_HANDLERS = (logging.StreamHandler, logging.FileHandler)
+
+
+class HandlerSink(Sink):
+    """
+    Adapt a `logging.Handler` to the `Sink` interface.
+
+    Events are passed to the handler as INFO log records whose message
+    is the serialized event. The handler's formatter is replaced with
+    one that returns the message unchanged.
+
+    Plain `logging.StreamHandler` and `logging.FileHandler` instances
+    without filters are written to directly, without creating log
+    records, with one write per batch.
+
+    Parameters
+    ----------
+    handler : logging.Handler
+        The handler to write events to.
+    name : str
+        The logger name set on the log records.
+    encoder : str or callable, optional
+        Serialize events for this handler with a different encoder than
+        the `EventLog`'s.
+    """
+
+    def __init__(self, handler, name=__name__, encoder=None):
+        self.handler = handler
+        self.name = name
+        self.encoder = encoder
+        handler.setFormatter(_EncodedFormatter())
+
+    def _make_record(self, data):
+        return logging.LogRecord(self.name, logging.INFO, '', 0, data, (), None)
+
+    def write(self, data):
+        self.write_batch((data,))
+
+    def write_batch(self, batch):
+        handler = self.handler
+        if logging.INFO < handler.level:
+            return
+        handler.acquire()
+        try:
+            stream = getattr(handler, 'stream', None)
+            if (
+                type(handler) in _STREAM_HANDLERS
+                and stream is not None
+                and not handler.filters
+            ):
+                terminator = handler.terminator
+                try:
+                    stream.write(''.join([data + terminator for data in batch]))
+                    handler.flush()
+                except RecursionError:
+                    raise
+                except Exception:
+                    handler.handleError(self._make_record(batch[-1]))
+            else:
+                for data in batch:
+                    handler.handle(self._make_record(data))
+        finally:
+            handler.release()
+
+    def flush(self):
+        self.handler.flush()
+
+    def close(self):
+        # The handler belongs to whoever configured it, so only flush it.
+        self.handler.flush()
+
+
+class AsyncSink(object):
+    """
+    Base class for sinks that are written to from an asyncio event loop.
+
+    Subclasses implement `write`, and may implement `flush` and `close`.
+    Each method is awaited on the event loop the `EventLog` records
+    events from, so a slow sink applies backpressure to
+    `EventLog.arecord_event` instead of blocking the loop.
+
+    Attributes
+    ----------
+    encoder : str or callable, optional
+        Serialize events for this sink with a different encoder than the
+        `EventLog`'s, given like `EventLog.encoder`.
+    binary : bool
+        Pass events to this sink as UTF-8 encoded `bytes` rather than
+        `str`.
+    """
+    encoder = None
+    binary = False
+
+    async def write(self, data):
+        """
+        Write one recorded event.
+
+        Parameters
+        ----------
+        data : str or bytes
+            The event capsule, serialized as JSON.
+        """
+        raise NotImplementedError()
+
+    async def flush(self):
+        """Flush any buffered events."""
+
+    async def close(self):
+        """Flush and release any resources held by the sink."""
+        await self.flush()
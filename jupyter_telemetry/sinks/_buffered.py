@@ -0,0 +1,216 @@
+"""
+A base class for sinks that buffer events in memory and write them from
+a dedicated writer thread.
+"""
+from collections import deque
+import logging
+import threading
+
+from .._emitter import OVERFLOW_POLICIES
+from .._shutdown import live_sinks
+from ._base import Sink
+
+
+# Sinks that are still open, closed when the interpreter exits, after the
+# writer threads have written their queued events to them.
+_live_sinks = live_sinks
+
+
+class BufferedSink(Sink):
+    """
+    Buffer events in memory and write them in large chunks from a writer
+    thread.
+
+    `write_batch` only appends the events to a buffer, so callers don't
+    wait for I/O. The writer thread passes the buffered events to
+    `_write_chunk` as soon as `buffer_size` bytes or `max_events` events
+    are waiting, `flush_interval` seconds after its last write, and when
+    `flush` or `close` is called.
+
+    Subclasses implement `_write_chunk`, and may implement `_tick` and
+    `_close_output`. These are called from the writer thread only, so
+    they don't need locking. Subclasses must call `BufferedSink.__init__`
+    once they are ready for them to be called.
+
+    Events are passed as `bytes`, each followed by `terminator`.
+
+    Parameters
+    ----------
+    buffer_size : int
+        Write the buffer once it holds this many bytes.
+    flush_interval : float
+        Write the buffer at least this often, in seconds.
+    max_buffer_size : int, optional
+        How many bytes can be waiting to be written. Defaults to eight
+        times `buffer_size`.
+    overflow : str
+        What `write_batch` does when `max_buffer_size` bytes are waiting:
+        "block" (the default) waits for the writer thread to catch up,
+        "drop_newest" drops the new events and "drop_oldest" drops the
+        oldest buffered events.
+    max_events : int, optional
+        Write the buffer once it holds this many events.
+    name : str, optional
+        The name of the writer thread.
+
+    Attributes
+    ----------
+    errors : int
+        Number of chunks the writer thread failed to write.
+    dropped : int
+        Number of events dropped because the buffer was full.
+    """
+    binary = True
+    terminator = b'\n'
+
+    def __init__(self, buffer_size=1 << 20, flush_interval=1.0, max_buffer_size=None,
+                 overflow='block', max_events=None, name=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(
+                'Unknown overflow policy {!r}, expected one of {}'.format(
+                    overflow, ', '.join(OVERFLOW_POLICIES)
+                )
+            )
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.max_buffer_size = max_buffer_size or 8 * buffer_size
+        self.max_events = max_events or float('inf')
+        self.overflow = overflow
+        self.errors = 0
+        self.dropped = 0
+        self._chunks = deque()
+        self._buffered = 0
+        self._buffered_events = 0
+        # Batches accepted by write_batch, written by the writer thread, and
+        # that flush is waiting for.
+        self._queued = 0
+        self._written = 0
+        self._flush_requested = 0
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+        self._thread = threading.Thread(
+            target=self._run, name=name or '{}-writer'.format(type(self).__name__),
+            daemon=True
+        )
+        self._thread.start()
+        _live_sinks.add(self)
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def write(self, data):
+        self.write_batch((data,))
+
+    def write_batch(self, batch):
+        terminator = self.terminator
+        chunk = terminator.join(batch) + terminator
+        with self._cond:
+            if self._closed:
+                raise ValueError('Cannot write to a closed sink.')
+            if self._buffered >= self.max_buffer_size:
+                if self.overflow == 'drop_newest':
+                    self.dropped += len(batch)
+                    return
+                if self.overflow == 'drop_oldest':
+                    while self._chunks and self._buffered >= self.max_buffer_size:
+                        oldest = self._chunks.popleft()
+                        self._buffered -= len(oldest)
+                        self._buffered_events -= oldest.count(terminator)
+                        self.dropped += oldest.count(terminator)
+                else:
+                    self._cond.wait_for(
+                        lambda: self._buffered < self.max_buffer_size or self._closed
+                    )
+            self._chunks.append(chunk)
+            self._buffered += len(chunk)
+            self._buffered_events += len(batch)
+            self._queued += 1
+            if self._buffered >= self.buffer_size or self._buffered_events >= self.max_events:
+                self._cond.notify_all()
+
+    def _write_chunk(self, chunk):
+        """Write buffered events."""
+        raise NotImplementedError()
+
+    def _tick(self, flush):
+        """
+        Called after each write, at least every `flush_interval` seconds,
+        and with `flush` set to True when `flush` or `close` is called.
+        """
+
+    def _close_output(self):
+        """Release the output, once the writer thread has stopped."""
+
+    def _run(self):
+        cond = self._cond
+        while True:
+            with cond:
+                cond.wait_for(
+                    lambda: (
+                        self._buffered >= self.buffer_size
+                        or self._buffered_events >= self.max_events
+                        or self._flush_requested > self._written
+                        or self._closed
+                    ),
+                    self.flush_interval
+                )
+                chunks = self._chunks
+                self._chunks = deque()
+                self._buffered = 0
+                self._buffered_events = 0
+                queued = self._queued
+                flush = self._flush_requested > self._written
+                closed = self._closed
+                # Wake up any producers blocked on a full buffer.
+                cond.notify_all()
+            if chunks:
+                try:
+                    self._write_chunk(b''.join(chunks))
+                except Exception:
+                    self.errors += 1
+                    logging.getLogger(__name__).exception(
+                        'Error writing events from %r', self
+                    )
+            try:
+                self._tick(flush or closed)
+            except Exception:
+                logging.getLogger(__name__).exception(
+                    'Error writing events from %r', self
+                )
+            with cond:
+                self._written = queued
+                cond.notify_all()
+            if closed:
+                return
+
+    def flush(self, timeout=None):
+        """
+        Wait until the events written so far have been passed to
+        `_write_chunk`.
+
+        Returns
+        -------
+        bool
+            False if `timeout` expired first.
+        """
+        with self._cond:
+            target = self._queued
+            self._flush_requested = max(self._flush_requested, target)
+            self._cond.notify_all()
+            return self._cond.wait_for(
+                lambda: self._written >= target or not self._thread.is_alive(),
+                timeout
+            )
+
+    def close(self):
+        """Write the buffered events and stop the writer thread."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        self._close_output()
+        _live_sinks.discard(self)
@@ -0,0 +1,156 @@
+"""
+A file sink that compresses events as they are written.
+"""
+import gzip
+import json
+import logging
+import zlib
+
+from ._file import FileSink
+
+try:
+    import bz2
+except ImportError:  # pragma: no cover
+    bz2 = None
+
+try:
+    import lzma
+except ImportError:  # pragma: no cover
+    lzma = None
+
+
+# compression: (compress(data, level), new decompressor, default level)
+_CODECS = {
+    'gzip': (
+        lambda data, level: gzip.compress(data, compresslevel=level),
+        lambda: zlib.decompressobj(zlib.MAX_WBITS | 16),
+        6,
+    ),
+}
+_ERRORS = (OSError, EOFError, ValueError, zlib.error)
+
+if bz2 is not None:
+    _CODECS['bz2'] = (
+        lambda data, level: bz2.compress(data, compresslevel=level),
+        bz2.BZ2Decompressor,
+        9,
+    )
+
+if lzma is not None:
+    _CODECS['lzma'] = (
+        lambda data, level: lzma.compress(data, preset=level),
+        lzma.LZMADecompressor,
+        6,
+    )
+    _ERRORS += (lzma.LZMAError,)
+
+COMPRESSIONS = tuple(sorted(_CODECS))
+
+
+def _check_compression(compression):
+    if compression not in _CODECS:
+        raise ValueError('compression must be one of {}, not {!r}'.format(
+            ', '.join(COMPRESSIONS), compression
+        ))
+
+
+def _iter_blocks(f, compression):
+    """
+    Yield ``(end, data)`` for each complete compressed block in `f`, where
+    `end` is the offset just after the block.
+
+    Stops at the first incomplete or damaged block.
+    """
+    new_decompressor = _CODECS[compression][1]
+    decompressor = new_decompressor()
+    end = 0
+    fed = 0
+    output = []
+    while True:
+        data = f.read(1 << 16)
+        if not data:
+            return
+        while data:
+            try:
+                output.append(decompressor.decompress(data))
+            except _ERRORS:
+                return
+            if not decompressor.eof:
+                fed += len(data)
+                break
+            rest = decompressor.unused_data
+            end += fed + len(data) - len(rest)
+            yield end, b''.join(output)
+            decompressor = new_decompressor()
+            fed = 0
+            output = []
+            data = rest
+
+
+def read_compressed_events(path, compression='gzip'):
+    """
+    Yield the events written to a `CompressedFileSink`.
+
+    Only complete blocks are read, so this can be used on a file that is
+    still being written to, or was left incomplete by a crash.
+    """
+    _check_compression(compression)
+    with open(path, 'rb') as f:
+        for _, data in _iter_blocks(f, compression):
+            for line in data.splitlines():
+                if line:
+                    yield json.loads(line.decode('utf-8'))
+
+
+class CompressedFileSink(FileSink):
+    """
+    Write events to a compressed file as JSON lines.
+
+    Each buffered write is compressed on the writer thread as a separate
+    gzip member (or bz2 or xz stream), so every block can be
+    decompressed on its own. The file stays readable by ``gzip.open``,
+    ``zcat`` and similar tools, and a crash loses at most the block being
+    written. A file left with an incomplete block is truncated to its
+    last complete block when it is opened again.
+
+    Larger blocks compress better, so `buffer_size` and `flush_interval`
+    also trade compression ratio against how many events can be lost.
+
+    Parameters
+    ----------
+    path : str or path object
+        The file to append events to.
+    compression : str
+        One of "gzip" (the default), "bz2" or "lzma", if the interpreter
+        was built with them.
+    compresslevel : int, optional
+        The codec's compression level (or preset, for "lzma").
+    **kwargs
+        Passed to `FileSink`. `max_bytes` limits the compressed size of
+        the file.
+    """
+
+    def __init__(self, path, compression='gzip', compresslevel=None, **kwargs):
+        _check_compression(compression)
+        self.compression = compression
+        self._compress, _, default_level = _CODECS[compression]
+        self.compresslevel = default_level if compresslevel is None else compresslevel
+        super().__init__(path, **kwargs)
+
+    def _open(self):
+        super()._open()
+        if self._size:
+            end = 0
+            with open(self.path, 'rb') as f:
+                for end, _ in _iter_blocks(f, self.compression):
+                    pass
+            if end < self._size:
+                logging.getLogger(__name__).warning(
+                    'Discarding %d bytes after the last complete block of %s',
+                    self._size - end, self.path
+                )
+                self._file.truncate(end)
+                self._size = end
+
+    def _write_chunk(self, chunk):
+        super()._write_chunk(self._compress(chunk, self.compresslevel))
@@ -0,0 +1,126 @@
+"""
+A buffered, rotating JSON lines file sink.
+"""
+import os
+import time
+
+from ._buffered import BufferedSink
+
+
+class FileSink(BufferedSink):
+    """
+    Write events to a file as JSON lines, in large buffered writes.
+
+    Events are buffered in memory and written by a writer thread, so
+    writing to the file, rotating it and syncing it to disk never stall
+    the code recording events.
+
+    Parameters
+    ----------
+    path : str or path object
+        The file to append events to.
+    buffer_size : int
+        Write the buffered events once they add up to this many bytes.
+    flush_interval : float
+        Write the buffered events at least this often, in seconds.
+    max_bytes : int
+        Rotate the file before it grows over this many bytes. 0 (the
+        default) disables size-based rotation.
+    rotate_interval : float
+        Rotate the file when it has been written to for this many
+        seconds. 0 (the default) disables time-based rotation.
+    backup_count : int
+        The number of rotated files to keep, named ``path.1`` (the most
+        recent) to ``path.<backup_count>``. With 0, the file is deleted
+        when it is rotated.
+    fsync : None, "batch" or float
+        When to sync the file to disk: never (the default), after each
+        buffered write, or at most every `fsync` seconds. Files are also
+        synced on `flush`, rotation and `close`, unless `fsync` is None.
+    max_buffer_size : int, optional
+        See `BufferedSink`.
+    clock : callable, optional
+        Returns the current time in seconds.
+
+    Attributes
+    ----------
+    rotations : int
+        Number of times the file was rotated.
+    """
+
+    def __init__(self, path, buffer_size=1 << 20, flush_interval=1.0, max_bytes=0,
+                 rotate_interval=0, backup_count=5, fsync=None, max_buffer_size=None,
+                 clock=time.monotonic):
+        if not (fsync is None or fsync == 'batch' or isinstance(fsync, (int, float))):
+            raise ValueError(
+                'fsync must be None, "batch" or a number of seconds, not {!r}'.format(fsync)
+            )
+        self.path = os.fspath(path)
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backup_count = backup_count
+        self.fsync = fsync
+        self.rotations = 0
+        self._clock = clock
+        self._last_sync = clock()
+        self._open()
+        super().__init__(
+            buffer_size=buffer_size, flush_interval=flush_interval,
+            max_buffer_size=max_buffer_size,
+            name='FileSink-{}'.format(os.path.basename(self.path))
+        )
+
+    def __repr__(self):
+        return '<{} {!r}>'.format(type(self).__name__, self.path)
+
+    def _open(self):
+        self._file = open(self.path, 'ab', buffering=0)
+        self._size = os.fstat(self._file.fileno()).st_size
+        self._opened = self._clock()
+        self._dirty = False
+
+    def _sync(self):
+        if self._dirty and self.fsync is not None:
+            os.fsync(self._file.fileno())
+            self._last_sync = self._clock()
+        self._dirty = False
+
+    def _rotate(self):
+        self._sync()
+        self._file.close()
+        if self.backup_count > 0:
+            for i in range(self.backup_count - 1, 0, -1):
+                source = '{}.{}'.format(self.path, i)
+                if os.path.exists(source):
+                    os.replace(source, '{}.{}'.format(self.path, i + 1))
+            os.replace(self.path, self.path + '.1')
+        else:
+            os.remove(self.path)
+        self.rotations += 1
+        self._open()
+
+    def _write_chunk(self, chunk):
+        if self.max_bytes and self._size and self._size + len(chunk) > self.max_bytes:
+            self._rotate()
+        view = memoryview(chunk)
+        while view:
+            view = view[self._file.write(view):]
+        self._size += len(chunk)
+        self._dirty = True
+
+    def _tick(self, flush):
+        now = self._clock()
+        if self.rotate_interval and now - self._opened >= self.rotate_interval:
+            if self._size:
+                self._rotate()
+            else:
+                self._opened = now
+        fsync = self.fsync
+        if self._dirty and fsync is not None and (
+            flush or fsync == 'batch' or now - self._last_sync >= fsync
+        ):
+            self._sync()
+
+    def _close_output(self):
+        self._sync()
+        self._file.close()
@@ -0,0 +1,176 @@
+"""
+A sink that posts batches of events to an HTTP endpoint.
+"""
+import gzip
+import http.client
+import logging
+import random
+import threading
+from urllib.parse import urlsplit
+
+from ._buffered import BufferedSink
+
+
+class HTTPSink(BufferedSink):
+    """
+    Post events to an HTTP endpoint in batches.
+
+    Events are buffered like in `BufferedSink`, and posted as JSON lines
+    (``application/x-ndjson``) once `max_events` events or `buffer_size`
+    bytes are waiting, or `flush_interval` seconds after the last request.
+    Batches larger than that are split across several requests.
+
+    All requests are made from the writer thread over one persistent
+    keep-alive connection, which is reopened when the server closes it.
+    Connection errors, 429 and 5xx responses are retried up to
+    `max_retries` times, waiting a random time up to
+    ``min(backoff_max, backoff * 2 ** attempt)`` seconds in between ("full
+    jitter"), so that many clients don't retry in lockstep. Batches that
+    still fail, or get another 4xx response, are dropped.
+
+    Parameters
+    ----------
+    url : str
+        The endpoint to post events to, over http or https.
+    max_events : int
+        The most events to send in one request.
+    buffer_size : int
+        The most bytes of events to send in one request, before
+        compression.
+    flush_interval : float
+        Send buffered events at least this often, in seconds.
+    compress : bool
+        Compress request bodies with gzip.
+    headers : dict, optional
+        Additional headers, for instance for authentication.
+    timeout : float
+        Timeout for connecting and for each response, in seconds.
+    max_retries : int
+        How many times to retry a failed request.
+    backoff : float
+        Base of the exponential backoff between retries, in seconds.
+    backoff_max : float
+        Longest wait between retries, in seconds.
+    max_buffer_size : int, optional
+        See `BufferedSink`.
+    overflow : str
+        See `BufferedSink`. Defaults to "drop_oldest", so a slow or
+        unreachable endpoint never blocks recording events.
+
+    Attributes
+    ----------
+    requests : int
+        Number of successful requests.
+    retries : int
+        Number of retried requests.
+    """
+
+    def __init__(self, url, max_events=1000, buffer_size=1 << 20, flush_interval=5.0,
+                 compress=False, headers=None, timeout=10.0, max_retries=5, backoff=0.5,
+                 backoff_max=30.0, max_buffer_size=None, overflow='drop_oldest'):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError('Expected an http or https URL, not {!r}'.format(url))
+        self.url = url
+        self.compress = compress
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.requests = 0
+        self.retries = 0
+        self._scheme = parts.scheme
+        self._netloc = parts.netloc
+        self._path = parts.path or '/'
+        if parts.query:
+            self._path += '?' + parts.query
+        self._headers = {'Content-Type': 'application/x-ndjson'}
+        if compress:
+            self._headers['Content-Encoding'] = 'gzip'
+        self._headers.update(headers or {})
+        self._connection = None
+        self._stopping = threading.Event()
+        super().__init__(
+            buffer_size=buffer_size, flush_interval=flush_interval,
+            max_buffer_size=max_buffer_size, overflow=overflow, max_events=max_events,
+            name='HTTPSink-{}'.format(parts.netloc)
+        )
+
+    def __repr__(self):
+        return '<{} {!r}>'.format(type(self).__name__, self.url)
+
+    def _connect(self):
+        if self._scheme == 'https':
+            return http.client.HTTPSConnection(self._netloc, timeout=self.timeout)
+        return http.client.HTTPConnection(self._netloc, timeout=self.timeout)
+
+    def _post(self, body):
+        """Post `body`, returning the response status."""
+        if self._connection is None:
+            self._connection = self._connect()
+        try:
+            self._connection.request('POST', self._path, body, self._headers)
+            response = self._connection.getresponse()
+            # Read the whole response, so the connection can be reused.
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self._connection.close()
+            self._connection = None
+            raise
+        if response.will_close:
+            self._connection.close()
+            self._connection = None
+        return response.status
+
+    def _send(self, lines):
+        body = b''.join(lines)
+        if self.compress:
+            body = gzip.compress(body)
+        log = logging.getLogger(__name__)
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.retries += 1
+                delay = random.uniform(0, min(self.backoff_max, self.backoff * 2 ** (attempt - 1)))
+                # Don't keep the sink from closing for long.
+                self._stopping.wait(delay)
+            try:
+                status = self._post(body)
+            except (OSError, http.client.HTTPException) as e:
+                log.warning('Error posting events to %s: %s', self.url, e)
+                continue
+            if status < 300:
+                self.requests += 1
+                return
+            if status != 429 and status < 500:
+                log.error('Dropping %d events rejected by %s with status %d',
+                          len(lines), self.url, status)
+                self.dropped += len(lines)
+                return
+            log.warning('Error posting events to %s: status %d', self.url, status)
+        log.error('Dropping %d events after %d retries to %s',
+                  len(lines), self.max_retries, self.url)
+        self.dropped += len(lines)
+
+    def _write_chunk(self, chunk):
+        lines = chunk.splitlines(keepends=True)
+        batch = []
+        size = 0
+        for line in lines:
+            if batch and (len(batch) >= self.max_events or size + len(line) > self.buffer_size):
+                self._send(batch)
+                batch = []
+                size = 0
+            batch.append(line)
+            size += len(line)
+        if batch:
+            self._send(batch)
+
+    def _close_output(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def close(self):
+        """Send the buffered events, without waiting between retries, and close."""
+        self._stopping.set()
+        super().close()
@@ -0,0 +1,280 @@
+"""
+A crash-safe sink that keeps the most recent events in a memory-mapped
+ring buffer.
+
+The file starts with a header::
+
+    magic (4 bytes) | version (u32) | capacity (u64) | tail (u64) | drained (u64)
+
+followed by `capacity` bytes of records::
+
+    length (u32) | crc32 (u32) | sequence number (u64) | payload
+
+`tail` is the offset of the oldest record, and `drained` is the sequence
+number of the first record not yet drained to another sink. Records are
+never split across the end of the buffer; a record that doesn't fit is
+written at the start, after a wrap marker if there is room for one. The
+CRC covers the length, sequence number and payload, so a record torn by
+a crash is detected, and sequence numbers tell the newest records from
+older ones that were only partly overwritten.
+"""
+import collections
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+from ._base import Sink
+from ._buffered import _live_sinks
+
+
+_MAGIC = b'JTRB'
+_VERSION = 1
+_HEADER = struct.Struct('<4sIQQQ')
+_HEADER_SIZE = 64
+_TAIL = struct.Struct('<Q')
+_TAIL_OFFSET = 16
+_DRAINED_OFFSET = 24
+_RECORD = struct.Struct('<IIQ')
+_CHECKED = struct.Struct('<IQ')
+_WRAP = 0xFFFFFFFF
+_WRAP_MARKER = struct.Struct('<I')
+
+
+def _crc(length, seq, payload):
+    return zlib.crc32(payload, zlib.crc32(_CHECKED.pack(length, seq)))
+
+
+def _read_header(buffer, path):
+    magic, version, capacity, tail, drained = _HEADER.unpack_from(buffer, 0)
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError('{} is not a ring buffer file'.format(path))
+    return capacity, tail, drained
+
+
+def _scan(buffer, capacity, tail):
+    """
+    Return the valid records as ``(offset, size, seq)``, oldest first,
+    starting from the record at `tail`.
+    """
+    records = []
+    pos = tail
+    seq = None
+    for _ in range(capacity // _RECORD.size + 1):
+        if capacity - pos < _RECORD.size:
+            pos = 0
+        length, crc, record_seq = _RECORD.unpack_from(buffer, _HEADER_SIZE + pos)
+        if length == _WRAP:
+            if pos == 0:
+                break
+            pos = 0
+            continue
+        size = _RECORD.size + length
+        if size > capacity - pos or (seq is not None and record_seq != seq + 1):
+            break
+        start = _HEADER_SIZE + pos + _RECORD.size
+        if _crc(length, record_seq, buffer[start:start + length]) != crc:
+            break
+        records.append((pos, size, record_seq))
+        seq = record_seq
+        pos += size
+    return records
+
+
+def read_ring_buffer(path, undrained=False):
+    """
+    Yield the events that survived in a `RingBufferSink` file, oldest
+    first.
+
+    Parameters
+    ----------
+    path : str or path object
+        The ring buffer file.
+    undrained : bool
+        Only yield events that weren't drained to another sink yet.
+    """
+    with open(path, 'rb') as f:
+        buffer = f.read()
+    capacity, tail, drained = _read_header(buffer, path)
+    for offset, size, seq in _scan(buffer, capacity, tail):
+        if undrained and seq < drained:
+            continue
+        start = _HEADER_SIZE + offset + _RECORD.size
+        yield json.loads(buffer[start:start + size - _RECORD.size].decode('utf-8'))
+
+
+class RingBufferSink(Sink):
+    """
+    Keep the most recent events in a fixed-size, memory-mapped file.
+
+    Writing an event copies it into the mapping, with no system call, so
+    the events survive a crash of the process (though not of the machine)
+    without an fsync per event. When the buffer is full, the oldest
+    events are overwritten. Use `read_ring_buffer` to read the events
+    back, for instance after a crash.
+
+    An existing ring buffer file is reopened with its own capacity, and
+    new events are appended after the ones it holds.
+
+    Parameters
+    ----------
+    path : str or path object
+        The ring buffer file.
+    capacity : int
+        Size of the buffer in bytes, when creating the file.
+    drain_to : Sink, optional
+        A sink, typically a `FileSink`, that a background thread copies
+        events to every `drain_interval` seconds, and on `flush` and
+        `close`. Events that weren't drained before a crash are drained
+        when the file is reopened. The ring buffer closes this sink when
+        it is closed.
+    drain_interval : float
+        How often to drain events, in seconds.
+
+    Attributes
+    ----------
+    lost : int
+        Number of events overwritten before they could be drained.
+    """
+    binary = True
+
+    def __init__(self, path, capacity=16 << 20, drain_to=None, drain_interval=1.0):
+        self.path = os.fspath(path)
+        self.drain_to = drain_to
+        self.drain_interval = drain_interval
+        self.lost = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._drain_lock = threading.Lock()
+        self._open(capacity)
+        self._stop = threading.Event()
+        self._thread = None
+        if drain_to is not None:
+            self._thread = threading.Thread(
+                target=self._run, name='RingBufferSink-{}'.format(os.path.basename(self.path)),
+                daemon=True
+            )
+            self._thread.start()
+        _live_sinks.add(self)
+
+    def __repr__(self):
+        return '<{} {!r}>'.format(type(self).__name__, self.path)
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def _open(self, capacity):
+        try:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            self._file = open(self.path, 'r+b')
+            self._mmap = mmap.mmap(self._file.fileno(), 0)
+            self.capacity, tail, self._drained = _read_header(self._mmap, self.path)
+        else:
+            self._file = os.fdopen(fd, 'r+b')
+            self._file.truncate(_HEADER_SIZE + capacity)
+            self._mmap = mmap.mmap(self._file.fileno(), 0)
+            _HEADER.pack_into(self._mmap, 0, _MAGIC, _VERSION, capacity, 0, 0)
+            self.capacity, tail, self._drained = capacity, 0, 0
+        self._records = collections.deque(_scan(self._mmap, self.capacity, tail))
+        if self._records:
+            offset, size, seq = self._records[-1]
+            self._head = offset + size
+            self._next_seq = seq + 1
+        else:
+            self._head = tail
+            self._next_seq = self._drained
+
+    def write(self, data):
+        self.write_batch((data,))
+
+    def write_batch(self, batch):
+        with self._lock:
+            if self._closed:
+                raise ValueError('Cannot write to a closed sink.')
+            for data in batch:
+                self._append(data)
+
+    def _evict(self, start, end):
+        records = self._records
+        while records and start <= records[0][0] < end:
+            if self.drain_to is not None and records[0][2] >= self._drained:
+                self.lost += 1
+            records.popleft()
+
+    def _append(self, data):
+        capacity = self.capacity
+        size = _RECORD.size + len(data)
+        if size > capacity:
+            raise ValueError('An event of {} bytes does not fit in {}'.format(len(data), self))
+        pos = wrap = self._head
+        if capacity - pos < size:
+            self._evict(pos, capacity)
+            pos = 0
+        self._evict(pos, pos + size)
+        # Move the tail past the records about to be overwritten first, so
+        # that readers never start from a torn record.
+        _TAIL.pack_into(self._mmap, _TAIL_OFFSET, self._records[0][0] if self._records else pos)
+        if pos != wrap and capacity - wrap >= _WRAP_MARKER.size:
+            _WRAP_MARKER.pack_into(self._mmap, _HEADER_SIZE + wrap, _WRAP)
+        seq = self._next_seq
+        start = _HEADER_SIZE + pos
+        _RECORD.pack_into(self._mmap, start, len(data), _crc(len(data), seq, data), seq)
+        self._mmap[start + _RECORD.size:start + size] = data
+        self._records.append((pos, size, seq))
+        self._head = pos + size
+        self._next_seq = seq + 1
+
+    def _drain(self):
+        with self._drain_lock:
+            with self._lock:
+                if self._mmap.closed:
+                    return
+                drained = self._drained
+                batch = [
+                    self._mmap[_HEADER_SIZE + offset + _RECORD.size:_HEADER_SIZE + offset + size]
+                    for offset, size, seq in self._records if seq >= drained
+                ]
+                next_seq = self._next_seq
+            if batch:
+                if not self.drain_to.binary:
+                    batch = [data.decode('utf-8') for data in batch]
+                self.drain_to.write_batch(batch)
+                self.drain_to.flush()
+            with self._lock:
+                self._drained = next_seq
+                _TAIL.pack_into(self._mmap, _DRAINED_OFFSET, next_seq)
+
+    def _run(self):
+        while not self._stop.wait(self.drain_interval):
+            try:
+                self._drain()
+            except Exception:
+                logging.getLogger(__name__).exception('Error draining events from %r', self)
+
+    def flush(self):
+        """Drain the events written so far, if `drain_to` is set."""
+        if self.drain_to is not None:
+            self._drain()
+
+    def close(self):
+        """Drain the remaining events, and sync and close the file."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        if self._thread is not None:
+            self._stop.set()
+            if self._thread is not threading.current_thread():
+                self._thread.join()
+            self._drain()
+            self.drain_to.close()
+        with self._lock:
+            self._mmap.flush()
+            self._mmap.close()
+            self._file.close()
+        _live_sinks.discard(self)
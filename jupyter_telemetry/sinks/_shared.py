@@ -0,0 +1,150 @@
+"""
+A file sink that several processes can append to at once.
+"""
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+from ._base import Sink
+
+
+class SharedFileSink(Sink):
+    """
+    Append events to a file shared with other processes, one whole line
+    at a time.
+
+    The file is opened with ``O_APPEND``, and events are written with
+    one ``write`` system call for up to `max_write` bytes of whole lines.
+    On local POSIX filesystems, the kernel moves to the end of the file
+    and writes the data in one atomic step, so lines from different
+    processes never interleave.
+
+    Writes hold a shared ``flock`` on the file, which doesn't stop other
+    processes using this sink from writing at the same time. An event
+    longer than `max_write` is written in chunks while holding an
+    exclusive lock instead, so it doesn't interleave with events written
+    through a `SharedFileSink` either.
+
+    These guarantees don't hold on Windows, where ``flock`` isn't
+    available and appends aren't atomic, or on network filesystems such
+    as NFS, which don't implement ``O_APPEND`` atomically. A write can
+    also be cut short when the disk is full; the rest of the line is then
+    written under the exclusive lock, but another process may have
+    written in between. `short_writes` counts these.
+
+    ``flock`` locks belong to the open file description, which a forked
+    process shares with its parent. A process forked after creating the
+    sink, like a worker of a pre-forking server, must call `reopen`
+    before writing, or it takes the same locks as its parent, and its
+    oversized events can interleave with the parent's.
+
+    Parameters
+    ----------
+    path : str or path object
+        The file to append events to.
+    max_write : int
+        Largest write that relies on ``O_APPEND`` alone, in bytes.
+    lock : bool
+        Whether to use ``flock``. Turn this off only if all writers'
+        events fit in `max_write`.
+
+    Attributes
+    ----------
+    chunked : int
+        Number of events longer than `max_write`.
+    short_writes : int
+        Number of writes that the kernel cut short.
+    """
+    binary = True
+    terminator = b'\n'
+
+    def __init__(self, path, max_write=1 << 16, lock=True):
+        self.path = os.fspath(path)
+        self.max_write = max_write
+        self.lock = lock and fcntl is not None
+        self.chunked = 0
+        self.short_writes = 0
+        # flock locks belong to the file description, which threads share,
+        # so threads of this process take turns.
+        self._lock = threading.Lock()
+        self._fd = None
+        self._open()
+
+    def __repr__(self):
+        return '<{} {!r}>'.format(type(self).__name__, self.path)
+
+    @property
+    def closed(self):
+        return self._fd is None
+
+    def _open(self):
+        flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, 'O_CLOEXEC', 0)
+        self._fd = os.open(self.path, flags, 0o644)
+
+    def reopen(self):
+        """
+        Reopen the file, after it was renamed to rotate it, or in a
+        process forked after the sink was created.
+        """
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+            self._open()
+
+    def write(self, data):
+        self.write_batch((data,))
+
+    def write_batch(self, batch):
+        terminator = self.terminator
+        max_write = self.max_write
+        with self._lock:
+            if self._fd is None:
+                raise ValueError('Cannot write to a closed sink.')
+            lines = []
+            size = 0
+            for data in batch:
+                line = data + terminator
+                if size + len(line) > max_write and lines:
+                    self._append(b''.join(lines))
+                    lines = []
+                    size = 0
+                if len(line) > max_write:
+                    self.chunked += 1
+                    self._append_locked(memoryview(line))
+                else:
+                    lines.append(line)
+                    size += len(line)
+            if lines:
+                self._append(b''.join(lines))
+
+    def _append(self, chunk):
+        if self.lock:
+            fcntl.flock(self._fd, fcntl.LOCK_SH)
+        try:
+            written = os.write(self._fd, chunk)
+        finally:
+            if self.lock:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        if written < len(chunk):
+            self.short_writes += 1
+            self._append_locked(memoryview(chunk)[written:])
+
+    def _append_locked(self, view):
+        if self.lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            while view:
+                view = view[os.write(self._fd, view[:self.max_write]):]
+        finally:
+            if self.lock:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
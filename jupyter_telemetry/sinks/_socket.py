@@ -0,0 +1,150 @@
+"""
+A sink that sends events to a local collector over a Unix domain socket.
+"""
+from collections import deque
+import logging
+import socket
+import struct
+import time
+
+from ._buffered import BufferedSink
+
+
+# Each frame is the length of its payload, followed by one or more events,
+# each followed by a newline.
+FRAME_HEADER = struct.Struct('!I')
+
+
+class SocketSink(BufferedSink):
+    """
+    Send events to a collector process over a Unix domain socket.
+
+    Events are buffered like in `BufferedSink`. The writer thread sends
+    each buffered chunk as a frame: the length of the chunk as a 4-byte
+    big-endian integer, followed by the events, one per line. Run
+    ``jupyter-telemetry-collector`` to receive them and write them to
+    disk.
+
+    When the collector can't be reached, frames are kept and the sink
+    reconnects every `reconnect_interval` seconds. At most
+    `max_buffer_size` bytes are kept in the buffer, and as many waiting
+    to be sent; beyond that, the oldest events are dropped (or according
+    to `overflow`), so a missing collector never blocks or grows the
+    process recording events.
+
+    Unix domain sockets aren't available on all platforms, like older
+    versions of Windows, where creating a SocketSink raises ValueError.
+
+    Parameters
+    ----------
+    path : str
+        The collector's socket, as a path or a ``unix://`` URL.
+    buffer_size : int
+        Send the buffered events once they add up to this many bytes.
+    flush_interval : float
+        Send the buffered events at least this often, in seconds.
+    max_buffer_size : int
+        Bytes that can be waiting in the buffer, and waiting to be sent.
+    overflow : str
+        See `BufferedSink`. Defaults to "drop_oldest".
+    reconnect_interval : float
+        How long to wait before trying to reconnect, in seconds.
+    timeout : float
+        Timeout for connecting and sending, in seconds.
+    """
+
+    def __init__(self, path, buffer_size=1 << 16, flush_interval=0.5,
+                 max_buffer_size=8 << 20, overflow='drop_oldest', reconnect_interval=1.0,
+                 timeout=5.0):
+        if path.startswith('unix://'):
+            path = path[len('unix://'):]
+        if not hasattr(socket, 'AF_UNIX'):
+            raise ValueError(
+                'Cannot send events to {!r}: Unix domain sockets are not '
+                'available on this platform'.format(path)
+            )
+        self.path = path
+        self.reconnect_interval = reconnect_interval
+        self.timeout = timeout
+        self._socket = None
+        self._next_connect = 0
+        self._frames = deque()
+        self._frames_size = 0
+        super().__init__(
+            buffer_size=buffer_size, flush_interval=flush_interval,
+            max_buffer_size=max_buffer_size, overflow=overflow,
+            name='SocketSink-{}'.format(path)
+        )
+
+    def __repr__(self):
+        return '<{} {!r}>'.format(type(self).__name__, self.path)
+
+    @property
+    def connected(self):
+        return self._socket is not None
+
+    def _connect(self):
+        now = time.monotonic()
+        if now < self._next_connect:
+            return False
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+        except OSError as e:
+            sock.close()
+            self._next_connect = now + self.reconnect_interval
+            logging.getLogger(__name__).debug('Cannot connect to %s: %s', self.path, e)
+            return False
+        self._socket = sock
+        return True
+
+    def _disconnect(self):
+        self._socket.close()
+        self._socket = None
+        self._next_connect = time.monotonic() + self.reconnect_interval
+
+    def _send(self):
+        frames = self._frames
+        if not frames or (self._socket is None and not self._connect()):
+            return
+        while frames:
+            try:
+                self._socket.sendall(frames[0])
+            except OSError as e:
+                # A frame cut short is discarded by the collector, so it
+                # is sent again in full.
+                logging.getLogger(__name__).warning(
+                    'Lost connection to %s: %s', self.path, e
+                )
+                self._disconnect()
+                return
+            self._frames_size -= len(frames.popleft())
+
+    def _write_chunk(self, chunk):
+        frame = FRAME_HEADER.pack(len(chunk)) + chunk
+        self._frames.append(frame)
+        self._frames_size += len(frame)
+        while self._frames_size > self.max_buffer_size and len(self._frames) > 1:
+            oldest = self._frames.popleft()
+            self._frames_size -= len(oldest)
+            self.dropped += oldest.count(self.terminator, FRAME_HEADER.size)
+        self._send()
+
+    def _tick(self, flush):
+        self._send()
+
+    def _close_output(self):
+        self._next_connect = 0
+        self._send()
+        if self._frames:
+            lost = sum(frame.count(self.terminator, FRAME_HEADER.size) for frame in self._frames)
+            self.dropped += lost
+            logging.getLogger(__name__).warning(
+                'Dropping %d events that could not be sent to %s', lost, self.path
+            )
+            self._frames.clear()
+            self._frames_size = 0
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
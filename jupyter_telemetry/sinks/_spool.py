@@ -0,0 +1,538 @@
+"""
+A wrapper that spools events to disk while another sink is slow or down.
+"""
+from collections import OrderedDict, deque
+import json
+import logging
+import os
+import struct
+import threading
+import time
+
+from ._base import Sink
+from ._buffered import BufferedSink, _live_sinks
+
+
+EVICTION_POLICIES = ('drop_oldest', 'drop_newest')
+
+# Each spooled event is the time it was spooled and its length, followed
+# by the event.
+_RECORD = struct.Struct('<dI')
+_SUFFIX = '.spool'
+_CHECKPOINT = 'checkpoint.json'
+
+
+class SpoolSink(Sink):
+    """
+    Forward events to another sink from a background thread, spooling
+    them to disk when it can't keep up.
+
+    Events are queued in memory and written to `sink` by a forwarding
+    thread. When `queue_size` batches are waiting, because `sink` is slow
+    or raises errors, new events are appended to segment files in
+    `directory` instead, by a spooling thread, so callers don't wait for
+    the disk. Once `sink` catches up, the spooled events are replayed in
+    order, and segments are deleted once they have been replayed. The
+    replay position is saved in the directory, so events spooled before a
+    restart are replayed when a `SpoolSink` is opened on the same
+    directory again.
+
+    When `sink.write_batch` raises, the batch is retried every
+    `retry_interval` seconds. Events are only spooled when `sink` raises
+    or falls behind, so `sink` should raise when it cannot write an event,
+    or block until it can, rather than drop it. A `BufferedSink` that
+    drops events when its buffer is full is refused; use
+    ``overflow='block'``, so that a full buffer holds up forwarding and
+    events are spooled. Events a `BufferedSink` drops later, like those an
+    `HTTPSink` gives up on after `max_retries`, are lost.
+
+    Parameters
+    ----------
+    sink : Sink
+        The sink to forward events to. It is closed with this sink.
+    directory : str or path object
+        Where to keep the segment files.
+    queue_size : int
+        The number of batches that can wait in memory to be forwarded, and
+        to be spooled.
+    segment_size : int
+        Start a new segment file once the current one is this large, in
+        bytes.
+    max_spool_size : int
+        The most bytes of events to keep on disk.
+    eviction : str
+        What to do when the spool is full: "drop_oldest" (the default)
+        deletes the oldest segment, "drop_newest" drops the new events.
+    retry_interval : float
+        How long to wait before retrying a batch that `sink` failed to
+        write, in seconds.
+    max_replay_batch : int
+        The most spooled events to replay at once.
+
+    Attributes
+    ----------
+    evicted : int
+        Number of events dropped because the spool was full.
+    errors : int
+        Number of times `sink` failed to write a batch.
+    """
+    binary = True
+
+    def __init__(self, sink, directory, queue_size=1000, segment_size=16 << 20,
+                 max_spool_size=1 << 30, eviction='drop_oldest', retry_interval=1.0,
+                 max_replay_batch=1000):
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError(
+                'Unknown eviction policy {!r}, expected one of {}'.format(
+                    eviction, ', '.join(EVICTION_POLICIES)
+                )
+            )
+        if isinstance(sink, BufferedSink) and sink.overflow != 'block':
+            raise ValueError(
+                "{!r} drops events when its buffer is full, instead of leaving them "
+                "to be spooled. Create it with overflow='block'.".format(sink)
+            )
+        self.sink = sink
+        self.encoder = sink.encoder
+        self.directory = os.fspath(directory)
+        self.queue_size = queue_size
+        self.segment_size = segment_size
+        self.max_spool_size = max_spool_size
+        self.eviction = eviction
+        self.retry_interval = retry_interval
+        self.max_replay_batch = max_replay_batch
+        self.evicted = 0
+        self.errors = 0
+        self.forwarded = 0
+        self.spooled = 0
+        self.replayed = 0
+        # Batches waiting in memory, as (time, batch).
+        self._memory = deque()
+        # Batches waiting for the spooling thread, as (time, batch).
+        self._pending = deque()
+        # Whether the spooling thread is writing to the current segment.
+        self._writing = False
+        # Segments not fully replayed yet, oldest first, mapping their
+        # number to the [events, bytes] left to replay.
+        self._segments = OrderedDict()
+        self._read_offset = 0
+        self._write_file = None
+        self._write_size = 0
+        self._write_seq = 0
+        # Bumped when segments are evicted, so a replay in progress
+        # doesn't commit its position in a deleted segment.
+        self._epoch = 0
+        self._closed = False
+        self._stopped = False
+        self._cond = threading.Condition(threading.Lock())
+        # The number of calls to flush waiting.
+        self._flushing = 0
+        # Set by flush to retry a failed batch without waiting.
+        self._retry_now = False
+        # The number of batches passed to `sink`, and the number of the
+        # last one it failed to write.
+        self._attempts = 0
+        self._failed_attempt = 0
+        os.makedirs(self.directory, exist_ok=True)
+        self._recover()
+        self._thread = threading.Thread(
+            target=self._run, name='SpoolSink-{}'.format(os.path.basename(self.directory)),
+            daemon=True
+        )
+        self._thread.start()
+        self._spool_thread = threading.Thread(
+            target=self._run_spool,
+            name='SpoolSink-{}-spool'.format(os.path.basename(self.directory)),
+            daemon=True
+        )
+        self._spool_thread.start()
+        _live_sinks.add(self)
+
+    def __repr__(self):
+        return '<{} {!r} -> {!r}>'.format(type(self).__name__, self.directory, self.sink)
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def _path(self, seq):
+        return os.path.join(self.directory, '{:012d}{}'.format(seq, _SUFFIX))
+
+    def _recover(self):
+        """Find the segments left to replay by a previous run."""
+        seqs = sorted(
+            int(name[:-len(_SUFFIX)]) for name in os.listdir(self.directory)
+            if name.endswith(_SUFFIX) and name[:-len(_SUFFIX)].isdigit()
+        )
+        checkpoint = {'segment': -1, 'offset': 0}
+        try:
+            with open(os.path.join(self.directory, _CHECKPOINT)) as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError):
+            pass
+        for seq in seqs:
+            offset = checkpoint['offset'] if seq == checkpoint['segment'] else 0
+            events = size = 0
+            if seq >= checkpoint['segment']:
+                for _, data, end in self._iter_records(seq, offset):
+                    events += 1
+                    size += _RECORD.size + len(data)
+            if events:
+                if not self._segments:
+                    self._read_offset = offset
+                self._segments[seq] = [events, size]
+            else:
+                os.remove(self._path(seq))
+        # Keep numbering after the checkpoint, even if all segments are gone.
+        self._write_seq = max(seqs[-1] if seqs else -1, checkpoint['segment']) + 1
+
+    def _iter_records(self, seq, offset, limit=None):
+        """Yield ``(time, data, end)`` for the complete records in a segment."""
+        with open(self._path(seq), 'rb') as f:
+            f.seek(offset)
+            count = 0
+            while limit is None or count < limit:
+                header = f.read(_RECORD.size)
+                if len(header) < _RECORD.size:
+                    return
+                spooled_at, length = _RECORD.unpack(header)
+                data = f.read(length)
+                if len(data) < length:
+                    return
+                offset += _RECORD.size + length
+                count += 1
+                yield spooled_at, data, offset
+
+    def _save_checkpoint(self, seq, offset):
+        path = os.path.join(self.directory, _CHECKPOINT)
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'segment': seq, 'offset': offset}, f)
+        os.replace(path + '.tmp', path)
+
+    def write(self, data):
+        self.write_batch((data,))
+
+    def write_batch(self, batch):
+        now = time.time()
+        with self._cond:
+            if self._closed:
+                raise ValueError('Cannot write to a closed sink.')
+            # Once events are spooled, newer events are spooled after them,
+            # to keep them in order.
+            if (
+                not self._segments and not self._pending
+                and len(self._memory) < self.queue_size
+            ):
+                self._memory.append((now, list(batch)))
+            else:
+                # Only wait when the disk can't keep up either.
+                self._cond.wait_for(
+                    lambda: len(self._pending) < max(self.queue_size, 1) or self._closed
+                )
+                if self._closed:
+                    raise ValueError('Cannot write to a closed sink.')
+                self._pending.append((now, list(batch)))
+            self._cond.notify_all()
+
+    def _run_spool(self):
+        """Append the batches waiting in `_pending` to the segment files."""
+        cond = self._cond
+        with cond:
+            while True:
+                cond.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return
+                spooled_at, batch = self._pending.popleft()
+                # Wake up callers waiting for room.
+                cond.notify_all()
+                data = self._encode(spooled_at, batch)
+                f = self._reserve(len(batch), len(data))
+                if f is None:
+                    continue
+                # Write without the lock, so callers and the forwarding
+                # thread don't wait for the disk. Until the events are
+                # committed, they aren't replayed.
+                self._writing = True
+                cond.release()
+                try:
+                    f.write(data)
+                    f.flush()
+                except Exception:
+                    logging.getLogger(__name__).exception(
+                        'Error spooling events to %s', self.directory
+                    )
+                    cond.acquire()
+                    self._writing = False
+                    # Don't append after a partial record.
+                    self._write_size = self.segment_size
+                    cond.notify_all()
+                    continue
+                cond.acquire()
+                self._writing = False
+                self._commit(len(batch), len(data))
+                cond.notify_all()
+
+    def _encode(self, now, batch):
+        return b''.join(_RECORD.pack(now, len(event)) + event for event in batch)
+
+    def _reserve(self, events, size):
+        """
+        Make room for `size` bytes of events in the current segment, and
+        return its file, or None if the events are dropped.
+        """
+        while self._segments and self._spool_size() + size > self.max_spool_size:
+            if self.eviction == 'drop_newest':
+                self.evicted += events
+                return None
+            self._evict()
+        if self._write_file is None or self._write_size >= self.segment_size:
+            self._new_segment()
+        return self._write_file
+
+    def _commit(self, events, size):
+        """Count events written to the current segment."""
+        self._write_size += size
+        counts = self._segments[self._write_seq - 1]
+        counts[0] += events
+        counts[1] += size
+        self.spooled += events
+
+    def _spool(self, now, batch):
+        data = self._encode(now, batch)
+        f = self._reserve(len(batch), len(data))
+        if f is not None:
+            f.write(data)
+            f.flush()
+            self._commit(len(batch), len(data))
+
+    def _spool_memory(self):
+        """
+        Spool the events queued in memory, in front of the spooled and
+        pending events, which are newer.
+        """
+        self._cond.wait_for(lambda: not self._writing)
+        memory = list(self._memory)
+        self._memory.clear()
+        if not self._segments:
+            for spooled_at, batch in memory:
+                self._spool(spooled_at, batch)
+            return
+        seq = next(iter(self._segments))
+        path = self._path(seq)
+        with open(path, 'rb') as f:
+            f.seek(self._read_offset)
+            rest = f.read()
+        with open(path + '.tmp', 'wb') as f:
+            for spooled_at, batch in memory:
+                for event in batch:
+                    f.write(_RECORD.pack(spooled_at, len(event)) + event)
+            head = f.tell()
+            f.write(rest)
+        os.replace(path + '.tmp', path)
+        if self._write_file is not None and seq == self._write_seq - 1:
+            self._write_file.close()
+            self._write_file = open(path, 'ab')
+            self._write_size = head + len(rest)
+        events = sum(len(batch) for _, batch in memory)
+        counts = self._segments[seq]
+        counts[0] += events
+        counts[1] += head
+        self.spooled += events
+        self._read_offset = 0
+        self._save_checkpoint(seq, 0)
+
+    def _spool_size(self):
+        return sum(size for _, size in self._segments.values())
+
+    def _new_segment(self):
+        if self._write_file is not None:
+            self._write_file.close()
+        seq = self._write_seq
+        self._write_seq += 1
+        self._write_file = open(self._path(seq), 'ab')
+        self._write_size = 0
+        if not self._segments:
+            self._read_offset = 0
+        self._segments[seq] = [0, 0]
+
+    def _drop_segment(self, seq):
+        if seq == self._write_seq - 1 and self._write_file is not None:
+            self._write_file.close()
+            self._write_file = None
+        del self._segments[seq]
+        self._read_offset = 0
+        os.remove(self._path(seq))
+
+    def _evict(self):
+        seq, (events, _) = next(iter(self._segments.items()))
+        self._drop_segment(seq)
+        self.evicted += events
+        self._epoch += 1
+        logging.getLogger(__name__).warning(
+            'Spool %s is full, dropped %d events', self.directory, events
+        )
+
+    def _read_spooled(self):
+        """Return ``(seq, end, events)`` for the next spooled events to replay."""
+        while self._segments:
+            seq = next(iter(self._segments))
+            # Only read the events committed by the spooling thread.
+            limit = min(self.max_replay_batch, self._segments[seq][0])
+            records = list(self._iter_records(seq, self._read_offset, limit))
+            if records:
+                return seq, records[-1][2], [data for _, data, _ in records]
+            if self._writing and seq == self._write_seq - 1:
+                return None
+            # Fully replayed, or cut short by a crash.
+            self._drop_segment(seq)
+        return None
+
+    def _run(self):
+        cond = self._cond
+        while True:
+            with cond:
+                while True:
+                    spooled = None
+                    if self._memory:
+                        batch = self._memory[0][1]
+                        break
+                    if self._closed:
+                        self._stopped = True
+                        cond.notify_all()
+                        return
+                    spooled = self._read_spooled()
+                    if spooled is not None:
+                        seq, end, batch = spooled
+                        epoch = self._epoch
+                        break
+                    if self._pending:
+                        # Wait for the spooling thread to write them.
+                        cond.wait()
+                        continue
+                    # Wake up flush.
+                    cond.notify_all()
+                    cond.wait()
+                self._attempts += 1
+                attempt = self._attempts
+            try:
+                self._forward(batch)
+            except Exception:
+                logging.getLogger(__name__).exception(
+                    'Error forwarding events from %r', self
+                )
+                with cond:
+                    self.errors += 1
+                    self._failed_attempt = attempt
+                    cond.notify_all()
+                    if self._memory and (self._closed or self._flushing):
+                        # Keep the events in memory on disk, until `sink`
+                        # recovers or for the next run.
+                        self._spool_memory()
+                        continue
+                    cond.wait_for(
+                        lambda: self._closed or self._retry_now, self.retry_interval
+                    )
+                    self._retry_now = False
+                continue
+            with cond:
+                if spooled is None:
+                    self._memory.popleft()
+                elif epoch == self._epoch:
+                    counts = self._segments[seq]
+                    counts[0] -= len(batch)
+                    counts[1] -= end - self._read_offset
+                    self._read_offset = end
+                    self._save_checkpoint(seq, end)
+                    self.replayed += len(batch)
+                self.forwarded += len(batch)
+                cond.notify_all()
+
+    def _forward(self, batch):
+        if not self.sink.binary:
+            batch = [data.decode('utf-8') for data in batch]
+        self.sink.write_batch(batch)
+
+    def stats(self):
+        """
+        Return the number of events and bytes waiting to be forwarded, and
+        how long ago the oldest of them was written, in seconds.
+        """
+        with self._cond:
+            lag = 0.0
+            if self._memory:
+                lag = time.time() - self._memory[0][0]
+            elif self._segments:
+                seq = next(iter(self._segments))
+                for spooled_at, _, _ in self._iter_records(seq, self._read_offset, 1):
+                    lag = time.time() - spooled_at
+            elif self._pending:
+                lag = time.time() - self._pending[0][0]
+            return {
+                'memory_batches': len(self._memory),
+                'memory_events': sum(len(batch) for _, batch in self._memory),
+                'pending_events': sum(len(batch) for _, batch in self._pending),
+                'spool_events': sum(events for events, _ in self._segments.values()),
+                'spool_bytes': self._spool_size(),
+                'spool_segments': len(self._segments),
+                'lag': lag,
+                'forwarded': self.forwarded,
+                'spooled': self.spooled,
+                'replayed': self.replayed,
+                'evicted': self.evicted,
+                'errors': self.errors,
+            }
+
+    def flush(self, timeout=None):
+        """
+        Wait until all events, including spooled ones, have been forwarded.
+
+        While `sink` fails to write, only wait until the events written so
+        far are spooled to disk, so that they are kept however long `sink`
+        is down.
+
+        Returns
+        -------
+        bool
+            False if `timeout` expired first.
+        """
+        with self._cond:
+            attempts = self._attempts
+            self._flushing += 1
+            self._retry_now = True
+            self._cond.notify_all()
+            try:
+                done = self._cond.wait_for(
+                    lambda: (
+                        not self._memory and not self._pending
+                        # Or spooled, once `sink` fails after the flush.
+                        and (not self._segments or self._failed_attempt > attempts)
+                    ) or self._stopped,
+                    timeout
+                )
+            finally:
+                self._flushing -= 1
+            forwarded = not self._segments
+        if done and forwarded:
+            self.sink.flush()
+        return done
+
+    def close(self):
+        """
+        Forward the events queued in memory, spool those that can't be and
+        those waiting to be spooled, and close `sink`. Spooled events are
+        replayed the next time the directory is used.
+        """
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        for thread in (self._thread, self._spool_thread):
+            if thread is not threading.current_thread():
+                thread.join()
+        with self._cond:
+            if self._write_file is not None:
+                self._write_file.close()
+                self._write_file = None
+        self.sink.close()
+        _live_sinks.discard(self)
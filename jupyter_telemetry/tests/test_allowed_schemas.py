@@ -1,3 +1,5 @@
+import io
+import logging
 from textwrap import dedent as _
 from ruamel.yaml import YAML
 
@@ -208,3 +210,98 @@ def test_allowed_schemas(schema, allowed_schemas, expected_output):
 
     # Verify that *exactly* the right properties are recorded.
     assert expected_output == event_data
+
+
+def test_allowed_categories_config_is_not_mutated(schema):
+    allowed_schemas = {SCHEMA_ID: {"allowed_categories": ["user-identifier"]}}
+    e = EventLog(
+        handlers=[logging.NullHandler()],
+        allowed_schemas=allowed_schemas
+    )
+    e.register_schema(schema)
+
+    for i in range(10):
+        e.record_event(SCHEMA_ID, VERSION, dict(EVENT_DATA))
+        e.get_allowed_categories(SCHEMA_ID)
+
+    assert allowed_schemas[SCHEMA_ID]["allowed_categories"] == ["user-identifier"]
+    assert e.get_allowed_categories(SCHEMA_ID) == {"user-identifier", "unrestricted"}
+
+
+def test_schema_policy_is_swapped_on_config_change(schema):
+    e = EventLog(
+        handlers=[logging.NullHandler()],
+        allowed_schemas={SCHEMA_ID: {"allowed_categories": ["user-identifier"]}}
+    )
+    policy = e.get_schema_policy(SCHEMA_ID)
+    assert policy.allowed_categories == frozenset(["user-identifier", "unrestricted"])
+    assert policy.allowed_properties == frozenset()
+    # The policy is reused, not rebuilt, on every lookup.
+    assert e.get_schema_policy(SCHEMA_ID) is policy
+
+    e.allowed_schemas = {SCHEMA_ID: {"allowed_properties": ["email"]}}
+    policy = e.get_schema_policy(SCHEMA_ID)
+    assert policy.allowed_categories == frozenset(["unrestricted"])
+    assert policy.allowed_properties == frozenset(["email"])
+
+    e.allowed_schemas = []
+    assert e.get_schema_policy(SCHEMA_ID) is None
+    with pytest.raises(KeyError):
+        e.get_allowed_categories(SCHEMA_ID)
+
+
+def test_schema_policy_sees_in_place_additions(schema):
+    e = EventLog(handlers=[logging.NullHandler()], allowed_schemas={})
+    assert e.get_schema_policy(SCHEMA_ID) is None
+
+    e.allowed_schemas[SCHEMA_ID] = {"allowed_categories": ["user-identifier"]}
+    policy = e.get_schema_policy(SCHEMA_ID)
+    assert policy.allowed_categories == frozenset(["user-identifier", "unrestricted"])
+
+
+def test_schema_policy_sees_in_place_removals(schema):
+    output = io.StringIO()
+    e = EventLog(
+        handlers=[logging.StreamHandler(output)],
+        allowed_schemas={SCHEMA_ID: {"allowed_categories": ["user-identifier"]}}
+    )
+    e.register_schema(schema)
+    assert e.get_schema_policy(SCHEMA_ID) is not None
+
+    del e.allowed_schemas[SCHEMA_ID]
+    assert e.get_schema_policy(SCHEMA_ID) is None
+    assert e.record_event(SCHEMA_ID, VERSION, dict(EVENT_DATA)) is None
+    assert output.getvalue() == ''
+
+
+def test_schema_policy_sees_in_place_changes(schema):
+    e = EventLog(
+        handlers=[logging.NullHandler()],
+        allowed_schemas={SCHEMA_ID: {"allowed_categories": ["user-identifier"]}}
+    )
+    e.allowed_schemas[SCHEMA_ID]["allowed_categories"].append("user-identifiable-information")
+    assert e.get_allowed_categories(SCHEMA_ID) == {
+        "user-identifier", "user-identifiable-information", "unrestricted"
+    }
+
+    e.allowed_schemas[SCHEMA_ID] = {"allowed_properties": ["email"]}
+    policy = e.get_schema_policy(SCHEMA_ID)
+    assert policy.allowed_categories == frozenset(["unrestricted"])
+    assert policy.allowed_properties == frozenset(["email"])
+
+
+def test_in_place_change_records_held_samples(schema):
+    output = io.StringIO()
+    e = EventLog(
+        handlers=[logging.StreamHandler(output)],
+        allowed_schemas={SCHEMA_ID: {"sampling": {"reservoir": 5, "interval": 3600}}}
+    )
+    e.register_schema(schema)
+    e.record_event(SCHEMA_ID, VERSION, dict(EVENT_DATA))
+    assert output.getvalue() == ''
+
+    # Held by the old sampler, recorded rather than thrown away.
+    e.allowed_schemas[SCHEMA_ID] = {}
+    e.get_schema_policy(SCHEMA_ID)
+    e.flush()
+    assert len(output.getvalue().splitlines()) == 1
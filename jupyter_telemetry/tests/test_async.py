@@ -0,0 +1,148 @@
+import asyncio
+import io
+import json
+import logging
+
+import jsonschema
+import pytest
+
+from jupyter_telemetry.sinks import AsyncSink
+
+from . import utils
+from .test_category_filtering import NESTED_CATEGORY_SCHEMA, NESTED_EVENT_DATA
+from .utils import run_async
+
+
+SCHEMA_ID = 'test.event'
+
+
+class MemorySink(AsyncSink):
+
+    def __init__(self, blocked=False):
+        self.records = []
+        self.closed = False
+        # Blocked writes wait for a slot, so tests can saturate the sink.
+        self.slots = asyncio.Semaphore(0) if blocked else None
+
+    async def write(self, data):
+        if self.slots is not None:
+            await self.slots.acquire()
+        self.records.append(json.loads(data))
+
+    async def close(self):
+        self.closed = True
+
+
+def make_eventlog(**kwargs):
+    return utils.make_eventlog(
+        schemas=(NESTED_CATEGORY_SCHEMA,),
+        allowed_schemas={SCHEMA_ID: {'allowed_categories': ['user-identifier']}},
+        **kwargs
+    )
+
+
+def event():
+    return json.loads(json.dumps(NESTED_EVENT_DATA))
+
+
+def test_arecord_event_writes_handlers_and_sinks():
+    output = io.StringIO()
+    sink = MemorySink()
+    el = make_eventlog(handlers=[logging.StreamHandler(output)], sinks=[sink])
+
+    async def main():
+        capsule = await el.arecord_event(SCHEMA_ID, 1, event())
+        await el.aclose()
+        return capsule
+
+    capsule = run_async(main())
+
+    assert capsule['user'] == {'id': 'test id', 'email': None}
+    assert json.loads(output.getvalue()) == capsule
+    assert sink.records == [capsule]
+    assert sink.closed
+
+
+def test_arecord_event_validates_before_queueing():
+    sink = MemorySink()
+    el = make_eventlog(sinks=[sink])
+
+    async def main():
+        with pytest.raises(jsonschema.ValidationError):
+            await el.arecord_event(SCHEMA_ID, 1, {'user': {'email': 1}})
+        await el.aclose()
+
+    run_async(main())
+    assert sink.records == []
+
+
+def test_arecord_event_waits_when_saturated():
+    el = make_eventlog(queue_size=1)
+
+    async def main():
+        # Semaphores bind to the running loop on Python < 3.10.
+        sink = MemorySink(blocked=True)
+        el.sinks = [sink]
+        # The writer task takes the first event and blocks in the sink,
+        # the second event fills the queue.
+        await el.arecord_event(SCHEMA_ID, 1, event())
+        await asyncio.sleep(0)
+        await el.arecord_event(SCHEMA_ID, 1, event())
+
+        third = asyncio.ensure_future(el.arecord_event(SCHEMA_ID, 1, event()))
+        await asyncio.sleep(0.01)
+        assert not third.done()
+
+        for _ in range(3):
+            sink.slots.release()
+        await third
+        await el.aclose()
+        return sink
+
+    sink = run_async(main())
+    assert len(sink.records) == 3
+
+
+def test_record_event_reaches_async_sinks_on_running_loop():
+    output = io.StringIO()
+    sink = MemorySink()
+    el = make_eventlog(handlers=[logging.StreamHandler(output)], sinks=[sink])
+
+    async def main():
+        capsule = el.record_event(SCHEMA_ID, 1, event())
+        # Handlers are still written synchronously.
+        assert json.loads(output.getvalue()) == capsule
+        await el.aflush()
+        return capsule
+
+    capsule = run_async(main())
+    assert sink.records == [capsule]
+    # Handlers are only written once.
+    assert len(output.getvalue().splitlines()) == 1
+
+
+def test_record_event_counts_async_queue_drops():
+    sink = MemorySink()
+    el = make_eventlog(sinks=[sink], queue_size=1, instrumentation=True)
+
+    async def main():
+        # The writer task doesn't run until we yield, so the queue fills up.
+        for i in range(3):
+            el.record_event(SCHEMA_ID, 1, event())
+        await el.aflush()
+
+    run_async(main())
+    assert len(sink.records) == 1
+    assert el.metrics.snapshot()['events'][SCHEMA_ID]['dropped'] == 2
+
+
+def test_record_event_without_loop_counts_async_drops(caplog):
+    sink = MemorySink()
+    el = make_eventlog(sinks=[sink], instrumentation=True)
+    with caplog.at_level(logging.WARNING, logger='jupyter_telemetry.eventlog'):
+        el.record_event(SCHEMA_ID, 1, event())
+        el.record_event(SCHEMA_ID, 1, event())
+    assert sink.records == []
+    assert el.metrics.snapshot()['events'][SCHEMA_ID]['dropped'] == 2
+    warnings = [r for r in caplog.records if 'async sinks' in r.getMessage()]
+    assert len(warnings) == 1
@@ -0,0 +1,144 @@
+import io
+import json
+import logging
+import threading
+
+import pytest
+
+from jupyter_telemetry._emitter import BackgroundEmitter
+
+from . import utils
+
+
+class BlockingHandler(logging.Handler):
+    """A handler that waits for `unblock` before handling each record."""
+
+    def __init__(self):
+        super().__init__()
+        self.unblock = threading.Event()
+        self.started = threading.Event()
+        self.records = []
+        self.threads = set()
+
+    def emit(self, record):
+        self.started.set()
+        self.unblock.wait(5)
+        self.threads.add(threading.current_thread().name)
+        self.records.append(json.loads(self.format(record))['something'])
+
+
+_eventlogs = []
+
+
+@pytest.fixture(autouse=True)
+def close_eventlogs():
+    yield
+    while _eventlogs:
+        _eventlogs.pop().close()
+
+
+def make_eventlog(handler, **kwargs):
+    el = utils.make_eventlog(handler, background_emission=True, **kwargs)
+    _eventlogs.append(el)
+    return el
+
+
+def test_background_emission_writes_on_writer_thread():
+    output = io.StringIO()
+    el = make_eventlog(logging.StreamHandler(output))
+
+    for i in range(5):
+        el.record_event('test/test', 1, {'something': str(i)})
+    assert el.flush(timeout=5)
+
+    lines = output.getvalue().splitlines()
+    assert [json.loads(line)['something'] for line in lines] == ['0', '1', '2', '3', '4']
+    assert el.emitter.stats() == {'queued': 0, 'emitted': 5, 'dropped': 0, 'errors': 0}
+    el.close()
+
+
+def test_background_emission_off_thread():
+    handler = BlockingHandler()
+    handler.unblock.set()
+    el = make_eventlog(handler)
+    el.record_event('test/test', 1, {'something': 'a'})
+    el.close()
+
+    assert handler.records == ['a']
+    assert threading.current_thread().name not in handler.threads
+
+
+def fill_queue(el, handler, n):
+    # The first event is picked up by the writer thread, which then blocks.
+    el.record_event('test/test', 1, {'something': 'first'})
+    assert handler.started.wait(5)
+    for i in range(n):
+        el.record_event('test/test', 1, {'something': str(i)})
+
+
+def test_overflow_drop_newest():
+    handler = BlockingHandler()
+    el = make_eventlog(handler, queue_size=2, overflow_policy='drop_newest')
+    fill_queue(el, handler, 4)
+    handler.unblock.set()
+    el.close()
+
+    assert handler.records == ['first', '0', '1']
+    assert el.emitter.dropped == 2
+
+
+def test_overflow_drop_oldest():
+    handler = BlockingHandler()
+    el = make_eventlog(handler, queue_size=2, overflow_policy='drop_oldest')
+    fill_queue(el, handler, 4)
+    handler.unblock.set()
+    el.close()
+
+    assert handler.records == ['first', '2', '3']
+    assert el.emitter.dropped == 2
+
+
+@pytest.mark.parametrize('overflow_policy', ['drop_newest', 'drop_oldest'])
+def test_overflow_drops_are_counted(overflow_policy):
+    handler = BlockingHandler()
+    el = make_eventlog(
+        handler, queue_size=2, overflow_policy=overflow_policy, instrumentation=True
+    )
+    fill_queue(el, handler, 4)
+    handler.unblock.set()
+    el.close()
+
+    events = el.metrics.snapshot()['events']['test/test']
+    assert events['dropped'] == el.emitter.dropped == 2
+    assert events['accepted'] == 5
+
+
+def test_overflow_block_times_out():
+    handler = BlockingHandler()
+    el = make_eventlog(handler, queue_size=1, overflow_policy='block', overflow_timeout=0.01)
+    fill_queue(el, handler, 2)
+    handler.unblock.set()
+    el.close()
+
+    assert handler.records == ['first', '0']
+    assert el.emitter.dropped == 1
+
+
+def test_close_drains_queue():
+    handler = BlockingHandler()
+    el = make_eventlog(handler)
+    fill_queue(el, handler, 3)
+    handler.unblock.set()
+    el.close()
+
+    assert handler.records == ['first', '0', '1', '2']
+    assert el.emitter.closed
+
+    # Events recorded after closing are written synchronously.
+    el.record_event('test/test', 1, {'something': 'late'})
+    assert handler.records[-1] == 'late'
+
+
+def test_unknown_overflow_policy():
+    with pytest.raises(ValueError):
+        BackgroundEmitter(lambda item: None, overflow='explode')
@@ -0,0 +1,100 @@
+import io
+import logging
+
+from jupyter_telemetry._coalesce import Coalescer
+
+from .utils import make_eventlog, read_events
+
+
+SCHEMA = {
+    '$id': 'test/test',
+    'version': 1,
+    'properties': {
+        'status': {
+            'type': 'string',
+            'categories': ['unrestricted']
+        },
+        'secret': {
+            'type': 'string',
+            'categories': ['user-identifiable-information']
+        },
+    },
+}
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def capsule(status, timestamp):
+    return {'__timestamp__': timestamp, '__schema__': 'test/test', 'status': status}
+
+
+def test_coalescer_counts_duplicates():
+    clock = Clock()
+    coalescer = Coalescer(10, clock=clock)
+    assert coalescer.add(capsule('idle', 't0')) == []
+    assert coalescer.add(capsule('busy', 't1')) == []
+    assert coalescer.add(capsule('idle', 't2')) == []
+    assert len(coalescer) == 2
+
+    clock.now = 5
+    assert not coalescer.due()
+    assert coalescer.expired() == []
+
+    clock.now = 10
+    assert coalescer.due()
+    finished = sorted(coalescer.expired(), key=lambda c: c['status'])
+    assert finished == [
+        dict(capsule('busy', 't1'), __count__=1,
+             __first_timestamp__='t1', __last_timestamp__='t1'),
+        dict(capsule('idle', 't0'), __count__=2,
+             __first_timestamp__='t0', __last_timestamp__='t2'),
+    ]
+    assert len(coalescer) == 0
+
+
+def test_coalescer_restarts_expired_group():
+    clock = Clock()
+    coalescer = Coalescer(10, clock=clock)
+    coalescer.add(capsule('idle', 't0'))
+    clock.now = 11
+    finished = coalescer.add(capsule('idle', 't1'))
+    assert [c['__count__'] for c in finished] == [1]
+    assert coalescer.expired(force=True)[0]['__first_timestamp__'] == 't1'
+
+
+def test_coalescer_evicts_least_recently_used():
+    coalescer = Coalescer(10, max_entries=2, clock=Clock())
+    coalescer.add(capsule('a', 't0'))
+    coalescer.add(capsule('b', 't1'))
+    coalescer.add(capsule('a', 't2'))
+    finished = coalescer.add(capsule('c', 't3'))
+    assert [c['status'] for c in finished] == ['b']
+    assert len(coalescer) == 2
+
+
+def test_eventlog_coalescing():
+    output = io.StringIO()
+    el = make_eventlog(
+        logging.StreamHandler(output), schemas=(SCHEMA,), coalesce_window=3600
+    )
+
+    for i in range(5):
+        # Only differ in a property that is filtered out.
+        assert el.record_event('test/test', 1, {'status': 'idle', 'secret': str(i)}) is None
+    el.record_event('test/test', 1, {'status': 'busy'})
+    assert output.getvalue() == ''
+
+    el.flush()
+    events = {
+        event['status']: event
+        for event in read_events(output)
+    }
+    assert events['idle']['__count__'] == 5
+    assert events['busy']['__count__'] == 1
+    assert events['idle']['__first_timestamp__'] <= events['idle']['__last_timestamp__']
@@ -0,0 +1,236 @@
+import asyncio
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+from jupyter_telemetry.collector import CollectorApp
+from jupyter_telemetry.sinks import Sink, SocketSink, read_compressed_events
+from jupyter_telemetry.sinks._socket import FRAME_HEADER
+
+from .utils import make_eventlog
+
+
+requires_unix_sockets = pytest.mark.skipif(
+    not hasattr(socket, 'AF_UNIX') or sys.platform == 'win32',
+    reason='Unix domain sockets are not available'
+)
+
+
+@pytest.fixture
+def socket_path():
+    # Unix domain socket paths are limited to 104 bytes on macOS, which
+    # paths under tmp_path can exceed.
+    directory = tempfile.mkdtemp()
+    yield os.path.join(directory, 'c.sock')
+    shutil.rmtree(directory)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert condition()
+
+
+class Collector(object):
+    """Run a CollectorApp on a background thread."""
+
+    def __init__(self, socket_path, app_class=CollectorApp, **config):
+        self.app = app_class(socket_path=socket_path, **config)
+        self.thread = threading.Thread(target=self._run)
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self.app.serve())
+        finally:
+            loop.close()
+
+    def __enter__(self):
+        self.thread.start()
+        wait_for(self._listening)
+        return self.app
+
+    def _listening(self):
+        # Not just os.path.exists, which is true for a stale socket too.
+        probe = socket.socket(socket.AF_UNIX)
+        try:
+            probe.connect(self.app.socket_path)
+        except OSError:
+            return False
+        finally:
+            probe.close()
+        return True
+
+    def __exit__(self, *exc):
+        self.app.stop()
+        self.thread.join()
+
+
+@requires_unix_sockets
+def test_collector(tmp_path, socket_path):
+    output = tmp_path / 'events.log.gz'
+    with Collector(socket_path, output=str(output), compression='gzip') as app:
+        sink = SocketSink(app.socket_path, flush_interval=60)
+        el = make_eventlog(sinks=[sink])
+        for i in range(100):
+            el.record_event('test/test', 1, {'something': str(i)})
+        el.close()
+        assert sink.connected is False
+        wait_for(lambda: app.received == 100)
+    events = list(read_compressed_events(output))
+    assert [e['something'] for e in events] == [str(i) for i in range(100)]
+
+
+@requires_unix_sockets
+def test_reconnect(tmp_path, socket_path):
+    output = tmp_path / 'events.log'
+    # Start before the collector is running.
+    sink = SocketSink(socket_path, flush_interval=0.05, reconnect_interval=0.05)
+    sink.write(b'{"i": 0}')
+    sink.flush()
+    assert not sink.connected
+
+    with Collector(socket_path, output=str(output)) as app:
+        wait_for(lambda: app.received == 1)
+        sink.write(b'{"i": 1}')
+        wait_for(lambda: app.received == 2)
+    # The collector went away: events are kept until it comes back.
+    sink.write(b'{"i": 2}')
+    sink.flush()
+    with Collector(socket_path, output=str(output)) as app:
+        wait_for(lambda: app.received == 1)
+    sink.close()
+    assert [json.loads(line)['i'] for line in output.read_text().splitlines()] == [0, 1, 2]
+    assert sink.dropped == 0
+
+
+@requires_unix_sockets
+def test_bounded_buffer(socket_path):
+    sink = SocketSink(
+        socket_path, buffer_size=10, max_buffer_size=100,
+        reconnect_interval=60
+    )
+    for i in range(100):
+        sink.write(json.dumps({'i': i}).encode())
+    sink.close()
+    assert 0 < sink.dropped <= 100
+
+
+@requires_unix_sockets
+def test_truncated_frame(tmp_path, socket_path):
+    output = tmp_path / 'events.log'
+    with Collector(socket_path, output=str(output)) as app:
+        client = socket.socket(socket.AF_UNIX)
+        client.connect(app.socket_path)
+        client.sendall(FRAME_HEADER.pack(4) + b'1\n2\n' + FRAME_HEADER.pack(10) + b'3\n')
+        client.close()
+        wait_for(lambda: app.received == 2)
+    assert output.read_text() == '1\n2\n'
+
+
+class SlowSink(Sink):
+    """Block writes of events starting with 'slow' until unblocked."""
+
+    def __init__(self):
+        self.events = []
+        self.unblock = threading.Event()
+
+    def write_batch(self, batch):
+        if batch[0].startswith(b'slow'):
+            self.unblock.wait(5)
+        self.events.extend(batch)
+
+
+class SlowCollectorApp(CollectorApp):
+    def make_sink(self):
+        return SlowSink()
+
+
+@requires_unix_sockets
+def test_slow_sink_does_not_block_other_clients(socket_path):
+    with Collector(socket_path, app_class=SlowCollectorApp) as app:
+        slow = socket.socket(socket.AF_UNIX)
+        slow.connect(app.socket_path)
+        slow.sendall(FRAME_HEADER.pack(5) + b'slow\n')
+        fast = socket.socket(socket.AF_UNIX)
+        fast.connect(app.socket_path)
+        fast.sendall(FRAME_HEADER.pack(5) + b'fast\n')
+        wait_for(lambda: app.sink.events == [b'fast'])
+        app.sink.unblock.set()
+        wait_for(lambda: app.received == 2)
+        slow.close()
+        fast.close()
+    assert app.sink.events == [b'fast', b'slow']
+
+
+def serve(app):
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(app.serve())
+    finally:
+        loop.close()
+
+
+@requires_unix_sockets
+def test_stale_socket_is_replaced(tmp_path, socket_path):
+    # Left behind by a collector that didn't exit cleanly.
+    stale = socket.socket(socket.AF_UNIX)
+    stale.bind(socket_path)
+    stale.close()
+
+    output = tmp_path / 'events.log'
+    with Collector(socket_path, output=str(output)) as app:
+        client = socket.socket(socket.AF_UNIX)
+        client.connect(app.socket_path)
+        client.sendall(FRAME_HEADER.pack(2) + b'1\n')
+        client.close()
+        wait_for(lambda: app.received == 1)
+    assert output.read_text() == '1\n'
+
+
+@requires_unix_sockets
+def test_live_socket_is_not_replaced(tmp_path, socket_path):
+    listener = socket.socket(socket.AF_UNIX)
+    listener.bind(socket_path)
+    listener.listen()
+    try:
+        app = CollectorApp(socket_path=socket_path, output=str(tmp_path / 'events.log'))
+        with pytest.raises(RuntimeError, match='listening'):
+            serve(app)
+        assert os.path.exists(socket_path)
+    finally:
+        listener.close()
+
+
+@requires_unix_sockets
+def test_other_file_is_not_replaced(tmp_path, socket_path):
+    with open(socket_path, 'w') as f:
+        f.write('keep me')
+    app = CollectorApp(socket_path=socket_path, output=str(tmp_path / 'events.log'))
+    with pytest.raises(RuntimeError, match='not a socket'):
+        serve(app)
+    with open(socket_path) as f:
+        assert f.read() == 'keep me'
+
+
+def test_unix_url(tmp_path):
+    if not hasattr(socket, 'AF_UNIX'):
+        pytest.skip('Unix domain sockets are not available')
+    sink = SocketSink('unix://' + str(tmp_path / 'c.sock'), reconnect_interval=0)
+    assert sink.path == str(tmp_path / 'c.sock')
+    sink.close()
+
+
+def test_no_unix_sockets(monkeypatch, tmp_path):
+    monkeypatch.delattr(socket, 'AF_UNIX', raising=False)
+    with pytest.raises(ValueError, match='not available'):
+        SocketSink(str(tmp_path / 'c.sock'))
@@ -0,0 +1,70 @@
+import bz2
+import gzip
+import json
+import lzma
+
+import pytest
+
+from jupyter_telemetry.sinks import CompressedFileSink, read_compressed_events
+
+from .utils import make_eventlog
+
+
+OPEN = {'gzip': gzip.open, 'bz2': bz2.open, 'lzma': lzma.open}
+
+
+def record(sink, values):
+    el = make_eventlog(sinks=[sink])
+    for value in values:
+        el.record_event('test/test', 1, {'something': value})
+    return el
+
+
+@pytest.mark.parametrize('compression', sorted(OPEN))
+def test_compressed_blocks(tmp_path, compression):
+    path = tmp_path / 'events.log'
+    sink = CompressedFileSink(path, compression=compression, flush_interval=60)
+    el = record(sink, ['a', 'b'])
+    el.flush()
+    size = path.stat().st_size
+    for value in ['c', 'd']:
+        el.record_event('test/test', 1, {'something': value})
+    el.close()
+    # Each flush wrote a separate block.
+    assert 0 < size < path.stat().st_size
+
+    expected = ['a', 'b', 'c', 'd']
+    assert [e['something'] for e in read_compressed_events(path, compression)] == expected
+    # Standard tools read all the blocks.
+    with OPEN[compression](str(path), 'rt') as f:
+        assert [json.loads(line)['something'] for line in f] == expected
+
+
+def test_incomplete_block(tmp_path):
+    path = tmp_path / 'events.log'
+    sink = CompressedFileSink(path, flush_interval=60)
+    el = record(sink, ['a'])
+    el.flush()
+    el.record_event('test/test', 1, {'something': 'b'})
+    el.close()
+
+    # Simulate a crash in the middle of writing the second block.
+    path.write_bytes(path.read_bytes()[:-5])
+    assert [e['something'] for e in read_compressed_events(path)] == ['a']
+
+    el = record(CompressedFileSink(path), ['c'])
+    el.close()
+    assert [e['something'] for e in read_compressed_events(path)] == ['a', 'c']
+
+
+def test_compression_ratio(tmp_path):
+    path = tmp_path / 'events.log'
+    el = record(CompressedFileSink(path), ['same'] * 1000)
+    el.close()
+    raw = sum(len(json.dumps(e)) + 1 for e in read_compressed_events(path))
+    assert path.stat().st_size * 10 < raw
+
+
+def test_bad_compression(tmp_path):
+    with pytest.raises(ValueError):
+        CompressedFileSink(tmp_path / 'events.log', compression='zip')
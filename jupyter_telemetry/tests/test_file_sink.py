@@ -0,0 +1,175 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from jupyter_telemetry.sinks import FileSink
+
+from .utils import make_eventlog
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+EXIT_WITHOUT_CLOSING = '''
+import sys
+from jupyter_telemetry.sinks import FileSink
+from jupyter_telemetry.tests.utils import make_eventlog
+
+el = make_eventlog(sinks=[FileSink(sys.argv[1])], background_emission=True)
+for i in range(5):
+    el.record_event('test/test', 1, {'something': str(i)})
+'''
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def read_lines(*paths):
+    lines = []
+    for path in paths:
+        with open(str(path)) as f:
+            lines.extend(json.loads(line) for line in f)
+    return lines
+
+
+def test_file_sink_eventlog(tmp_path):
+    path = tmp_path / 'events.log'
+    sink = FileSink(path, flush_interval=60)
+    el = make_eventlog(sinks=[sink])
+
+    for i in range(10):
+        el.record_event('test/test', 1, {'something': str(i)})
+    # Still buffered.
+    assert path.read_bytes() == b''
+
+    el.flush()
+    assert [line['something'] for line in read_lines(path)] == [str(i) for i in range(10)]
+
+    el.record_event('test/test', 1, {'something': 'last'})
+    el.close()
+    assert sink.closed
+    assert read_lines(path)[-1]['something'] == 'last'
+
+
+def test_flush_on_size(tmp_path):
+    path = tmp_path / 'events.log'
+    sink = FileSink(path, buffer_size=100, flush_interval=60)
+    try:
+        sink.write_batch([b'x' * 200])
+        deadline = time.monotonic() + 5
+        while not path.read_bytes() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert path.read_bytes() == b'x' * 200 + b'\n'
+    finally:
+        sink.close()
+
+
+def test_flush_on_time(tmp_path):
+    path = tmp_path / 'events.log'
+    sink = FileSink(path, flush_interval=0.05)
+    try:
+        sink.write(b'{}')
+        deadline = time.monotonic() + 5
+        while not path.read_bytes() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert path.read_bytes() == b'{}\n'
+    finally:
+        sink.close()
+
+
+def test_rotate_by_size(tmp_path):
+    path = tmp_path / 'events.log'
+    sink = FileSink(path, buffer_size=1, max_bytes=100, backup_count=2)
+    line = b'"' + b'x' * 38 + b'"'
+    for i in range(10):
+        sink.write(line)
+        sink.flush()
+    sink.close()
+
+    assert sink.rotations == 4
+    assert sorted(os.listdir(str(tmp_path))) == ['events.log', 'events.log.1', 'events.log.2']
+    for name in os.listdir(str(tmp_path)):
+        assert os.path.getsize(str(tmp_path / name)) <= 100
+    # The newest events are kept, in order.
+    assert len(read_lines(tmp_path / 'events.log.2', tmp_path / 'events.log.1', path)) == 6
+
+
+def test_rotate_by_time(tmp_path):
+    path = tmp_path / 'events.log'
+    clock = Clock()
+    sink = FileSink(path, rotate_interval=10, backup_count=0, clock=clock)
+    try:
+        sink.write(b'1')
+        sink.flush()
+        clock.now = 10
+        sink.write(b'2')
+        sink.flush()
+        assert sink.rotations == 1
+        # Rotated files aren't kept.
+        assert os.listdir(str(tmp_path)) == ['events.log']
+    finally:
+        sink.close()
+
+
+@pytest.mark.parametrize('fsync,expected', [(None, 0), ('batch', 3), (3600, 1)])
+def test_fsync_policy(tmp_path, monkeypatch, fsync, expected):
+    calls = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(os, 'fsync', lambda fd: calls.append(fd) or real_fsync(fd))
+
+    sink = FileSink(tmp_path / 'events.log', buffer_size=1, fsync=fsync)
+    for i in range(3):
+        sink.write(b'{}')
+        # Wait for the write without asking for a flush.
+        deadline = time.monotonic() + 5
+        while sink._written <= i and time.monotonic() < deadline:
+            time.sleep(0.01)
+    sink.close()
+    # "batch" syncs after every write, a number of seconds on close.
+    assert len(calls) == expected
+
+
+def test_bad_fsync(tmp_path):
+    with pytest.raises(ValueError):
+        FileSink(tmp_path / 'events.log', fsync='always')
+
+
+def test_concurrent_writers(tmp_path):
+    path = tmp_path / 'events.log'
+    sink = FileSink(path, buffer_size=4096, max_buffer_size=8192)
+
+    def write(n):
+        for i in range(500):
+            sink.write(json.dumps({'thread': n, 'i': i}).encode('utf-8'))
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    sink.close()
+
+    lines = read_lines(path)
+    assert len(lines) == 2000
+    for n in range(4):
+        assert [line['i'] for line in lines if line['thread'] == n] == list(range(500))
+
+
+def test_queued_events_written_at_exit(tmp_path):
+    path = str(tmp_path / 'events.log')
+    process = subprocess.run(
+        [sys.executable, '-c', EXIT_WITHOUT_CLOSING, path],
+        cwd=ROOT, stderr=subprocess.PIPE
+    )
+    assert process.returncode == 0
+    assert b'closed sink' not in process.stderr
+    assert [line['something'] for line in read_lines(path)] == [str(i) for i in range(5)]
@@ -0,0 +1,286 @@
+from copy import deepcopy
+import io
+from itertools import chain, combinations
+import json
+import logging
+
+import jsonschema
+import pytest
+
+from jupyter_telemetry import _categories
+from jupyter_telemetry.categories import (
+    JSONSchemaValidator,
+    compile_filter_plan,
+    filter_categories_from_event,
+    validate_and_filter_event,
+)
+from jupyter_telemetry.eventlog import EventLog
+
+from .test_category_filtering import (
+    ADDITIONAL_PROP_EVENT_DATA,
+    ARRAY_EVENT_DATA,
+    NESTED_CATEGORY_ARRAY_SCHEMA,
+    NESTED_CATEGORY_SCHEMA,
+    NESTED_CATEGORY_SCHEMA_ALLOF,
+    NESTED_CATEGORY_SCHEMA_REF,
+    NESTED_EVENT_DATA,
+)
+from .utils import get_event_data
+
+
+CATEGORIES = ['unrestricted', 'user-identifier', 'user-identifiable-information']
+
+
+def powerset(iterable):
+    items = list(iterable)
+    return chain.from_iterable(combinations(items, r) for r in range(len(items) + 1))
+
+
+def schema_with(properties, **extra):
+    schema = {
+        '$id': 'test.event',
+        'version': 1,
+        'type': 'object',
+        'properties': properties,
+    }
+    schema.update(extra)
+    return schema
+
+
+TUPLE_ITEMS_SCHEMA = schema_with({
+    'pair': {
+        'categories': ['unrestricted'],
+        'type': 'array',
+        'items': [
+            {'properties': {'id': {'categories': ['user-identifier']}}},
+            {'properties': {'email': {'categories': ['user-identifiable-information']}}},
+        ],
+        'additionalItems': {
+            'properties': {'id': {'categories': ['user-identifiable-information']}}
+        }
+    }
+})
+
+TUPLE_ITEMS_EVENT = {
+    'pair': [
+        {'id': 'a', 'email': 'a@example.com'},
+        {'id': 'b', 'email': 'b@example.com'},
+        {'id': 'c', 'email': 'c@example.com'},
+        None,
+    ]
+}
+
+DUPLICATE_SCHEMA = schema_with(
+    {
+        'user': {
+            'categories': ['unrestricted'],
+            'properties': {
+                'id': {'categories': ['unrestricted']}
+            }
+        }
+    },
+    allOf=[
+        {
+            'properties': {
+                'user': {
+                    'categories': ['user-identifier'],
+                    'properties': {
+                        'email': {'categories': ['user-identifiable-information']}
+                    }
+                }
+            }
+        }
+    ]
+)
+
+IGNORED_SCHEMA = schema_with(
+    {
+        'nothing-exciting': {'categories': ['unrestricted']},
+        'not': {
+            'categories': ['unrestricted'],
+            'properties': {
+                'email': {'categories': ['user-identifiable-information']}
+            }
+        },
+    },
+    anyOf=[
+        {'properties': {'nothing-exciting': {'categories': ['user-identifier']}}},
+        {'type': 'object'},
+    ],
+    **{
+        'if': {'properties': {'nothing-exciting': {'const': 'x'}}},
+        'then': {'properties': {'not': {'categories': ['user-identifier']}}},
+    }
+)
+
+IGNORED_EVENT = {
+    'nothing-exciting': 'hello, world',
+    'not': {'email': 'test@testemail.com'},
+}
+
+NULLABLE_SCHEMA = schema_with(dict(
+    NESTED_CATEGORY_SCHEMA['properties'],
+    user=dict(NESTED_CATEGORY_SCHEMA['properties']['user'], type=['object', 'null'])
+))
+
+NULL_EVENT = {
+    'nothing-exciting': 'hello, world',
+    'user': None,
+    'extra': {'id': 1},
+}
+
+MISSING_EVENT = {
+    'user': {'id': 'test id'},
+}
+
+
+STATIC_CASES = [
+    (NESTED_CATEGORY_SCHEMA, NESTED_EVENT_DATA),
+    (NESTED_CATEGORY_SCHEMA, ADDITIONAL_PROP_EVENT_DATA),
+    (NESTED_CATEGORY_SCHEMA, MISSING_EVENT),
+    (NESTED_CATEGORY_SCHEMA_ALLOF, NESTED_EVENT_DATA),
+    (NESTED_CATEGORY_SCHEMA_REF, NESTED_EVENT_DATA),
+    (NESTED_CATEGORY_ARRAY_SCHEMA, ARRAY_EVENT_DATA),
+    (TUPLE_ITEMS_SCHEMA, TUPLE_ITEMS_EVENT),
+    (DUPLICATE_SCHEMA, NESTED_EVENT_DATA),
+    (IGNORED_SCHEMA, IGNORED_EVENT),
+    (NULLABLE_SCHEMA, NULL_EVENT),
+]
+
+CONFIGS = [
+    (set(categories), set(properties))
+    for categories in powerset(CATEGORIES)
+    for properties in ([], ['user'], ['users', 'pair', 'not'])
+]
+
+
+@pytest.mark.parametrize('schema,event', STATIC_CASES)
+def test_plan_matches_dynamic_walk(schema, event):
+    plan = compile_filter_plan(schema)
+    assert not plan.dynamic
+
+    for allowed_categories, allowed_properties in CONFIGS:
+        expected = filter_categories_from_event(
+            deepcopy(event), schema, allowed_categories, allowed_properties
+        )
+        actual = plan.apply(deepcopy(event), allowed_categories, allowed_properties)
+        assert actual == expected
+
+
+RECURSIVE_SCHEMA = schema_with(
+    {
+        'tree': {
+            'categories': ['unrestricted'],
+            '$ref': '#/definitions/node'
+        }
+    },
+    definitions={
+        'node': {
+            'properties': {
+                'name': {'categories': ['user-identifier']},
+                'children': {
+                    'categories': ['unrestricted'],
+                    'items': {'$ref': '#/definitions/node'}
+                }
+            }
+        }
+    }
+)
+
+ADDITIONAL_PROPERTIES_SCHEMA = schema_with(
+    {'user': {'categories': ['unrestricted']}},
+    additionalProperties={
+        'properties': {'email': {'categories': ['user-identifiable-information']}}
+    }
+)
+
+
+@pytest.mark.parametrize('schema,event', [
+    (
+        RECURSIVE_SCHEMA,
+        {'tree': {'name': 'a', 'children': [{'name': 'b', 'children': []}]}}
+    ),
+    (
+        ADDITIONAL_PROPERTIES_SCHEMA,
+        {'user': 'a', 'extra': {'email': 'test@testemail.com'}}
+    ),
+])
+def test_dynamic_plan_falls_back(schema, event):
+    plan = compile_filter_plan(schema)
+    assert plan.dynamic
+
+    for allowed_categories, allowed_properties in CONFIGS:
+        expected = filter_categories_from_event(
+            deepcopy(event), schema, allowed_categories, allowed_properties
+        )
+        actual = plan.apply(deepcopy(event), allowed_categories, allowed_properties)
+        assert actual == expected
+
+
+def test_record_event_uses_static_plan(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError('ExtractCategories should not be allocated')
+
+    monkeypatch.setattr(_categories.ExtractCategories, '__init__', fail)
+
+    event_data = get_event_data(
+        NESTED_EVENT_DATA,
+        NESTED_CATEGORY_SCHEMA,
+        'test.event',
+        1,
+        {'test.event': {'allowed_categories': ['user-identifier']}}
+    )
+    assert event_data == {
+        'nothing-exciting': 'hello, world',
+        'user': {'id': 'test id', 'email': None},
+    }
+
+
+@pytest.mark.parametrize('schema,event', STATIC_CASES)
+def test_fused_engine_matches_two_pass(schema, event):
+    for allowed_categories, allowed_properties in CONFIGS:
+        expected = filter_categories_from_event(
+            deepcopy(event), schema, allowed_categories, allowed_properties
+        )
+        actual = validate_and_filter_event(
+            deepcopy(event), schema, allowed_categories, allowed_properties
+        )
+        assert actual == expected
+
+
+@pytest.mark.parametrize('schema,event', [
+    (NESTED_CATEGORY_SCHEMA, {'user': {'email': 1}}),
+    (NESTED_CATEGORY_ARRAY_SCHEMA, {'users': [{'id': 'a'}, {'id': 2}]}),
+    (IGNORED_SCHEMA, []),
+])
+def test_fused_engine_raises_same_errors(schema, event):
+    with pytest.raises(jsonschema.ValidationError) as expected:
+        JSONSchemaValidator(schema).validate(deepcopy(event))
+    with pytest.raises(jsonschema.ValidationError) as actual:
+        validate_and_filter_event(deepcopy(event), schema, set(), set())
+    assert str(actual.value) == str(expected.value)
+    assert actual.value.absolute_path == expected.value.absolute_path
+
+
+def test_fused_engine_leaves_removed_parents_untouched():
+    event = deepcopy(NESTED_EVENT_DATA)
+    user = event['user']
+    validate_and_filter_event(event, NESTED_CATEGORY_SCHEMA, set(), set())
+    assert event['user'] is None
+    # The removed object is not mutated, just like the two-pass path.
+    assert user == NESTED_EVENT_DATA['user']
+
+
+@pytest.mark.parametrize('engine', ['two-pass', 'fused'])
+def test_eventlog_engine(engine):
+    output = io.StringIO()
+    el = EventLog(
+        handlers=[logging.StreamHandler(output)],
+        allowed_schemas={'test.event': {'allowed_categories': ['user-identifier']}},
+        engine=engine,
+    )
+    el.register_schema(NESTED_CATEGORY_SCHEMA)
+    el.record_event('test.event', 1, deepcopy(NESTED_EVENT_DATA))
+
+    capsule = json.loads(output.getvalue())
+    assert capsule['user'] == {'id': 'test id', 'email': None}
@@ -0,0 +1,134 @@
+import gzip
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import json
+import threading
+import time
+
+import pytest
+
+from jupyter_telemetry.sinks import HTTPSink
+
+from .utils import make_eventlog
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        server = self.server
+        status = server.statuses.pop(0) if server.statuses else 200
+        if status == 200:
+            server.received.append({
+                'port': self.client_address[1],
+                'headers': dict(self.headers),
+                'events': [json.loads(line) for line in body.splitlines()],
+            })
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    server.received = []
+    server.statuses = []
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def url(server):
+    return 'http://127.0.0.1:{}/ingest'.format(server.server_address[1])
+
+
+def events(server):
+    return [event['i'] for request in server.received for event in request['events']]
+
+
+def test_batches_by_count(server):
+    sink = HTTPSink(url(server), max_events=10, flush_interval=60)
+    sink.write_batch([json.dumps({'i': i}).encode() for i in range(25)])
+    sink.close()
+    assert [len(request['events']) for request in server.received] == [10, 10, 5]
+    assert events(server) == list(range(25))
+    # All requests were made over one keep-alive connection.
+    assert len({request['port'] for request in server.received}) == 1
+    assert sink.requests == 3
+
+
+def test_batches_by_age(server):
+    sink = HTTPSink(url(server), flush_interval=0.05)
+    try:
+        sink.write(b'{"i": 0}')
+        deadline = time.monotonic() + 5
+        while not server.received and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert events(server) == [0]
+    finally:
+        sink.close()
+
+
+def test_sends_full_batches(server):
+    sink = HTTPSink(url(server), max_events=5, flush_interval=60)
+    try:
+        sink.write_batch([json.dumps({'i': i}).encode() for i in range(5)])
+        deadline = time.monotonic() + 5
+        while not server.received and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert events(server) == list(range(5))
+    finally:
+        sink.close()
+
+
+def test_gzip_and_headers(server):
+    sink = HTTPSink(url(server), compress=True, headers={'Authorization': 'token abc'})
+    el = make_eventlog(sinks=[sink])
+    el.record_event('test/test', 1, {'something': 'x'})
+    el.close()
+    [request] = server.received
+    assert request['headers']['Content-Encoding'] == 'gzip'
+    assert request['headers']['Authorization'] == 'token abc'
+    assert request['events'][0]['something'] == 'x'
+
+
+def test_retries(server):
+    server.statuses = [503, 429]
+    sink = HTTPSink(url(server), backoff=0.01)
+    sink.write(b'{"i": 0}')
+    sink.close()
+    assert events(server) == [0]
+    assert sink.retries == 2
+    assert sink.dropped == 0
+
+
+def test_rejected(server):
+    server.statuses = [400]
+    sink = HTTPSink(url(server), backoff=0.01)
+    sink.write(b'{"i": 0}')
+    sink.write(b'{"i": 1}')
+    sink.close()
+    assert sink.dropped == 2
+    assert sink.retries == 0
+
+
+def test_unreachable():
+    sink = HTTPSink('http://127.0.0.1:1/', max_retries=2, backoff=0.01, timeout=1)
+    sink.write(b'{"i": 0}')
+    sink.close()
+    assert sink.dropped == 1
+    assert sink.retries == 2
+
+
+def test_bad_url():
+    with pytest.raises(ValueError):
+        HTTPSink('ftp://example.com/')
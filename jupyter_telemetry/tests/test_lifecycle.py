@@ -0,0 +1,201 @@
+import asyncio
+import io
+import json
+import logging
+
+import pytest
+
+from .utils import ListSink, make_eventlog
+
+
+def loggers():
+    return logging.Logger.manager.loggerDict
+
+
+def test_logger_is_created_when_used():
+    el = make_eventlog()
+    assert el._log is None
+    log = el.log
+    assert log is el.log
+    assert log.name in loggers()
+    assert not log.propagate
+
+
+def test_close_releases_logger():
+    el = make_eventlog()
+    log = el.log
+    handler = logging.NullHandler()
+    log.addHandler(handler)
+    el.close()
+    assert log.name not in loggers()
+    assert handler not in log.handlers
+    assert el._log is None
+
+
+def test_loggers_are_not_reused():
+    # Not even the loggers of EventLogs that were dropped without being
+    # closed, whose ids can be reused.
+    names = set()
+    for _ in range(100):
+        names.add(make_eventlog().log.name)
+    assert len(names) == 100
+
+
+def test_close_releases_logger_from_placeholder(monkeypatch):
+    # Without a 'jupyter_telemetry.eventlog' logger, logging keeps the
+    # child logger in a placeholder too. Use a manager of our own, so the
+    # loggers of other tests don't matter.
+    manager = logging.Manager(logging.getLogger())
+    monkeypatch.setattr(logging.Logger, 'manager', manager)
+    el = make_eventlog()
+    log = el.log
+    placeholder = manager.loggerDict['jupyter_telemetry.eventlog']
+    assert isinstance(placeholder, logging.PlaceHolder)
+    assert log in placeholder.loggerMap
+    el.close()
+    assert log.name not in manager.loggerDict
+    assert log not in placeholder.loggerMap
+
+
+def test_eventlogs_do_not_accumulate_loggers():
+    names = []
+    for _ in range(100):
+        el = make_eventlog(handlers=[logging.NullHandler()])
+        el.log.info('hello')
+        names.append(el.log.name)
+        el.close()
+    assert not set(names).intersection(loggers())
+
+
+def test_context_manager_closes():
+    sink = ListSink()
+    with make_eventlog(sinks=[sink]) as el:
+        el.record_event('test/test', 1, {'something': 'blah'})
+        log = el.log
+    assert sink.closed
+    assert len(sink.data) == 1
+    assert log.name not in loggers()
+
+
+def test_async_context_manager_closes():
+    sink = ListSink()
+
+    async def record():
+        async with make_eventlog(sinks=[sink]) as el:
+            await el.arecord_event('test/test', 1, {'something': 'blah'})
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(record())
+    finally:
+        loop.close()
+    assert sink.closed
+    assert len(sink.data) == 1
+
+
+def test_child_shares_sinks_and_schemas():
+    sink = ListSink()
+    output = io.StringIO()
+    el = make_eventlog(sinks=[sink], handlers=[logging.StreamHandler(output)])
+    child = el.child()
+    assert child.schemas is el.schemas
+    assert child.schema_cache is el.schema_cache
+    assert child._log is None
+
+    child.record_event('test/test', 1, {'something': 'child'})
+    child.close()
+    assert not sink.closed
+    assert sink.flushed
+    el.record_event('test/test', 1, {'something': 'parent'})
+    el.close()
+    assert sink.closed
+
+    assert [json.loads(data)['something'] for data in sink.data] == ['child', 'parent']
+    assert [json.loads(line)['something'] for line in output.getvalue().splitlines()] == [
+        'child', 'parent'
+    ]
+
+
+def test_child_overrides_traits():
+    sink = ListSink()
+    el = make_eventlog(sinks=[sink], timestamp_mode='ns')
+    child = el.child(allowed_schemas=[])
+    assert child.timestamp_mode == 'ns'
+    assert child.record_event('test/test', 1, {'something': 'blah'}) is None
+    assert sink.data == []
+
+
+@pytest.mark.parametrize('trait', ['handlers', 'sinks', 'background_emission'])
+def test_child_cannot_replace_shared_traits(trait):
+    el = make_eventlog()
+    with pytest.raises(TypeError):
+        el.child(**{trait: None})
+
+
+def test_child_shares_writer_thread():
+    sink = ListSink()
+    el = make_eventlog(sinks=[sink], background_emission=True)
+    child = el.child()
+    assert child.emitter is el.emitter
+    child.record_event('test/test', 1, {'something': 'child'})
+    child.close()
+    # The child waited for its event, and left the writer thread running.
+    assert len(sink.data) == 1
+    assert not el.emitter.closed
+    el.record_event('test/test', 1, {'something': 'parent'})
+    el.close()
+    assert len(sink.data) == 2
+
+
+def test_child_writes_with_its_own_encoder_and_metrics():
+    sink = ListSink()
+    el = make_eventlog(sinks=[sink], background_emission=True)
+    child = el.child(encoder=lambda capsule: 'child', instrumentation=True)
+    el.record_event('test/test', 1, {'something': 'parent'})
+    child.record_event('test/test', 1, {'something': 'child'})
+    el.record_event('test/test', 1, {'something': 'parent'})
+    child.close()
+    el.close()
+    assert sink.data[1] == 'child'
+    assert [json.loads(data)['something'] for data in sink.data[::2]] == ['parent', 'parent']
+    assert child.metrics.snapshot()['phases']['emit']['count'] == 1
+
+
+def test_child_respects_parent_limits():
+    sink = ListSink()
+    el = make_eventlog(
+        sinks=[sink], rate_limit=1, rate_limit_burst=1, instrumentation=True
+    )
+    for i in range(50):
+        with el.child() as child:
+            child.record_event('test/test', 1, {'something': str(i)})
+    assert len(sink.data) == 1
+    assert el.metrics.snapshot()['events']['test/test']['dropped'] == 49
+    el.close()
+    # The parent recorded the summary of the events its children dropped.
+    assert json.loads(sink.data[-1])['dropped'] == {'test/test': 49}
+
+
+def test_children_share_parent_reservoir():
+    sink = ListSink()
+    el = make_eventlog(
+        sinks=[sink],
+        allowed_schemas={'test/test': {'sampling': {'reservoir': 5, 'interval': 3600}}},
+    )
+    for i in range(50):
+        with el.child() as child:
+            child.record_event('test/test', 1, {'something': str(i)})
+    # Held by the parent's reservoir, not recorded when each child closes.
+    assert sink.data == []
+    el.close()
+    assert len(sink.data) == 5
+
+
+def test_child_limits_can_be_its_own():
+    sink = ListSink()
+    el = make_eventlog(sinks=[sink], rate_limit=1, rate_limit_burst=1)
+    for i in range(3):
+        with el.child(rate_limit=0) as child:
+            child.record_event('test/test', 1, {'something': str(i)})
+    assert len(sink.data) == 3
+    el.close()
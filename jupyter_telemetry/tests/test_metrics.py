@@ -0,0 +1,97 @@
+import io
+import logging
+
+import pytest
+from jsonschema import ValidationError
+
+from jupyter_telemetry._metrics import Histogram, Metrics
+from jupyter_telemetry.eventlog import EventLog
+
+from . import utils
+from .utils import SCHEMA
+
+
+def make_eventlog(**kwargs):
+    return utils.make_eventlog(
+        logging.StreamHandler(io.StringIO()),
+        schemas=(SCHEMA, dict(SCHEMA, **{'$id': 'test/other'})),
+        instrumentation=True,
+        **kwargs
+    )
+
+
+def test_disabled_by_default():
+    assert EventLog().metrics is None
+
+
+@pytest.mark.parametrize('engine', ['two-pass', 'fused'])
+def test_event_counts(engine):
+    el = make_eventlog(
+        allowed_schemas={'test/test': {'rate_limit': {'rate': 1, 'burst': 2}}},
+        engine=engine,
+    )
+    for _ in range(3):
+        el.record_event('test/test', 1, {'something': 'x'})
+    el.record_event('test/other', 1, {'something': 'x'})
+    # Over the limit, so dropped before it is validated.
+    el.record_event('test/test', 1, {'something': 1})
+
+    events = el.metrics.snapshot()['events']
+    assert events['test/test']['accepted'] == 2
+    assert events['test/test']['dropped'] == 2
+    assert events['test/test']['invalid'] == 0
+    assert events['test/other']['rejected'] == 1
+
+    el.allowed_schemas = ['test/test']
+    with pytest.raises(ValidationError):
+        el.record_event('test/test', 1, {'something': 1})
+    assert el.metrics.snapshot()['events']['test/test']['invalid'] == 1
+
+
+def test_record_events_counts():
+    el = make_eventlog(allowed_schemas=['test/test'])
+    el.record_events('test/test', 1, [{'something': 'x'}] * 3)
+    el.record_events('test/other', 1, [{'something': 'x'}] * 4)
+    el.record_events('test/other', 1, ({'something': 'x'} for _ in range(2)))
+    events = el.metrics.snapshot()['events']
+    assert events['test/test']['accepted'] == 3
+    assert events['test/other']['rejected'] == 6
+
+
+def test_sampled_out():
+    el = make_eventlog(allowed_schemas={'test/test': {'sampling': {'rate': 0.0}}})
+    el.record_event('test/test', 1, {'something': 'x'})
+    assert el.metrics.snapshot()['events']['test/test']['sampled_out'] == 1
+
+
+def test_phase_histograms():
+    el = make_eventlog(allowed_schemas=['test/test'])
+    el.record_events('test/test', 1, [{'something': 'x'}] * 3)
+    phases = el.metrics.snapshot()['phases']
+    assert phases['validate']['count'] == 3
+    assert phases['filter']['count'] == 3
+    # Batches are serialized and emitted once.
+    assert phases['serialize']['count'] == 1
+    assert phases['emit']['count'] == 1
+    assert phases['emit']['buckets'][-1] == (float('inf'), 1)
+
+
+def test_histogram():
+    histogram = Histogram(buckets=(1, 10))
+    for value in [0.5, 1, 5, 20]:
+        histogram.observe(value)
+    assert histogram.cumulative() == [(1, 2), (10, 3), (float('inf'), 4)]
+    assert histogram.sum == 26.5
+
+
+def test_prometheus_text():
+    metrics = Metrics()
+    metrics.count('accepted', 'a "quoted" schema', 3)
+    metrics.observe('validate', 3e-6)
+    text = metrics.prometheus_text()
+    assert '# TYPE jupyter_telemetry_events_total counter\n' in text
+    assert 'jupyter_telemetry_events_total{schema="a \\"quoted\\" schema",outcome="accepted"} 3\n' in text
+    assert 'jupyter_telemetry_phase_seconds_bucket{phase="validate",le="2.5e-06"} 0\n' in text
+    assert 'jupyter_telemetry_phase_seconds_bucket{phase="validate",le="5e-06"} 1\n' in text
+    assert 'jupyter_telemetry_phase_seconds_bucket{phase="validate",le="+Inf"} 1\n' in text
+    assert 'jupyter_telemetry_phase_seconds_count{phase="emit"} 0\n' in text
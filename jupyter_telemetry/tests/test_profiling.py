@@ -0,0 +1,154 @@
+import io
+import json
+import logging
+
+import pytest
+from jsonschema import ValidationError
+
+from jupyter_telemetry.profiling import CProfileHook, ProfileHook, TracemallocHook
+
+from . import utils
+from .utils import SCHEMA
+
+
+# Categories under additionalProperties can't be planned statically.
+DYNAMIC_SCHEMA = {
+    '$id': 'test/dynamic',
+    'version': 1,
+    'properties': {
+        'something': {
+            'type': 'string',
+            'categories': ['unrestricted']
+        },
+    },
+    'additionalProperties': {
+        'type': 'object',
+        'properties': {
+            'secret': {'type': 'string', 'categories': ['user-identifiable-information']},
+        },
+    },
+}
+
+
+class Recorder(ProfileHook):
+    def __init__(self):
+        self.calls = []
+
+    def start(self, phase, schema_id):
+        self.calls.append(('start', phase, schema_id))
+
+    def __call__(self, phase, schema_id, event_size, elapsed_ns):
+        assert elapsed_ns >= 0
+        self.calls.append((phase, schema_id, event_size))
+
+    def phases(self):
+        return [call[0] for call in self.calls if call[0] != 'start']
+
+
+def make_eventlog(**kwargs):
+    return utils.make_eventlog(
+        logging.StreamHandler(io.StringIO()),
+        schemas=(SCHEMA, DYNAMIC_SCHEMA),
+        allowed_schemas=['test/test', 'test/dynamic'],
+        **kwargs
+    )
+
+
+def test_phases():
+    el = make_eventlog()
+    hook = Recorder()
+    el.add_profile_hook(hook)
+    event = {'something': 'x'}
+    size = len(json.dumps(event, separators=(',', ':')))
+    el.record_event('test/test', 1, event)
+
+    assert hook.phases() == ['lookup', 'validation', 'filtering', 'capsule_build', 'emit']
+    assert hook.calls[0] == ('start', 'lookup', 'test/test')
+    assert hook.calls[1] == ('lookup', 'test/test', size)
+    # The emitted size is that of the capsule.
+    assert hook.calls[-1][2] > size
+
+
+def test_dynamic_schema_phases():
+    el = make_eventlog()
+    hook = Recorder()
+    el.add_profile_hook(hook, phases=['category_extraction', 'filtering'])
+    el.record_event('test/dynamic', 1, {'something': 'x', 'other': {'secret': 'y'}})
+    assert hook.phases() == ['category_extraction', 'filtering']
+
+
+def test_fused_engine_phases():
+    el = make_eventlog(engine='fused')
+    hook = Recorder()
+    el.add_profile_hook(hook)
+    el.record_event('test/test', 1, {'something': 'x'})
+    assert hook.phases() == ['lookup', 'validation', 'capsule_build', 'emit']
+
+
+def test_filter_by_schema():
+    el = make_eventlog()
+    hook = Recorder()
+    el.add_profile_hook(hook, schemas=['test/dynamic'])
+    el.record_event('test/test', 1, {'something': 'x'})
+    assert hook.calls == []
+    el.record_event('test/dynamic', 1, {'something': 'x'})
+    assert set(call[-1] for call in hook.calls if call[0] == 'start') == {'test/dynamic'}
+
+
+def test_record_events():
+    el = make_eventlog()
+    hook = Recorder()
+    el.add_profile_hook(hook, phases=['lookup', 'validation', 'emit'])
+    el.record_events('test/test', 1, [{'something': 'x'}, {'something': 'y'}])
+    assert hook.phases() == ['lookup', 'validation', 'validation', 'emit']
+    # The schema is looked up once for the batch.
+    assert hook.calls[1] == ('lookup', 'test/test', None)
+
+
+def test_failed_validation_is_timed():
+    el = make_eventlog()
+    hook = Recorder()
+    el.add_profile_hook(hook)
+    with pytest.raises(ValidationError):
+        el.record_event('test/test', 1, {'something': 1})
+    assert hook.phases() == ['lookup', 'validation']
+
+
+def test_remove_profile_hook():
+    el = make_eventlog()
+    hook = Recorder()
+    el.add_profile_hook(hook)
+    el.remove_profile_hook(hook)
+    assert el._profile_hooks is None
+    el.record_event('test/test', 1, {'something': 'x'})
+    assert hook.calls == []
+
+
+def test_plain_callable():
+    el = make_eventlog()
+    calls = []
+    el.add_profile_hook(lambda *args: calls.append(args), phases=['lookup'])
+    el.record_event('test/test', 1, {'something': 'x'})
+    assert [call[0] for call in calls] == ['lookup']
+
+
+def test_unknown_phase():
+    with pytest.raises(ValueError):
+        make_eventlog().add_profile_hook(Recorder(), phases=['parse'])
+
+
+def test_cprofile_hook():
+    el = make_eventlog()
+    hook = CProfileHook()
+    el.add_profile_hook(hook, phases=['validation'])
+    el.record_event('test/test', 1, {'something': 'x'})
+    assert any('validate' in name for _, _, name in hook.stats().stats)
+
+
+def test_tracemalloc_hook():
+    el = make_eventlog()
+    hook = TracemallocHook()
+    el.add_profile_hook(hook, phases=['capsule_build'])
+    el.record_event('test/test', 1, {'something': 'x'})
+    assert set(hook.peak) == {'capsule_build'}
+    assert hook.peak['capsule_build'] >= 0
@@ -0,0 +1,127 @@
+import io
+import logging
+
+import pytest
+from traitlets import TraitError
+
+from jupyter_telemetry._ratelimit import DropCounter, TokenBucket
+from jupyter_telemetry.eventlog import EventLog
+
+from . import utils
+from .utils import SCHEMA, read_events
+
+
+OTHER_SCHEMA = dict(SCHEMA, **{'$id': 'test/other'})
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_eventlog(allowed_schemas, **kwargs):
+    output = io.StringIO()
+    el = utils.make_eventlog(
+        logging.StreamHandler(output),
+        schemas=(SCHEMA, OTHER_SCHEMA),
+        allowed_schemas=allowed_schemas,
+        **kwargs
+    )
+    return el, output
+
+
+def test_token_bucket():
+    clock = Clock()
+    bucket = TokenBucket(2, burst=3, clock=clock)
+    assert [bucket.take() for _ in range(4)] == [True, True, True, False]
+    clock.now = 0.5
+    assert [bucket.take() for _ in range(2)] == [True, False]
+    clock.now = 100
+    assert [bucket.take() for _ in range(4)] == [True, True, True, False]
+
+
+def test_drop_counter():
+    clock = Clock()
+    drops = DropCounter(10, clock=clock)
+    assert not drops.due()
+    drops.add('a')
+    drops.add('a')
+    drops.add('b')
+    assert not drops.due()
+    clock.now = 10
+    assert drops.due()
+    assert drops.take() == ({'a': 2, 'b': 1}, 10)
+    assert not drops.due()
+
+
+def test_schema_rate_limit():
+    el, output = make_eventlog({
+        'test/test': {'rate_limit': {'rate': 1, 'burst': 5}},
+        'test/other': {},
+    })
+    for i in range(20):
+        el.record_event('test/test', 1, {'something': str(i)})
+        el.record_event('test/other', 1, {'something': str(i)})
+    # Over the limit events are dropped before they are validated.
+    el.record_event('test/test', 1, {'something': 1})
+
+    events = read_events(output)
+    assert len([e for e in events if e['__schema__'] == 'test/test']) == 5
+    assert len([e for e in events if e['__schema__'] == 'test/other']) == 20
+
+    el.flush()
+    summary = read_events(output)[-1]
+    assert summary['__schema__'] == 'jupyter_telemetry/dropped_events'
+    assert summary['dropped'] == {'test/test': 16}
+    assert summary['total'] == 16
+
+    # Nothing more to report.
+    el.flush()
+    assert len(read_events(output)) == 26
+
+
+def test_global_rate_limit():
+    el, output = make_eventlog(
+        ['test/test', 'test/other'], rate_limit=1, rate_limit_burst=3
+    )
+    for i in range(5):
+        el.record_event('test/test', 1, {'something': str(i)})
+        el.record_event('test/other', 1, {'something': str(i)})
+    assert len(read_events(output)) == 3
+
+    el.close()
+    summary = read_events(output)[-1]
+    assert summary['dropped'] == {'test/test': 3, 'test/other': 4}
+
+
+def test_summary_recorded_after_interval():
+    el, output = make_eventlog(
+        {'test/test': {'rate_limit': {'rate': 1, 'burst': 1}}},
+        drop_summary_interval=60,
+    )
+    clock = Clock()
+    el._drops = DropCounter(60, clock=clock)
+
+    el.record_event('test/test', 1, {'something': 'a'})
+    el.record_event('test/test', 1, {'something': 'b'})
+    assert len(read_events(output)) == 1
+
+    clock.now = 60
+    el.record_event('test/test', 1, {'something': 'c'})
+    summary = read_events(output)[-1]
+    assert summary['dropped'] == {'test/test': 1}
+    assert summary['interval'] == 60
+
+
+@pytest.mark.parametrize('rate_limit', [
+    {},
+    {'rate': 0},
+    {'rate': 1, 'burst': 0},
+    {'rate': 1, 'size': 1},
+])
+def test_bad_rate_limit_options(rate_limit):
+    with pytest.raises(TraitError):
+        EventLog(allowed_schemas={'test/test': {'rate_limit': rate_limit}})
@@ -0,0 +1,177 @@
+from copy import deepcopy
+from datetime import datetime
+import io
+import json
+import logging
+
+import jsonschema
+import pytest
+
+from jupyter_telemetry.eventlog import EventLog
+
+from . import utils
+from .utils import read_events
+
+
+SCHEMA = {
+    '$id': 'test/test',
+    'version': 1,
+    'properties': {
+        'something': {
+            'type': 'string',
+            'categories': ['unrestricted']
+        },
+        'secret': {
+            'type': 'string',
+            'categories': ['user-identifiable-information']
+        },
+    },
+}
+
+
+class CountingStream(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, data):
+        self.writes += 1
+        return super().write(data)
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.events = []
+
+    def emit(self, record):
+        self.events.append(json.loads(self.format(record)))
+
+
+def make_eventlog(*handlers, **kwargs):
+    return utils.make_eventlog(*handlers, schemas=(SCHEMA,), **kwargs)
+
+
+def test_record_events_single_write():
+    output = CountingStream()
+    el = make_eventlog(logging.StreamHandler(output))
+
+    capsules = el.record_events(
+        'test/test', 1,
+        ({'something': str(i), 'secret': 'x'} for i in range(5))
+    )
+
+    assert output.writes == 1
+    events = read_events(output)
+    assert events == capsules
+    assert [event['something'] for event in events] == [str(i) for i in range(5)]
+    assert all(event['secret'] is None for event in events)
+    assert len({event['__timestamp__'] for event in events}) == 1
+
+
+def test_record_events_matches_record_event():
+    batch_output = io.StringIO()
+    single_output = io.StringIO()
+    batch = make_eventlog(logging.StreamHandler(batch_output))
+    single = make_eventlog(logging.StreamHandler(single_output))
+    timestamp = datetime(2020, 1, 1, 12, 30)
+
+    events = [{'something': 'a'}, {'something': 'b', 'secret': 'c'}]
+    batch.record_events('test/test', 1, deepcopy(events), timestamp_override=timestamp)
+    for event in deepcopy(events):
+        single.record_event('test/test', 1, event, timestamp_override=timestamp)
+
+    assert batch_output.getvalue() == single_output.getvalue()
+
+
+def test_record_events_other_handlers():
+    handler = ListHandler()
+    filtered = ListHandler()
+    filtered.addFilter(
+        lambda record: json.loads(record.getMessage())['something'] != 'b'
+    )
+    el = make_eventlog(handler, filtered)
+
+    el.record_events('test/test', 1, [{'something': 'a'}, {'something': 'b'}])
+
+    assert [event['something'] for event in handler.events] == ['a', 'b']
+    assert [event['something'] for event in filtered.events] == ['a']
+
+
+def test_record_events_file_handler(tmp_path):
+    path = tmp_path / 'events.log'
+    handler = logging.FileHandler(str(path), delay=True)
+    el = make_eventlog(handler)
+
+    el.record_events('test/test', 1, [{'something': 'a'}, {'something': 'b'}])
+    el.record_events('test/test', 1, [{'something': 'c'}, {'something': 'd'}])
+    handler.close()
+
+    lines = path.read_text().splitlines()
+    assert [json.loads(line)['something'] for line in lines] == ['a', 'b', 'c', 'd']
+
+
+def test_record_events_invalid_event_records_nothing():
+    output = io.StringIO()
+    el = make_eventlog(logging.StreamHandler(output))
+
+    with pytest.raises(jsonschema.ValidationError):
+        el.record_events('test/test', 1, [{'something': 'a'}, {'something': 1}])
+
+    assert output.getvalue() == ''
+
+
+def test_record_events_invalid_event_coalesces_nothing():
+    output = io.StringIO()
+    el = make_eventlog(logging.StreamHandler(output), coalesce_window=3600)
+
+    with pytest.raises(jsonschema.ValidationError):
+        el.record_events('test/test', 1, [{'something': 'a'}, {'something': 1}])
+    el.record_events('test/test', 1, [{'something': 'b'}])
+    el.flush()
+
+    assert [event['something'] for event in read_events(output)] == ['b']
+
+
+def test_record_events_invalid_event_holds_nothing():
+    output = io.StringIO()
+    el = make_eventlog(
+        logging.StreamHandler(output),
+        allowed_schemas={'test/test': {'sampling': {'reservoir': 5, 'interval': 3600}}},
+    )
+
+    with pytest.raises(jsonschema.ValidationError):
+        el.record_events('test/test', 1, [{'something': 'a'}, {'something': 1}])
+    el.flush()
+
+    assert output.getvalue() == ''
+
+
+def test_record_events_not_allowed():
+    output = io.StringIO()
+    el = EventLog(handlers=[logging.StreamHandler(output)])
+    el.register_schema(SCHEMA)
+
+    def events():
+        raise AssertionError('events should not be consumed')
+        yield
+
+    assert el.record_events('test/test', 1, events()) == []
+    assert el.record_events('test/test', 1, []) == []
+    assert output.getvalue() == ''
+
+
+def test_record_events_background_emission():
+    output = CountingStream()
+    el = make_eventlog(logging.StreamHandler(output), background_emission=True)
+    try:
+        el.record_events('test/test', 1, [{'something': str(i)} for i in range(100)])
+        assert el.flush(5)
+    finally:
+        el.close()
+
+    assert [event['something'] for event in read_events(output)] == [
+        str(i) for i in range(100)
+    ]
+    # Queued events are written in batches.
+    assert output.writes <= 100
@@ -0,0 +1,115 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from jupyter_telemetry.sinks import RingBufferSink, Sink, read_ring_buffer
+
+
+class ListSink(Sink):
+    binary = True
+
+    def __init__(self):
+        self.lines = []
+        self.closed = False
+
+    def write(self, data):
+        self.lines.append(json.loads(data.decode('utf-8')))
+
+    def close(self):
+        self.closed = True
+
+
+def event(i):
+    return json.dumps({'i': i}).encode('utf-8')
+
+
+def test_ring_buffer_roundtrip(tmp_path):
+    path = tmp_path / 'events.ring'
+    sink = RingBufferSink(path, capacity=4096)
+    sink.write_batch([event(i) for i in range(10)])
+    # Readable before the sink is closed.
+    assert [e['i'] for e in read_ring_buffer(path)] == list(range(10))
+    sink.close()
+    assert sink.closed
+    assert [e['i'] for e in read_ring_buffer(path)] == list(range(10))
+
+
+def test_ring_buffer_wraps(tmp_path):
+    path = tmp_path / 'events.ring'
+    sink = RingBufferSink(path, capacity=1000)
+    for i in range(500):
+        sink.write(event(i))
+    sink.close()
+
+    recovered = [e['i'] for e in read_ring_buffer(path)]
+    # The newest events are kept, in order.
+    assert recovered == list(range(500 - len(recovered), 500))
+    assert len(recovered) > 20
+
+    # Reopening appends after the surviving events.
+    sink = RingBufferSink(path, capacity=10)
+    assert sink.capacity == 1000
+    sink.write(event(500))
+    sink.close()
+    assert [e['i'] for e in read_ring_buffer(path)][-2:] == [499, 500]
+
+
+def test_ring_buffer_torn_record(tmp_path):
+    path = tmp_path / 'events.ring'
+    sink = RingBufferSink(path, capacity=4096)
+    for i in range(3):
+        sink.write(event(i))
+    offset = sink._records[-1][0]
+    sink.close()
+
+    # Corrupt the payload of the last record.
+    with open(str(path), 'r+b') as f:
+        f.seek(64 + offset + 16)
+        f.write(b'X')
+    assert [e['i'] for e in read_ring_buffer(path)] == [0, 1]
+
+
+def test_ring_buffer_too_large(tmp_path):
+    sink = RingBufferSink(tmp_path / 'events.ring', capacity=100)
+    with pytest.raises(ValueError):
+        sink.write(b'x' * 100)
+    sink.close()
+
+
+def test_ring_buffer_survives_crash(tmp_path):
+    path = tmp_path / 'events.ring'
+    code = '\n'.join([
+        'import json, os',
+        'from jupyter_telemetry.sinks import RingBufferSink',
+        'sink = RingBufferSink({!r}, capacity=1 << 16)'.format(str(path)),
+        'for i in range(100):',
+        '    sink.write(json.dumps({"i": i}).encode())',
+        'os._exit(1)',
+    ])
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    subprocess.run([sys.executable, '-c', code], cwd=root, check=False)
+    assert [e['i'] for e in read_ring_buffer(path)] == list(range(100))
+
+
+def test_ring_buffer_drain(tmp_path):
+    path = tmp_path / 'events.ring'
+    target = ListSink()
+    sink = RingBufferSink(path, capacity=4096, drain_to=target, drain_interval=60)
+    sink.write_batch([event(i) for i in range(3)])
+    sink.flush()
+    assert [e['i'] for e in target.lines] == [0, 1, 2]
+    sink.write(event(3))
+    assert [e['i'] for e in read_ring_buffer(path, undrained=True)] == [3]
+
+    # Simulate a crash: event 3 is drained when the file is reopened.
+    sink._stop.set()
+    sink._mmap.flush()
+    target = ListSink()
+    sink = RingBufferSink(path, drain_to=target, drain_interval=60)
+    sink.close()
+    assert [e['i'] for e in target.lines] == [3]
+    assert target.closed
+    assert sink.lost == 0
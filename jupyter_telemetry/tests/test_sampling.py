@@ -0,0 +1,145 @@
+import io
+import logging
+
+import pytest
+from traitlets import TraitError
+
+from jupyter_telemetry._sampling import Sampler
+from jupyter_telemetry.eventlog import EventLog
+
+from . import utils
+from .utils import read_events
+
+
+SCHEMA = {
+    '$id': 'test/test',
+    'version': 1,
+    'properties': {
+        'session': {
+            'type': 'string',
+            'categories': ['unrestricted']
+        },
+        'something': {
+            'type': 'string',
+            'categories': ['unrestricted']
+        },
+    },
+}
+
+
+def make_eventlog(sampling):
+    output = io.StringIO()
+    el = utils.make_eventlog(
+        logging.StreamHandler(output),
+        schemas=(SCHEMA,),
+        allowed_schemas={'test/test': {'sampling': sampling}},
+    )
+    return el, output
+
+
+def test_sample_rate_recorded():
+    el, output = make_eventlog({'rate': 1})
+    el.record_event('test/test', 1, {'something': 'a'})
+    assert read_events(output)[0]['__sample_rate__'] == 1
+
+
+def test_fixed_rate():
+    el, output = make_eventlog({'rate': 0.25})
+    el.record_events('test/test', 1, ({'something': str(i)} for i in range(4000)))
+    events = read_events(output)
+    assert 800 < len(events) < 1200
+    assert all(event['__sample_rate__'] == 0.25 for event in events)
+
+
+def test_dropped_events_are_not_validated():
+    el, output = make_eventlog({'rate': 0})
+    # Invalid, but dropped before validation.
+    assert el.record_event('test/test', 1, {'something': 1}) is None
+    assert output.getvalue() == ''
+
+
+def test_consistent_hash():
+    el, output = make_eventlog({'rate': 0.5, 'key': 'session'})
+    for i in range(10):
+        el.record_events(
+            'test/test', 1,
+            ({'session': str(session), 'something': str(i)} for session in range(200))
+        )
+    kept = {}
+    for event in read_events(output):
+        kept[event['session']] = kept.get(event['session'], 0) + 1
+    # Each session's events are all kept or all dropped.
+    assert set(kept.values()) == {10}
+    assert 60 < len(kept) < 140
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_reservoir():
+    clock = Clock()
+    sampler = Sampler(reservoir=10, interval=60, clock=clock)
+    capsules = []
+    for i in range(100):
+        sample = sampler.sample({})
+        if sample is not None:
+            rate, ticket = sample
+            assert rate == 1.0
+            capsule = {'i': i}
+            capsules.append(capsule)
+            sampler.hold(ticket, capsule)
+    assert not sampler.due()
+    clock.now = 60
+    assert sampler.due()
+
+    held = sampler.drain()
+    assert len(held) == 10
+    assert len({capsule['i'] for capsule in held}) == 10
+    assert all(capsule['__sample_rate__'] == 0.1 for capsule in held)
+    assert sampler.drain() == []
+
+
+def test_reservoir_eventlog():
+    el, output = make_eventlog({'reservoir': 5, 'interval': 3600})
+    for i in range(50):
+        assert el.record_event('test/test', 1, {'something': str(i)}) is None
+    assert output.getvalue() == ''
+
+    el.flush()
+    events = read_events(output)
+    assert len(events) == 5
+    assert all(event['__sample_rate__'] == 0.1 for event in events)
+
+
+def test_reservoir_drained_when_interval_ends():
+    el, output = make_eventlog({'reservoir': 5, 'interval': 60})
+    sampler = el.get_schema_policy('test/test').sampler
+    clock = Clock()
+    sampler._clock = clock
+    sampler._start = 0.0
+
+    for i in range(10):
+        el.record_event('test/test', 1, {'something': str(i)})
+    clock.now = 60
+    el.record_event('test/test', 1, {'something': 'next'})
+
+    assert len(read_events(output)) == 5
+
+
+@pytest.mark.parametrize('sampling', [
+    {'rate': 2},
+    {'rate': 'half'},
+    {'key': 1},
+    {'reservoir': 0},
+    {'interval': 0},
+    {'size': 10},
+    [],
+])
+def test_bad_sampling_options(sampling):
+    with pytest.raises(TraitError):
+        EventLog(allowed_schemas={'test/test': {'sampling': sampling}})
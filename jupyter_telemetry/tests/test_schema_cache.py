@@ -0,0 +1,72 @@
+import io
+import json
+import logging
+
+import jsonschema
+import pytest
+
+from jupyter_telemetry.eventlog import EventLog
+
+from .utils import SCHEMA
+
+
+def make_eventlog():
+    output = io.StringIO()
+    handler = logging.StreamHandler(output)
+    el = EventLog(handlers=[handler], allowed_schemas=['test/test'])
+    return el, output
+
+
+def test_register_schema_compiles_validator():
+    el, _ = make_eventlog()
+    el.register_schema(SCHEMA)
+
+    stats = el.schema_cache.stats()
+    assert stats['size'] == 1
+    assert stats['builds'] == 1
+    assert stats['hits'] == 0
+    assert stats['build_time'] >= 0
+
+
+def test_record_event_uses_cached_validator():
+    el, output = make_eventlog()
+    el.register_schema(SCHEMA)
+
+    for _ in range(3):
+        el.record_event('test/test', 1, {'something': 'blah'})
+
+    stats = el.schema_cache.stats()
+    assert stats['builds'] == 1
+    assert stats['hits'] == 3
+    assert stats['misses'] == 0
+    assert len(output.getvalue().splitlines()) == 3
+
+
+def test_cached_validator_still_rejects_bad_events():
+    el, output = make_eventlog()
+    el.register_schema(SCHEMA)
+
+    with pytest.raises(jsonschema.ValidationError):
+        el.record_event('test/test', 1, {'something': 1})
+    assert output.getvalue() == ''
+
+
+def test_replaced_schema_is_recompiled():
+    el, output = make_eventlog()
+    el.register_schema(SCHEMA)
+
+    # Replace the registered schema behind the cache's back.
+    schema = dict(SCHEMA, properties={
+        'something': {
+            'type': 'integer',
+            'categories': ['unrestricted']
+        },
+    })
+    el.schemas[('test/test', 1)] = schema
+
+    el.record_event('test/test', 1, {'something': 1})
+
+    stats = el.schema_cache.stats()
+    assert stats['misses'] == 1
+    assert stats['builds'] == 2
+    assert json.loads(output.getvalue())['something'] == 1
@@ -0,0 +1,86 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from jupyter_telemetry.sinks import SharedFileSink
+
+from .utils import make_eventlog
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WRITER = '''
+import json, sys
+from jupyter_telemetry.sinks import SharedFileSink
+
+path, n = sys.argv[1], int(sys.argv[2])
+sink = SharedFileSink(path, max_write=1024)
+for i in range(2000):
+    # Every 50th event is longer than max_write.
+    size = 3000 if i % 50 == 0 else i % 200
+    batch = [
+        json.dumps({'process': n, 'i': i, 'j': j, 'data': 'x' * size}).encode()
+        for j in range(1 + i % 3)
+    ]
+    sink.write_batch(batch)
+sink.close()
+'''
+
+
+@pytest.mark.skipif(fcntl is None, reason='Appends are only atomic with flock')
+def test_multiprocess_appends(tmp_path):
+    path = str(tmp_path / 'events.log')
+    processes = [
+        subprocess.Popen([sys.executable, '-c', WRITER, path, str(n)], cwd=ROOT)
+        for n in range(4)
+    ]
+    for process in processes:
+        assert process.wait() == 0
+
+    with open(path, 'rb') as f:
+        # Raises if any line was torn or interleaved.
+        lines = [json.loads(line.decode('utf-8')) for line in f]
+    for n in range(4):
+        seen = [(line['i'], line['j']) for line in lines if line['process'] == n]
+        assert seen == [(i, j) for i in range(2000) for j in range(1 + i % 3)]
+
+
+def test_shared_file_sink_eventlog(tmp_path):
+    path = tmp_path / 'events.log'
+    sink = SharedFileSink(path)
+    el = make_eventlog(sinks=[sink])
+    el.record_events('test/test', 1, [{'something': 'a'}, {'something': 'b'}])
+    # Written without buffering.
+    assert [json.loads(line)['something'] for line in path.read_text().splitlines()] == ['a', 'b']
+    el.close()
+    assert sink.closed
+    with pytest.raises(ValueError):
+        sink.write(b'{}')
+
+
+def test_chunked_write(tmp_path):
+    path = tmp_path / 'events.log'
+    sink = SharedFileSink(path, max_write=10)
+    sink.write_batch([b'"' + b'x' * 30 + b'"', b'1', b'2'])
+    sink.close()
+    assert sink.chunked == 1
+    assert path.read_bytes() == b'"' + b'x' * 30 + b'"\n1\n2\n'
+
+
+def test_reopen(tmp_path):
+    path = tmp_path / 'events.log'
+    sink = SharedFileSink(path)
+    sink.write(b'1')
+    os.rename(str(path), str(tmp_path / 'events.log.1'))
+    sink.reopen()
+    sink.write(b'2')
+    sink.close()
+    assert path.read_bytes() == b'2\n'
@@ -0,0 +1,200 @@
+from datetime import datetime
+import io
+import json
+import logging
+
+import pytest
+from traitlets import TraitError
+
+from jupyter_telemetry import _encoders
+from jupyter_telemetry.eventlog import EventLog
+from jupyter_telemetry.sinks import AsyncSink, HandlerSink, StreamSink
+
+from .utils import ListSink, make_eventlog, run_async
+
+
+class BytesSink(ListSink):
+    binary = True
+
+
+class AsyncListSink(AsyncSink):
+    def __init__(self):
+        self.data = []
+
+    async def write(self, data):
+        self.data.append(data)
+
+
+class CountingEncoder(object):
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, capsule):
+        self.calls += 1
+        return _encoders.json_encoder(capsule)
+
+
+def test_sink_receives_serialized_event():
+    sink = ListSink()
+    el = make_eventlog(sinks=[sink], encoder='json')
+
+    capsule = el.record_event('test/test', 1, {'something': 'a'})
+    el.record_events('test/test', 1, [{'something': 'b'}, {'something': 'c'}])
+
+    assert sink.data[0] == json.dumps(capsule)
+    assert [json.loads(data)['something'] for data in sink.data] == ['a', 'b', 'c']
+
+    el.close()
+    assert sink.closed
+
+
+def test_stream_sink_and_handler_bypass_log_records(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError('LogRecord should not be created')
+
+    monkeypatch.setattr(logging.LogRecord, '__init__', fail)
+
+    handler_output = io.StringIO()
+    sink_output = io.StringIO()
+    el = make_eventlog(
+        handlers=[logging.StreamHandler(handler_output)],
+        sinks=[StreamSink(sink_output)],
+    )
+    el.record_event('test/test', 1, {'something': 'a'})
+
+    assert handler_output.getvalue() == sink_output.getvalue()
+    assert json.loads(sink_output.getvalue())['something'] == 'a'
+
+
+def test_handler_sink_respects_level():
+    output = io.StringIO()
+    handler = logging.StreamHandler(output)
+    handler.setLevel(logging.WARNING)
+    HandlerSink(handler).write('{}')
+    assert output.getvalue() == ''
+
+
+def test_callable_encoder():
+    sink = ListSink()
+    el = make_eventlog(
+        sinks=[sink], encoder=lambda capsule: capsule['something'].upper()
+    )
+    el.record_event('test/test', 1, {'something': 'a'})
+    assert sink.data == ['A']
+
+
+def test_encoder_default():
+    capsule = {'time': datetime(2020, 1, 1, 12, 30), 'other': object}
+    assert json.loads(_encoders.json_encoder(capsule)) == {
+        'time': '2020-01-01T12:30:00',
+        'other': str(object),
+    }
+
+
+def test_orjson_encoder():
+    pytest.importorskip('orjson')
+    sink = ListSink()
+    el = make_eventlog(sinks=[sink], encoder='orjson')
+    capsule = el.record_event('test/test', 1, {'something': 'a'})
+    assert json.loads(sink.data[0]) == capsule
+
+
+def test_orjson_encoder_falls_back_to_json():
+    pytest.importorskip('orjson')
+    sink = ListSink()
+    el = make_eventlog(
+        sinks=[sink],
+        encoder='orjson',
+        schemas=[{
+            '$id': 'test/test',
+            'version': 1,
+            'properties': {'n': {'type': 'integer', 'categories': ['unrestricted']}},
+        }],
+    )
+    capsule = el.record_event('test/test', 1, {'n': 2 ** 70})
+    assert json.loads(sink.data[0]) == capsule
+    assert capsule['n'] == 2 ** 70
+
+
+def test_orjson_encoder_not_installed(monkeypatch):
+    monkeypatch.setattr(_encoders, 'orjson', None)
+    assert _encoders.get_encoder('auto') is _encoders.json_encoder
+    with pytest.raises(TraitError):
+        EventLog(encoder='orjson')
+
+
+def test_bad_sink():
+    with pytest.raises(TraitError):
+        EventLog(sinks=[logging.StreamHandler()])
+
+
+def test_serialize_once_for_all_sinks():
+    encoder = CountingEncoder()
+    outputs = [io.StringIO() for _ in range(3)]
+    sink = ListSink()
+    bytes_sink = BytesSink()
+    el = make_eventlog(
+        handlers=[logging.StreamHandler(output) for output in outputs],
+        sinks=[sink, bytes_sink],
+        encoder=encoder,
+    )
+
+    el.record_events('test/test', 1, [{'something': 'a'}, {'something': 'b'}])
+
+    assert encoder.calls == 2
+    assert outputs[0].getvalue() == outputs[1].getvalue() == outputs[2].getvalue()
+    assert outputs[0].getvalue() == ''.join(data + '\n' for data in sink.data)
+    assert bytes_sink.data == [data.encode('utf-8') for data in sink.data]
+
+
+def test_sink_encoder():
+    upper = ListSink()
+    upper.encoder = lambda capsule: capsule['something'].upper()
+    output = io.StringIO()
+    handler = HandlerSink(
+        logging.StreamHandler(output), encoder=lambda capsule: capsule['something']
+    )
+    sink = ListSink()
+    el = make_eventlog(sinks=[upper, handler, sink])
+
+    el.record_event('test/test', 1, {'something': 'a'})
+
+    assert upper.data == ['A']
+    assert output.getvalue() == 'a\n'
+    assert json.loads(sink.data[0])['something'] == 'a'
+
+
+def test_serialize_once_for_async_sinks():
+    encoder = CountingEncoder()
+    output = io.StringIO()
+    sink = AsyncListSink()
+    el = make_eventlog(
+        handlers=[logging.StreamHandler(output)], sinks=[sink], encoder=encoder
+    )
+
+    async def record():
+        for something in 'abc':
+            await el.arecord_event('test/test', 1, {'something': something})
+        await el.aclose()
+
+    run_async(record())
+
+    assert encoder.calls == 3
+    assert output.getvalue() == ''.join(data + '\n' for data in sink.data)
+
+
+class SlowFlushSink(ListSink):
+    def flush(self, timeout=None):
+        self.timeout = timeout
+        return False
+
+
+def test_flush_passes_timeout_to_sinks():
+    sink = SlowFlushSink()
+    plain = ListSink()
+    el = make_eventlog(sinks=[sink, plain])
+    assert not el.flush(timeout=5)
+    assert 0 < sink.timeout <= 5
+    assert plain.flushed == 1
+    assert not el.flush()
+    assert sink.timeout is None
@@ -0,0 +1,236 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from jupyter_telemetry.sinks import HTTPSink, Sink, SpoolSink
+
+from .utils import make_eventlog
+
+
+class FlakySink(Sink):
+    binary = True
+
+    def __init__(self):
+        self.events = []
+        self.up = threading.Event()
+        self.up.set()
+        self.closed = False
+
+    def write_batch(self, batch):
+        if not self.up.is_set():
+            raise OSError('down')
+        self.events.extend(json.loads(data.decode('utf-8'))['i'] for data in batch)
+
+    def close(self):
+        self.closed = True
+
+
+I_SCHEMA = {
+    '$id': 'test/test',
+    'version': 1,
+    'properties': {'i': {'type': 'integer', 'categories': ['unrestricted']}},
+}
+
+
+def event(i):
+    return json.dumps({'i': i}).encode('utf-8')
+
+
+def segments(directory):
+    return [name for name in os.listdir(str(directory)) if name.endswith('.spool')]
+
+
+def wait_spooled(sink):
+    deadline = time.monotonic() + 10
+    while sink.stats()['pending_events']:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_forwards_in_memory(tmp_path):
+    downstream = FlakySink()
+    sink = SpoolSink(downstream, tmp_path)
+    el = make_eventlog(sinks=[sink], schemas=[I_SCHEMA])
+    for i in range(10):
+        el.record_event('test/test', 1, {'i': i})
+    el.flush()
+    assert downstream.events == list(range(10))
+    assert segments(tmp_path) == []
+    el.close()
+    assert downstream.closed
+
+
+def test_spools_and_replays_in_order(tmp_path):
+    downstream = FlakySink()
+    downstream.up.clear()
+    sink = SpoolSink(downstream, tmp_path, queue_size=5, segment_size=100, retry_interval=0.01)
+    for i in range(50):
+        sink.write(event(i))
+    wait_spooled(sink)
+    stats = sink.stats()
+    assert stats['memory_batches'] == 5
+    assert stats['spool_events'] == 45
+    assert stats['spool_segments'] > 1
+    assert stats['lag'] >= 0
+
+    downstream.up.set()
+    assert sink.flush(timeout=10)
+    assert downstream.events == list(range(50))
+    assert segments(tmp_path) == []
+    stats = sink.stats()
+    assert stats['spool_events'] == 0
+    assert stats['replayed'] == 45
+    sink.close()
+
+
+def test_spool_survives_restart(tmp_path):
+    downstream = FlakySink()
+    downstream.up.clear()
+    sink = SpoolSink(downstream, tmp_path, queue_size=5, retry_interval=0.01)
+    for i in range(20):
+        sink.write(event(i))
+    sink.close()
+    # Events still in memory were spooled on close.
+    assert downstream.events == []
+
+    downstream = FlakySink()
+    # Keep the events from being replayed before they are counted.
+    downstream.up.clear()
+    sink = SpoolSink(downstream, tmp_path, max_replay_batch=3, retry_interval=0.01)
+    assert sink.stats()['spool_events'] == 20
+    downstream.up.set()
+    assert sink.flush(timeout=10)
+    sink.write(event(20))
+    sink.close()
+    assert downstream.events == list(range(21))
+
+
+def test_resumes_from_checkpoint(tmp_path):
+    downstream = FlakySink()
+    downstream.up.clear()
+    sink = SpoolSink(downstream, tmp_path, queue_size=0, retry_interval=0.01)
+    for i in range(10):
+        sink.write(event(i))
+    downstream.up.set()
+    assert sink.flush(timeout=10)
+    downstream.up.clear()
+    for i in range(10, 15):
+        sink.write(event(i))
+    sink.close()
+
+    downstream = FlakySink()
+    sink = SpoolSink(downstream, tmp_path)
+    assert sink.flush(timeout=10)
+    sink.close()
+    # Replayed events aren't replayed again.
+    assert downstream.events == list(range(10, 15))
+
+
+@pytest.mark.parametrize('eviction', ['drop_oldest', 'drop_newest'])
+def test_eviction(tmp_path, eviction):
+    downstream = FlakySink()
+    downstream.up.clear()
+    sink = SpoolSink(
+        downstream, tmp_path, queue_size=0, segment_size=50, max_spool_size=200,
+        eviction=eviction, retry_interval=0.01
+    )
+    for i in range(100):
+        sink.write(event(i))
+    wait_spooled(sink)
+    assert sink.evicted > 0
+    assert sink.stats()['spool_bytes'] <= 200
+
+    downstream.up.set()
+    assert sink.flush(timeout=10)
+    sink.close()
+    assert len(downstream.events) + sink.evicted == 100
+    assert downstream.events == sorted(downstream.events)
+    if eviction == 'drop_oldest':
+        assert downstream.events[-1] == 99
+    else:
+        assert downstream.events[0] == 0
+
+
+def test_bad_eviction(tmp_path):
+    with pytest.raises(ValueError):
+        SpoolSink(FlakySink(), tmp_path, eviction='block')
+
+
+
+class SlowDisk(object):
+    def __init__(self, f):
+        self.f = f
+        self.writing = threading.Event()
+        self.ready = threading.Event()
+
+    def write(self, data):
+        self.writing.set()
+        self.ready.wait(10)
+        return self.f.write(data)
+
+    def flush(self):
+        self.f.flush()
+
+
+def test_spools_off_the_callers_thread(tmp_path):
+    downstream = FlakySink()
+    downstream.up.clear()
+    sink = SpoolSink(downstream, tmp_path, queue_size=0, retry_interval=0.01)
+    disk = None
+
+    def reserve(events, size, reserve=sink._reserve):
+        nonlocal disk
+        f = reserve(events, size)
+        if disk is None:
+            disk = f = SlowDisk(f)
+        return f
+
+    sink._reserve = reserve
+    sink.write(event(0))
+    while disk is None:
+        time.sleep(0.01)
+    assert disk.writing.wait(10)
+    # The spooling thread is stuck on the disk, but callers aren't.
+    start = time.monotonic()
+    sink.write(event(1))
+    assert sink.stats()['pending_events'] == 1
+    assert time.monotonic() - start < 5
+    disk.ready.set()
+    downstream.up.set()
+    assert sink.flush(timeout=10)
+    sink.close()
+    assert downstream.events == [0, 1]
+
+
+def test_refuses_sinks_that_drop(tmp_path):
+    downstream = HTTPSink('http://localhost:1/events')
+    try:
+        with pytest.raises(ValueError):
+            SpoolSink(downstream, tmp_path)
+    finally:
+        downstream.close()
+    downstream = HTTPSink('http://localhost:1/events', overflow='block')
+    SpoolSink(downstream, tmp_path).close()
+
+
+def test_flush_spools_while_sink_is_down(tmp_path):
+    downstream = FlakySink()
+    downstream.up.clear()
+    sink = SpoolSink(downstream, tmp_path, retry_interval=60)
+    el = make_eventlog(sinks=[sink], schemas=[I_SCHEMA])
+    for i in range(10):
+        el.record_event('test/test', 1, {'i': i})
+    start = time.monotonic()
+    assert el.flush(timeout=5)
+    assert time.monotonic() - start < 5
+    stats = sink.stats()
+    assert stats['memory_events'] == 0
+    assert stats['spool_events'] == 10
+
+    downstream.up.set()
+    assert el.flush(timeout=10)
+    assert downstream.events == list(range(10))
+    el.close()
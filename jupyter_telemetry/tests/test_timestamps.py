@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+import io
+import json
+import logging
+
+import pytest
+from traitlets import TraitError
+
+from jupyter_telemetry._timestamps import TimestampProvider
+from jupyter_telemetry.eventlog import EventLog
+
+from .utils import make_eventlog
+
+
+EPOCH = datetime(1970, 1, 1)
+
+TIMES = [
+    datetime(2020, 1, 1),
+    datetime(2020, 1, 1, 12, 30, 15),
+    datetime(2020, 1, 1, 12, 30, 15, 1),
+    datetime(2020, 2, 29, 23, 59, 59, 999999),
+    datetime(2038, 1, 19, 3, 14, 8, 500000),
+]
+
+
+def to_ns(dt, extra_ns=0):
+    delta = dt - EPOCH
+    return (
+        (delta.days * 86400 + delta.seconds) * 10**9
+        + delta.microseconds * 1000
+        + extra_ns
+    )
+
+
+@pytest.mark.parametrize('dt', TIMES)
+def test_matches_isoformat(dt):
+    provider = TimestampProvider(clock=lambda: to_ns(dt, 999))
+    assert provider() == dt.isoformat() + 'Z'
+
+
+def test_cached_prefix_follows_the_clock():
+    now = [to_ns(TIMES[1])]
+    provider = TimestampProvider(clock=lambda: now[0])
+    for step in range(2000):
+        dt = TIMES[1] + timedelta(microseconds=step * 997)
+        now[0] = to_ns(dt)
+        assert provider() == dt.isoformat() + 'Z'
+
+
+def test_ns_mode():
+    provider = TimestampProvider('ns', clock=lambda: to_ns(TIMES[0], 42))
+    assert provider() == '2020-01-01T00:00:00.000000042Z'
+
+
+def test_monotonic_mode():
+    provider = TimestampProvider('monotonic')
+    timestamps = [provider() for _ in range(1000)]
+    assert timestamps == sorted(timestamps)
+    now = datetime.utcnow()
+    first = datetime.strptime(timestamps[0][:26], '%Y-%m-%dT%H:%M:%S.%f')
+    assert abs(now - first) < timedelta(seconds=5)
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        TimestampProvider('ms')
+    with pytest.raises(TraitError):
+        EventLog(timestamp_mode='ms')
+
+
+@pytest.mark.parametrize('mode', ['us', 'ns', 'monotonic'])
+def test_eventlog_timestamp_mode(mode):
+    output = io.StringIO()
+    el = make_eventlog(logging.StreamHandler(output), timestamp_mode=mode)
+    override = datetime(2020, 1, 1, 12, 30)
+
+    before = datetime.utcnow().replace(microsecond=0)
+    el.record_event('test/test', 1, {'something': 'a'})
+    el.record_event('test/test', 1, {'something': 'b'}, timestamp_override=override)
+
+    recorded, overridden = [
+        json.loads(line)['__timestamp__'] for line in output.getvalue().splitlines()
+    ]
+    timestamp = datetime.strptime(recorded[:19], '%Y-%m-%dT%H:%M:%S')
+    assert before <= timestamp <= datetime.utcnow()
+    assert recorded.endswith('Z')
+    assert overridden == '2020-01-01T12:30:00Z'
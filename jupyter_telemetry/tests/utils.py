@@ -1,9 +1,60 @@
+import asyncio
 from copy import deepcopy
 import io
 import json
 import logging
 
 from jupyter_telemetry.eventlog import EventLog
+from jupyter_telemetry.sinks import Sink
+
+
+SCHEMA = {
+    '$id': 'test/test',
+    'version': 1,
+    'properties': {
+        'something': {
+            'type': 'string',
+            'categories': ['unrestricted']
+        },
+    },
+}
+
+
+class ListSink(Sink):
+    """Keep the events written to it, and count flushes."""
+
+    def __init__(self):
+        self.data = []
+        self.flushed = 0
+        self.closed = False
+
+    def write(self, data):
+        self.data.append(data)
+
+    def flush(self):
+        self.flushed += 1
+
+    def close(self):
+        self.closed = True
+
+
+def make_eventlog(*handlers, schemas=(SCHEMA,), **kwargs):
+    """
+    Create an EventLog writing to `handlers`, with `schemas` registered and
+    test/test allowed unless `allowed_schemas` is given.
+    """
+    if handlers:
+        kwargs['handlers'] = list(handlers)
+    kwargs.setdefault('allowed_schemas', ['test/test'])
+    el = EventLog(**kwargs)
+    for schema in schemas:
+        el.register_schema(schema)
+    return el
+
+
+def read_events(output):
+    """Parse the events written to a `StringIO` stream."""
+    return [json.loads(line) for line in output.getvalue().splitlines()]
 
 
 def get_event_data(event, schema, schema_id, version, allowed_schemas):
@@ -23,3 +74,19 @@ def get_event_data(event, schema, schema_id, version, allowed_schemas):
 
     recorded_event = json.loads(sink.getvalue())
     return {key: value for key, value in recorded_event.items() if not key.startswith('__')}
+
+
+def run_async(coro):
+    """Run `coro` on a new event loop, like asyncio.run, which Python 3.6 lacks."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        # Cancel the tasks left running, like writer tasks.
+        all_tasks = getattr(asyncio, 'all_tasks', None) or asyncio.Task.all_tasks
+        pending = [task for task in all_tasks(loop) if not task.done()]
+        if pending:
+            for task in pending:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        loop.close()
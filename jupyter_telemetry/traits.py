@@ -2,6 +2,10 @@ import logging
 
 from traitlets import TraitType, TraitError
 
+from ._ratelimit import check_rate_limit_options
+from ._sampling import check_sampling_options
+from .sinks import AsyncSink, Sink
+
 
 class Handlers(TraitType):
     """A trait that takes a list of logging handlers and converts
@@ -42,10 +46,35 @@ class Handlers(TraitType):
             self.error(obj, value)
 
 
+class Sinks(Handlers):
+    """A trait that takes a list of event sinks and converts
+    it to a callable that returns that list (thus, making this
+    trait pickleable).
+    """
+    info_text = "a list of event sinks"
+    sink_classes = (Sink, AsyncSink)
+
+    def validate_elements(self, obj, value):
+        for el in value:
+            if not isinstance(el, self.sink_classes):
+                self.element_error(obj)
+
+    def element_error(self, obj):
+        raise TraitError(
+            "Elements in the '{}' trait of an {} instance "
+            "must be event sink instances."
+            .format(self.name, obj.__class__.__name__)
+        )
+
+
 class SchemaOptions(TraitType):
     """A trait for handling options for recording schemas.
     """
     info_text = "either a dictionary with schema options or a list with schema names."
+    option_checkers = {
+        "sampling": check_sampling_options,
+        "rate_limit": check_rate_limit_options,
+    }
 
     def validate(self, obj, val):
         # If the type is a dictionary.
@@ -53,7 +82,9 @@ class SchemaOptions(TraitType):
             for schema_name, data in val.items():
                 given_keys = set(data.keys())
                 # Compare against keys expected.
-                allowed_keys = {"allowed_categories", "allowed_properties"}
+                allowed_keys = {
+                    "allowed_categories", "allowed_properties", "sampling", "rate_limit"
+                }
                 # There should be no extra keys (anything other than
                 # allowed_keys) in the schema options.
                 unknown_keys = given_keys.difference(allowed_keys)
@@ -66,6 +97,18 @@ class SchemaOptions(TraitType):
                            unknown_keys=",".join(unknown_keys)
                         )
                     )
+                for key, check_options in self.option_checkers.items():
+                    if key not in data:
+                        continue
+                    try:
+                        check_options(data[key])
+                    except ValueError as e:
+                        raise TraitError(
+                            "The schema option, {schema_name}, has invalid "
+                            "{key} options: {error}".format(
+                                schema_name=schema_name, key=key, error=e
+                            )
+                        )
             validated_val = val
         # If the type is a list (for backwards compatibility).
         elif type(val) is list: